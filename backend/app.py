@@ -1,24 +1,47 @@
+import time
+
 from flask import Flask, jsonify
+from sqlalchemy import text
 from flask_cors import CORS
 from flask_swagger_ui import get_swaggerui_blueprint
 from config import Config
 from models import db
+from services.cache import response_cache
+from services.encoding import FastJSONProvider
+from services.llm import chat_service
+from services.metrics import metrics
 
 # Import blueprints
 from routes.jobs import jobs_bp
 from routes.skills import skills_bp
 from routes.universities import universities_bp
 from routes.analytics import analytics_bp
+from routes.recommendations import recommendations_bp
 from routes.chatbot import chatbot
+from routes.admin import admin_bp
+from routes.autocomplete import autocomplete_bp
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# orjson for every jsonify(), MessagePack for clients that ask for it
+app.json = FastJSONProvider(app)
+
 # Enable CORS
 CORS(app)
 
 # Initialize SQLAlchemy
 db.init_app(app)
 
+# Cache read endpoints until the data changes
+response_cache.init_app(app)
+
+# One shared, rate-limited LLM client for the chatbot
+chat_service.init_app(app)
+
+# Per-request latency, SQL and cache metrics at /metrics
+metrics.init_app(app)
+response_cache.exempt(metrics.export)
+
 # Swagger UI configuration
 SWAGGER_URL = '/swagger'
 API_URL = '/static/swagger.json'
@@ -36,7 +59,10 @@ app.register_blueprint(jobs_bp)
 app.register_blueprint(skills_bp)
 app.register_blueprint(universities_bp)
 app.register_blueprint(analytics_bp)
+app.register_blueprint(recommendations_bp)
 app.register_blueprint(chatbot)
+app.register_blueprint(admin_bp)
+app.register_blueprint(autocomplete_bp)
 
 @app.route('/')
 def index():
@@ -46,17 +72,51 @@ def index():
         'status': 'success'
     })
 
+def _pool_status(pool):
+    """Connection usage of this worker's pool (QueuePool; other pools report less)"""
+    if not hasattr(pool, 'checkedout'):
+        return {'class': type(pool).__name__}
+    size = pool.size()
+    capacity = size + max(pool._max_overflow, 0)
+    in_use = pool.checkedout()
+    return {
+        'class': type(pool).__name__,
+        'size': size,
+        'max_overflow': pool._max_overflow,
+        'checked_out': in_use,
+        'idle': pool.checkedin(),
+        'overflow': max(pool.overflow(), 0),
+        'saturation': round(in_use / capacity, 3) if capacity else None,
+    }
+
 @app.route('/api/health')
+@response_cache.exempt
 def health():
-    """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
-        'database': 'connected' if db.engine else 'disconnected'
-    })
+    """Health check endpoint: database round trip and pool usage; 503 when the database is unreachable"""
+    started = time.perf_counter()
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+        database, error = 'connected', None
+    except Exception as e:
+        database, error = 'disconnected', str(e)
+    body = {
+        'status': 'healthy' if error is None else 'unhealthy',
+        'database': database,
+        'latency_ms': round((time.perf_counter() - started) * 1000, 2),
+        'pool': _pool_status(db.engine.pool),
+    }
+    if error is not None:
+        body['error'] = error
+        return jsonify(body), 503
+    return jsonify(body)
 
 if __name__ == '__main__':
+    from migrations import upgrade
     with app.app_context():
         db.create_all()
+        with db.engine.begin() as conn:
+            upgrade(conn)
     app.run(debug=True, host='0.0.0.0', port=5001)
 
 
@@ -0,0 +1,539 @@
+"""
+Benchmarks and load tests for the API.
+
+`seed` generates a synthetic jobs CSV with the schema of
+data/cambodia_jobs_10k.csv (values resampled from it, reproducible with
+--seed) and bulk-loads it with the ingest pipeline into DATABASE_URL.
+`run` then times every read and matching route in-process: p50/p95/p99
+latency, SQL statements per request and peak memory per request, followed
+by a concurrent load profile. With --url the same requests go to a running
+server instead (ids for them are still read from DATABASE_URL). The run
+fails (exit status 1) when a threshold from --thresholds is exceeded, so it
+can gate CI.
+
+In-process runs first check the vectorized job and program scoring against
+set intersections over the association tables for random skill sets, and
+fail on any difference; `check-scoring` runs that check alone. They also
+pin the SQL statements of the list endpoints (QUERY_BUDGETS) with
+assert_max_queries, at one row and at a hundred.
+
+The response cache is disabled unless --cache is given, so the numbers
+measure the handlers and not cache hits. In-process runs use the stub
+chatbot provider (CHATBOT_PROVIDER=stub unless set otherwise), so the
+chatbot cases time retrieval and the answer cache without calling an
+external API. Streamed responses (exports, batch matching, SSE) are timed
+until their last byte.
+
+Usage (from the backend directory):
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmark seed --size 100k
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmark run
+    DATABASE_URL=... python -m benchmark run --url http://localhost:5001 --concurrency 32
+    python -m benchmark run --only jobs --json results.json
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmark check-scoring --queries 500
+
+benchmark_thresholds.json holds the limits for the 10k dataset on SQLite;
+pass a stricter or looser file with --thresholds for other setups.
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from urllib.parse import quote
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_CSV = os.path.join(BACKEND_DIR, 'data', 'cambodia_jobs_10k.csv')
+UNIVERSITIES_CSV = os.path.join(BACKEND_DIR, 'data', 'cambodia_universities.csv')
+DEFAULT_THRESHOLDS = os.path.join(BACKEND_DIR, 'benchmark_thresholds.json')
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+
+# --- Synthetic data ---
+
+def _size(value):
+    value = value.lower()
+    return SIZES[value] if value in SIZES else int(value)
+
+
+def generate_jobs_csv(path, count, seed=42, source=SOURCE_CSV):
+    """
+    Write `count` synthetic postings to `path`. Title, company and industry
+    are taken together from one source row so they stay consistent; the
+    other columns are drawn independently from the source's values.
+    """
+    rng = random.Random(seed)
+    with open(source, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames
+        rows = list(reader)
+
+    columns = {name: [r[name] for r in rows] for name in fieldnames}
+    dates = sorted(r['posted_date'] for r in rows if r['posted_date'])
+    first_day = date.fromisoformat(dates[0])
+    span = (date.fromisoformat(dates[-1]) - first_day).days + 1
+
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for i in range(1, count + 1):
+            base = rng.choice(rows)
+            salary_min = max(100, int(float(rng.choice(columns['salary_min_usd']) or 500) * rng.uniform(0.85, 1.15)))
+            skills = rng.choice(columns['required_skills']).split(', ')
+            if rng.random() < 0.5:
+                skills.append(rng.choice(rng.choice(columns['required_skills']).split(', ')))
+            writer.writerow({
+                **base,
+                'job_id': f'SYN{i:07d}',
+                'location': rng.choice(columns['location']),
+                'employment_type': rng.choice(columns['employment_type']),
+                'experience_level': rng.choice(columns['experience_level']),
+                'salary_min_usd': salary_min,
+                'salary_max_usd': int(salary_min * rng.uniform(1.2, 3.0)),
+                'required_skills': ', '.join(dict.fromkeys(s for s in skills if s)),
+                'languages_required': rng.choice(columns['languages_required']),
+                'degree_required': rng.choice(columns['degree_required']),
+                'posted_date': (first_day + timedelta(days=rng.randrange(span))).isoformat(),
+                'is_active': 'True' if rng.random() < 0.8 else 'False',
+            })
+
+
+def seed(size, seed_value, chunk_size, keep_csv=None):
+    from ingest import create_app, run
+    from models import db
+
+    count = _size(size)
+    path = keep_csv or os.path.join(tempfile.mkdtemp(prefix='lmi-bench-'), f'jobs_{count}.csv')
+    started = time.perf_counter()
+    generate_jobs_csv(path, count, seed_value)
+    print(f"Generated {count:,} jobs in {time.perf_counter() - started:.1f}s ({path})")
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        run(path, UNIVERSITIES_CSV, chunk_size)
+    if not keep_csv:
+        os.remove(path)
+
+
+# --- Cases ---
+
+# (name, method, path, JSON body); {placeholders} are filled from the database
+CASES = [
+    ('jobs', 'GET', '/api/jobs?per_page=20', None),
+    ('jobs filtered', 'GET', '/api/jobs?level=Senior&location={location}&per_page=20', None),
+    ('jobs by skill', 'GET', '/api/jobs?skill={skill}&per_page=20', None),
+    ('jobs search', 'GET', '/api/jobs?search=engineer&per_page=20', None),
+    ('jobs deep page', 'GET', '/api/jobs?page=200&per_page=20', None),
+    ('jobs cursor', 'GET', '/api/jobs?cursor=&per_page=20', None),
+    ('jobs cursor deep', 'GET', '/api/jobs?cursor={deep_cursor}&per_page=20', None),
+    ('jobs export', 'GET', '/api/jobs/export?level=Senior&location={location}', None),
+    ('job detail', 'GET', '/api/jobs/{job_id}', None),
+    ('jobs stats', 'GET', '/api/jobs/stats', None),
+    ('skills', 'GET', '/api/skills', None),
+    ('skills top', 'GET', '/api/skills/top', None),
+    ('skill jobs', 'GET', '/api/skills/{skill_id}/jobs', None),
+    ('skill programs', 'GET', '/api/skills/{skill_id}/programs', None),
+    ('skill related', 'GET', '/api/skills/{skill_id}/related', None),
+    ('skills next', 'GET', '/api/skills/next?skills={skill}', None),
+    ('universities', 'GET', '/api/universities', None),
+    ('university detail', 'GET', '/api/universities/{university_id}', None),
+    ('programs', 'GET', '/api/programs', None),
+    ('program detail', 'GET', '/api/programs/{program_id}', None),
+    ('programs export', 'GET', '/api/programs/export?format=csv', None),
+    ('analytics overview', 'GET', '/api/analytics/overview', None),
+    ('analytics salary', 'GET', '/api/analytics/salary-trends?by=industry', None),
+    ('analytics job trends', 'GET', '/api/analytics/job-trends?type=location', None),
+    ('analytics query', 'GET', '/api/analytics/query?group_by=industry,experience&metrics=count,p50,p90', None),
+    ('analytics trends', 'GET', '/api/analytics/trends?dimension=skill&label={skill}&interval=week', None),
+    ('analytics rising', 'GET', '/api/analytics/trends/rising?days=90', None),
+    ('analytics salary distribution', 'GET', '/api/analytics/salary-distribution?by=industry', None),
+    ('autocomplete', 'GET', '/api/autocomplete?q=da', None),
+    ('match jobs', 'POST', '/api/match/jobs', {'skills': '{skills}', 'limit': 20}),
+    ('match jobs batch', 'POST', '/api/match/jobs/batch', {'profiles': '{profiles}', 'limit': 10}),
+    ('skill gap', 'POST', '/api/match/skill-gap', {'user_skills': '{skills}', 'target_job_id': '{job_id}'}),
+    ('recommend programs', 'POST', '/api/recommend/programs', {'target_skills': '{skills}'}),
+    ('chatbot', 'POST', '/api/chatbot', {'message': 'Which skills do data analysts need in Phnom Penh?'}),
+    ('chatbot stream', 'POST', '/api/chatbot/stream', {'message': 'Which skills do data analysts need in Phnom Penh?'}),
+]
+
+# Profiles per 'match jobs batch' request
+BATCH_PROFILES = 50
+
+
+def sample_values():
+    """Real ids and names for the placeholders in CASES"""
+    from sqlalchemy import func, select
+    from models import db, Job, Program, Skill, University, job_skills
+    from services.pagination import encode_cursor
+
+    job_id = db.session.execute(select(Job.id).order_by(Job.id).limit(1)).scalar()
+    top_skills = db.session.execute(
+        select(Skill.id, Skill.name).join(job_skills, job_skills.c.skill_id == Skill.id)
+        .group_by(Skill.id, Skill.name).order_by(func.count().desc()).limit(5)
+    ).all()
+    # Cursor of the row just before 'jobs deep page', so both cases read the same page
+    deep = db.session.execute(
+        select(Job.posted_date, Job.id).order_by(Job.posted_date.desc().nulls_last(), Job.id.desc())
+        .offset(200 * 20 - 1).limit(1)
+    ).first()
+    rng = random.Random(0)
+    names = [s.name for s in top_skills]
+    return {
+        'deep_cursor': encode_cursor(*deep) if deep else '',
+        'profiles': [{'id': i, 'skills': rng.sample(names, rng.randint(1, len(names)))}
+                     for i in range(BATCH_PROFILES)],
+        'job_id': job_id,
+        'location': db.session.execute(select(Job.location).where(Job.id == job_id)).scalar(),
+        'skill': top_skills[0].name,
+        'skill_id': top_skills[0].id,
+        'skills': [s.name for s in top_skills[:3]],
+        'university_id': db.session.execute(select(University.id).limit(1)).scalar(),
+        'program_id': db.session.execute(select(Program.id).limit(1)).scalar(),
+    }
+
+
+def _fill_path(path, values):
+    return path.format(**{k: quote(str(v)) for k, v in values.items()})
+
+
+def _fill_body(body, values):
+    if body is None:
+        return None
+    return {k: values[v[1:-1]] if isinstance(v, str) and v.startswith('{') else v for k, v in body.items()}
+
+
+# --- Clients ---
+
+class InProcessClient:
+    """Flask test client: no network, and SQL statements can be counted"""
+
+    counts_queries = True
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        response.get_data()
+        return response.status_code
+
+
+class HTTPClient:
+    """A running server (gunicorn, python app.py)"""
+
+    counts_queries = False
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+# --- Measurements ---
+
+def _percentiles(samples):
+    p50, p95, p99 = np.percentile(np.array(samples) * 1000, [50, 95, 99])
+    return {'p50_ms': round(p50, 2), 'p95_ms': round(p95, 2), 'p99_ms': round(p99, 2)}
+
+
+def micro(client, case, iterations, warmup):
+    """Sequential timings of one case, plus SQL count and peak memory of one extra call"""
+    from services.serialization import count_queries
+
+    name, method, path, body = case
+    for _ in range(warmup):
+        client.request(method, path, body)
+
+    latencies, errors = [], 0
+    for _ in range(iterations):
+        started = time.perf_counter()
+        errors += client.request(method, path, body) >= 400
+        latencies.append(time.perf_counter() - started)
+    result = {'case': name, 'errors': errors, **_percentiles(latencies)}
+
+    if client.counts_queries:
+        tracemalloc.start()
+        with count_queries() as counter:
+            client.request(method, path, body)
+        result['queries'] = counter.count
+        result['peak_kib'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        tracemalloc.stop()
+    return result
+
+
+# (path, SQL statements allowed) of the list endpoints; the budget holds
+# whatever the number of rows returned, so an N+1 regression fails
+QUERY_BUDGETS = [
+    ('/api/jobs?per_page=1', 3),
+    ('/api/jobs?per_page=100', 3),
+    ('/api/programs?per_page=1', 3),
+    ('/api/programs?per_page=100', 3),
+    ('/api/universities?type=Public', 2),
+    ('/api/universities', 2),
+]
+
+
+def check_query_budgets(client):
+    """Failures of the list endpoints that run more SQL statements than QUERY_BUDGETS allows"""
+    from services.serialization import assert_max_queries
+
+    failures = []
+    for path, limit in QUERY_BUDGETS:
+        # Lookup caches load on first use
+        client.request('GET', path, None)
+        try:
+            with assert_max_queries(limit):
+                client.request('GET', path, None)
+        except AssertionError as e:
+            failures.append(f"queries {path}: {str(e).splitlines()[0]}")
+    return failures
+
+
+def load(client, case, concurrency, duration):
+    """Closed-loop load: `concurrency` workers call the case back to back for `duration` seconds"""
+    name, method, path, body = case
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        latencies, errors = [], 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                ok = client.request(method, path, body) < 400
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+        return latencies, errors
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(lambda _: worker(), range(concurrency)))
+    latencies = [t for samples, _ in results for t in samples]
+    errors = sum(e for _, e in results)
+    return {
+        'case': name,
+        'requests': len(latencies),
+        'rps': round(len(latencies) / duration, 1),
+        'error_rate': round(errors / max(len(latencies), 1), 4),
+        **_percentiles(latencies),
+    }
+
+
+# --- Thresholds and report ---
+
+def check(results, thresholds, section):
+    """Threshold violations of `results` against thresholds[section] ({'default': {...}, case: {...}})"""
+    limits = thresholds.get(section, {})
+    failures = []
+    for result in results:
+        applied = {**limits.get('default', {}), **limits.get(result['case'], {})}
+        for metric, limit in applied.items():
+            value = result.get(metric)
+            if value is not None and value > limit:
+                failures.append(f"{section} {result['case']}: {metric} {value} > {limit}")
+    return failures
+
+
+def _brute_force_links(link_table, link_column, where=None):
+    """{entity id: set of lowercase skill names} straight from the association table"""
+    from sqlalchemy import func, select
+    from models import db, Skill
+
+    query = select(link_column, func.lower(Skill.name)).join(Skill, Skill.id == link_table.c.skill_id)
+    if where is not None:
+        query = query.where(where)
+    links = {}
+    for entity_id, name in db.session.execute(query):
+        links.setdefault(entity_id, set()).add(name)
+    return links
+
+
+def _compare(label, brute, got, limit):
+    """Failures of one ranked result against the brute-force {id: (score, common)}"""
+    failures = []
+    expected = sorted((score for score, _ in brute.values()), reverse=True)[:limit]
+    scores = [score for _, score, _ in got]
+    if not np.allclose(scores, expected):
+        failures.append(f"{label}: scores {scores[:5]}... expected {expected[:5]}...")
+    for entity_id, score, common in got:
+        if entity_id not in brute:
+            failures.append(f"{label}: {entity_id} matched nothing by brute force")
+        elif not np.isclose(score, brute[entity_id][0]) or set(common) != brute[entity_id][1]:
+            failures.append(f"{label}: {entity_id} scored {score} {sorted(common)}, "
+                            f"expected {brute[entity_id][0]} {sorted(brute[entity_id][1])}")
+    return failures
+
+
+def check_scoring(queries=100, seed=0):
+    """
+    Compare match_jobs and rank_programs with set intersections over the
+    association tables for random skill sets; returns the mismatches.
+    """
+    from sqlalchemy import select
+    from models import Job, job_skills, program_skills
+    from services import scoring
+
+    jobs = _brute_force_links(job_skills, job_skills.c.job_id,
+                              job_skills.c.job_id.in_(select(Job.id).where(Job.is_active)))
+    programs = _brute_force_links(program_skills, program_skills.c.program_id)
+    vocabulary = sorted(set().union(*jobs.values(), *programs.values()))
+    rng = random.Random(seed)
+    failures = []
+    for i in range(queries):
+        skills = rng.sample(vocabulary, min(rng.randint(1, 8), len(vocabulary)))
+        query = set(skills)
+
+        brute = {}
+        for job_id, names in jobs.items():
+            common = names & query
+            if common:
+                brute[job_id] = (len(common) / len(names), common)
+        total, top = scoring.match_jobs(skills, limit=50)
+        if total != len(brute):
+            failures.append(f"jobs query {i}: {total} matches, expected {len(brute)}")
+        failures += _compare(f"jobs query {i}", brute, [(j, s, c) for j, s, c, _ in top], 50)
+
+        brute = {}
+        for program_id, names in programs.items():
+            covered = names & query
+            if covered:
+                brute[program_id] = (len(covered), covered)
+        failures += _compare(f"programs query {i}", brute, scoring.rank_programs(skills, limit=20), 20)
+    return failures
+
+
+def print_table(title, results, columns):
+    print(f"\n{title}")
+    widths = [max(len(c), *(len(str(r.get(c, ''))) for r in results)) for c in columns]
+    print('  '.join(c.ljust(w) for c, w in zip(columns, widths)))
+    for r in results:
+        print('  '.join(str(r.get(c, '')).ljust(w) for c, w in zip(columns, widths)))
+
+
+def run(args):
+    if not args.cache:
+        os.environ['CACHE_BACKEND'] = 'none'
+    # Slow statements are what the report is for; keep them out of the log
+    os.environ.setdefault('SLOW_QUERY_MS', '0')
+    os.environ.setdefault('CHATBOT_PROVIDER', 'stub')
+    from app import app
+
+    with app.app_context():
+        values = sample_values()
+        scoring_failures = [] if args.url else check_scoring()
+    for failure in scoring_failures[:20]:
+        print(f"✗ scoring {failure}")
+    if not args.url and not scoring_failures:
+        print("✓ Scoring matches the brute-force set intersections")
+    cases = [(name, method, _fill_path(path, values), _fill_body(body, values)) for name, method, path, body in CASES
+             if not args.only or any(word in name for word in args.only)]
+    client = HTTPClient(args.url) if args.url else InProcessClient(app)
+
+    budget_failures = check_query_budgets(client) if client.counts_queries else []
+    for failure in budget_failures:
+        print(f"✗ {failure}")
+    if client.counts_queries and not budget_failures:
+        print("✓ List endpoints stay within their query budgets")
+
+    micro_results = [micro(client, case, args.iterations, args.warmup) for case in cases]
+    print_table(f"Micro-benchmarks ({args.iterations} sequential calls each)", micro_results,
+                ['case', 'errors', 'p50_ms', 'p95_ms', 'p99_ms', 'queries', 'peak_kib'])
+
+    load_results = []
+    if args.duration > 0:
+        load_results = [load(client, case, args.concurrency, args.duration) for case in cases]
+        print_table(f"Load ({args.concurrency} concurrent clients, {args.duration:g}s per case)", load_results,
+                    ['case', 'requests', 'rps', 'error_rate', 'p50_ms', 'p95_ms', 'p99_ms'])
+
+    # ru_maxrss is in KiB on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\nPeak RSS of the benchmark process: {peak_rss:,.0f} MiB")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'micro': micro_results, 'load': load_results, 'peak_rss_mib': round(peak_rss, 1)}, f, indent=2)
+
+    failures = scoring_failures + budget_failures
+    if args.thresholds:
+        with open(args.thresholds) as f:
+            thresholds = json.load(f)
+        threshold_failures = check(micro_results, thresholds, 'micro') + check(load_results, thresholds, 'load')
+        for failure in threshold_failures:
+            print(f"✗ {failure}")
+        if not threshold_failures:
+            print("✓ All thresholds met")
+        failures += threshold_failures
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark and load-test the LMI API')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = commands.add_parser('seed', help='generate a synthetic dataset and load it into DATABASE_URL')
+    seed_parser.add_argument('--size', default='10k', help='10k, 100k, 1m or a number of jobs')
+    seed_parser.add_argument('--seed', type=int, default=42)
+    seed_parser.add_argument('--chunk-size', type=int, default=20000)
+    seed_parser.add_argument('--keep-csv', help='write the generated CSV here and keep it')
+
+    run_parser = commands.add_parser('run', help='benchmark the API')
+    run_parser.add_argument('--url', help='benchmark a running server instead of the app in-process')
+    run_parser.add_argument('--iterations', type=int, default=30)
+    run_parser.add_argument('--warmup', type=int, default=3)
+    run_parser.add_argument('--concurrency', type=int, default=8)
+    run_parser.add_argument('--duration', type=float, default=3, help='seconds of load per case (0 to skip)')
+    run_parser.add_argument('--only', nargs='*', help='only cases whose name contains one of these words')
+    run_parser.add_argument('--cache', action='store_true', help='keep the response cache enabled')
+    run_parser.add_argument('--thresholds', default=DEFAULT_THRESHOLDS, help="JSON limits ('' to skip)")
+    run_parser.add_argument('--json', help='also write the results to this file')
+
+    check_parser = commands.add_parser('check-scoring',
+                                       help='compare job and program scoring with brute force on DATABASE_URL')
+    check_parser.add_argument('--queries', type=int, default=100)
+    check_parser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args(argv)
+    if args.command == 'seed':
+        seed(args.size, args.seed, args.chunk_size, args.keep_csv)
+        return 0
+    if args.command == 'check-scoring':
+        from app import app
+        with app.app_context():
+            failures = check_scoring(args.queries, args.seed)
+        for failure in failures:
+            print(f"✗ {failure}")
+        if not failures:
+            print(f"✓ {args.queries} queries match the brute-force set intersections")
+        return 1 if failures else 0
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
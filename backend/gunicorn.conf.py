@@ -0,0 +1,41 @@
+"""
+Gunicorn settings, read from the environment:
+
+    WEB_CONCURRENCY / GUNICORN_WORKERS   worker processes (default 2 x CPUs + 1)
+    GUNICORN_THREADS                     threads per worker (default 4)
+    PORT                                 listen port (default 5001)
+    GUNICORN_TIMEOUT                     seconds before a silent worker is restarted
+    MIGRATE_ON_START                     apply migrations once before workers start (default 1)
+    PROMETHEUS_MULTIPROC_DIR             empty directory shared by the workers' metrics
+
+Each worker has its own connection pool, so the database sees up to
+workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+workers = int(os.getenv('GUNICORN_WORKERS', os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1)))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then so slow leaks cannot build up
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = 200
+accesslog = '-'
+
+
+def on_starting(server):
+    """Apply migrations once, in the master, before any worker starts"""
+    if os.getenv('MIGRATE_ON_START', '1') not in ('0', 'false', 'False'):
+        from migrations import main as migrate
+        migrate()
+
+
+def child_exit(server, worker):
+    """Drop the live metrics of a worker that exited"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,493 @@
+"""
+Bulk loader for the jobs and universities CSVs.
+
+Replaces the row-by-row seeding cells of data_engineering.ipynb: the CSVs are
+streamed in chunks, companies and skills are deduplicated in memory and every
+table is loaded with PostgreSQL COPY (or batched INSERT ... ON CONFLICT DO
+NOTHING on other databases) inside a single transaction.
+
+With --delta, each posting's content hash is compared with the stored one so
+only inserts, updates and is_active flips are written.
+
+The analytics rollups are rebuilt, the trend buckets of every posting day
+that was loaded are refreshed and the data version bumped (invalidating the
+API's response cache) at the end of the same transaction.
+
+Usage (from the backend directory):
+    python -m ingest
+    python -m ingest --jobs data/cambodia_jobs_10k.csv --chunk-size 5000
+    python -m ingest --delta --deactivate-missing --universities ''
+"""
+import argparse
+import csv
+import hashlib
+import io
+import os
+import time
+from datetime import date, datetime
+from itertools import islice
+
+from flask import Flask
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from config import Config
+from models import (db, Company, Job, Skill, University, Program, SkillType,
+                    job_skills)
+from migrations import upgrade
+from services.cache import bump_data_version
+from services.lookups import sync_lookups
+from services.rollups import refresh_rollups
+from services.trends import refresh_trends
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Same categorization as the notebook
+LANGUAGE_SKILLS = {'Khmer', 'English', 'Chinese', 'French', 'Japanese', 'Korean', 'Vietnamese'}
+
+SOFT_SKILLS = {
+    'Communication', 'Teamwork', 'Leadership', 'Problem Solving',
+    'Time Management', 'Customer Service', 'Project Management',
+    'Accounting', 'Photography'
+}
+
+
+def categorize_skill(skill_name):
+    if skill_name in LANGUAGE_SKILLS:
+        return SkillType.LANGUAGE
+    elif skill_name in SOFT_SKILLS:
+        return SkillType.SOFT
+    else:
+        return SkillType.TECHNICAL
+
+
+# --- Row parsing ---
+
+def _text(value):
+    value = (value or '').strip()
+    return value or None
+
+
+def _float(value, default=None):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _int(value):
+    value = _float(value)
+    return int(value) if value is not None else None
+
+
+def _bool(value):
+    return (value or '').strip().lower() in ('true', '1', 't', 'yes')
+
+
+def _date(value):
+    try:
+        return date.fromisoformat((value or '').strip()[:10])
+    except ValueError:
+        return None
+
+
+def split_skills(value):
+    """'Python, SQL, Python' -> ['Python', 'SQL'] (order kept, duplicates dropped)"""
+    return list(dict.fromkeys(s.strip() for s in (value or '').split(',') if s.strip()))
+
+
+def read_chunks(path, chunk_size):
+    """Stream a CSV file as lists of dict rows"""
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        while chunk := list(islice(reader, chunk_size)):
+            yield chunk
+
+
+# --- Table loading ---
+
+class TableLoader:
+    """
+    Loads rows into one table on an open connection.
+
+    PostgreSQL goes through COPY into a temporary staging table followed by
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING; other dialects use batched
+    executemany with ON CONFLICT DO NOTHING.
+    """
+
+    def __init__(self, conn, table, columns):
+        self.conn = conn
+        self.table = table
+        self.columns = columns
+        self.rows = 0
+        self.seconds = 0.0
+        self.use_copy = conn.dialect.name == 'postgresql'
+        self._staged = False
+
+    def load(self, rows):
+        if not rows:
+            return
+        start = time.perf_counter()
+        if self.use_copy:
+            self._copy(rows)
+        else:
+            self._executemany(rows)
+        self.seconds += time.perf_counter() - start
+        self.rows += len(rows)
+
+    def _executemany(self, rows):
+        insert = sqlite.insert if self.conn.dialect.name == 'sqlite' else postgresql.insert
+        stmt = insert(self.table).on_conflict_do_nothing()
+        self.conn.execute(stmt, [dict(zip(self.columns, row)) for row in rows])
+
+    def _copy(self, rows):
+        stage = f'_stage_{self.table.name}'
+        cols = ', '.join(self.columns)
+        cursor = self.conn.connection.driver_connection.cursor()
+        if not self._staged:
+            cursor.execute(
+                f'CREATE TEMP TABLE {stage} (LIKE {self.table.name} INCLUDING DEFAULTS) ON COMMIT DROP'
+            )
+            self._staged = True
+        else:
+            cursor.execute(f'TRUNCATE {stage}')
+
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows:
+            writer.writerow([v.name if isinstance(v, SkillType) else v for v in row])
+        buf.seek(0)
+        cursor.copy_expert(f'COPY {stage} ({cols}) FROM STDIN WITH (FORMAT csv)', buf)
+        cursor.execute(
+            f'INSERT INTO {self.table.name} ({cols}) SELECT {cols} FROM {stage} ON CONFLICT DO NOTHING'
+        )
+        cursor.close()
+
+    def report(self):
+        rate = self.rows / self.seconds if self.seconds else 0
+        print(f"  {self.table.name:<14} {self.rows:>8} rows in {self.seconds:6.2f}s ({rate:,.0f} rows/s)")
+
+
+class NameLookup:
+    """In-memory name -> id map for tables with a unique name column"""
+
+    def __init__(self, conn, loader, model):
+        self.conn = conn
+        self.loader = loader
+        self.model = model
+        self.ids = dict(conn.execute(select(model.name, model.id)).all())
+
+    def resolve(self, rows_by_name):
+        """Insert names not seen yet, then refresh their ids"""
+        new = {name: row for name, row in rows_by_name.items() if name not in self.ids}
+        if not new:
+            return
+        self.loader.load(list(new.values()))
+        self.ids.update(self.conn.execute(
+            select(self.model.name, self.model.id).where(self.model.name.in_(list(new)))
+        ).all())
+
+
+JOB_COLUMNS = [
+    'id', 'title', 'company_id', 'location', 'employment_type', 'experience_level',
+    'salary_min_usd', 'salary_max_usd', 'degree_required', 'languages_required',
+    'description', 'posted_date', 'is_active', 'content_hash', 'created_at'
+]
+
+
+def parse_job(r):
+    """CSV row -> (job values keyed by JOB_COLUMNS, company name, skill names)"""
+    company = _text(r['company_name'])
+    skills = split_skills(r['required_skills'])
+    job = {
+        'id': r['job_id'].strip(),
+        'title': _text(r['job_title']),
+        'location': _text(r['location']),
+        'employment_type': _text(r['employment_type']),
+        'experience_level': _text(r['experience_level']),
+        'salary_min_usd': _float(r['salary_min_usd'], 0.0),
+        'salary_max_usd': _float(r['salary_max_usd'], 0.0),
+        'degree_required': _text(r['degree_required']),
+        'languages_required': _text(r['languages_required']),
+        'description': _text(r['description']),
+        'posted_date': _date(r['posted_date']),
+        'is_active': _bool(r['is_active']),
+    }
+    job['content_hash'] = content_hash(job, company, skills)
+    return job, company, skills
+
+
+# Fields that make up a posting's content; is_active is deliberately left out
+# so activation flips are applied without rewriting the row
+HASHED_FIELDS = [
+    'title', 'location', 'employment_type', 'experience_level', 'salary_min_usd',
+    'salary_max_usd', 'degree_required', 'languages_required', 'description', 'posted_date'
+]
+
+
+def content_hash(job, company, skills):
+    parts = [company, *(job[f] for f in HASHED_FIELDS), *skills]
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update('\x1f'.join('' if p is None else str(p) for p in parts).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _job_loaders(conn):
+    now = datetime.utcnow()
+    companies = TableLoader(conn, Company.__table__, ['name', 'industry', 'created_at'])
+    skills = TableLoader(conn, Skill.__table__, ['name', 'skill_type', 'created_at'])
+    jobs = TableLoader(conn, Job.__table__, JOB_COLUMNS)
+    links = TableLoader(conn, job_skills, ['job_id', 'skill_id'])
+    return now, companies, skills, jobs, links
+
+
+def _resolve(company_ids, skill_ids, chunk, now):
+    """Make sure every company and skill referenced by parsed rows has an id"""
+    new_companies = {}
+    new_skills = {}
+    for job, company, skills, industry in chunk:
+        if company:
+            new_companies.setdefault(company, (company, industry, now))
+        for skill in skills:
+            new_skills.setdefault(skill, (skill, categorize_skill(skill), now))
+    company_ids.resolve(new_companies)
+    skill_ids.resolve(new_skills)
+
+
+def _parsed_chunks(path, chunk_size):
+    for chunk in read_chunks(path, chunk_size):
+        yield [(*parse_job(r), _text(r['industry'])) for r in chunk]
+
+
+def _job_rows(parsed, company_ids, skill_ids, now):
+    job_rows = []
+    link_rows = []
+    for job, company, skills, _ in parsed:
+        company_id = company_ids.ids.get(company)
+        if company_id is None:
+            continue
+        job_rows.append(tuple({**job, 'company_id': company_id, 'created_at': now}[c] for c in JOB_COLUMNS))
+        link_rows.extend((job['id'], skill_ids.ids[s]) for s in skills)
+    return job_rows, link_rows
+
+
+def ingest_jobs(conn, path, chunk_size, days):
+    """Load every posting; their posting days are added to `days`"""
+    now, companies, skills, jobs, links = _job_loaders(conn)
+    company_ids = NameLookup(conn, companies, Company)
+    skill_ids = NameLookup(conn, skills, Skill)
+
+    for parsed in _parsed_chunks(path, chunk_size):
+        _resolve(company_ids, skill_ids, parsed, now)
+        days.update(job['posted_date'] for job, *_ in parsed)
+        job_rows, link_rows = _job_rows(parsed, company_ids, skill_ids, now)
+        jobs.load(job_rows)
+        links.load(link_rows)
+
+    return [companies, skills, jobs, links]
+
+
+class DeltaStats:
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.activated = 0
+        self.deactivated = 0
+        self.unchanged = 0
+        self.seconds = 0.0
+
+    def report(self):
+        print(f"  delta          {self.inserted} inserted, {self.updated} updated, "
+              f"{self.activated} activated, {self.deactivated} deactivated, "
+              f"{self.unchanged} unchanged ({self.seconds:.2f}s)")
+
+
+def ingest_jobs_delta(conn, path, chunk_size, days, deactivate_missing=False):
+    """
+    Apply only what changed since the last load.
+
+    Every posting's content hash is compared with the stored one: new ids are
+    inserted, changed hashes are updated (job_skills rows replaced), and rows
+    whose only change is is_active are flipped in bulk. With
+    deactivate_missing, active jobs absent from the feed are deactivated.
+    The posting days of inserted and updated jobs (before and after the
+    update) are added to `days`.
+    """
+    start = time.perf_counter()
+    now, companies, skills, jobs, links = _job_loaders(conn)
+    company_ids = NameLookup(conn, companies, Company)
+    skill_ids = NameLookup(conn, skills, Skill)
+    stats = DeltaStats()
+
+    table = Job.__table__
+    stored = {
+        job_id: (digest, is_active, posted_date)
+        for job_id, digest, is_active, posted_date in conn.execute(
+            select(table.c.id, table.c.content_hash, table.c.is_active, table.c.posted_date)
+        )
+    }
+    update_columns = [c for c in JOB_COLUMNS if c not in ('id', 'created_at')]
+    update_job = (
+        update(table)
+        .where(table.c.id == bindparam('b_id'))
+        .values({**{c: bindparam(c) for c in update_columns}, 'location_id': None})  # re-resolved by sync_lookups
+    )
+    seen = set()
+
+    for parsed in _parsed_chunks(path, chunk_size):
+        inserts = []
+        updates = []
+        flips = {True: [], False: []}
+        for item in parsed:
+            job = item[0]
+            seen.add(job['id'])
+            old = stored.get(job['id'])
+            if old is None:
+                inserts.append(item)
+                days.add(job['posted_date'])
+            elif old[0] != job['content_hash']:
+                updates.append(item)
+                days.update((old[2], job['posted_date']))
+            elif old[1] != job['is_active']:
+                flips[job['is_active']].append(job['id'])
+            else:
+                stats.unchanged += 1
+
+        _resolve(company_ids, skill_ids, inserts + updates, now)
+
+        job_rows, link_rows = _job_rows(inserts, company_ids, skill_ids, now)
+        jobs.load(job_rows)
+        stats.inserted += len(job_rows)
+
+        job_rows, update_links = _job_rows(updates, company_ids, skill_ids, now)
+        if job_rows:
+            params = [dict(zip(JOB_COLUMNS, row)) for row in job_rows]
+            for p in params:
+                p['b_id'] = p.pop('id')
+                del p['created_at']
+            conn.execute(update_job, params)
+            conn.execute(delete(job_skills).where(job_skills.c.job_id.in_([p['b_id'] for p in params])))
+            stats.updated += len(job_rows)
+        links.load(link_rows + update_links)
+
+        for value, ids in flips.items():
+            _set_active(conn, ids, value, stats)
+
+    if deactivate_missing:
+        missing = [job_id for job_id, (_, active, _) in stored.items() if active and job_id not in seen]
+        for i in range(0, len(missing), chunk_size):
+            _set_active(conn, missing[i:i + chunk_size], False, stats)
+
+    stats.seconds = time.perf_counter() - start
+    return [companies, skills, jobs, links, stats]
+
+
+def _set_active(conn, ids, value, stats):
+    if not ids:
+        return
+    table = Job.__table__
+    conn.execute(update(table).where(table.c.id.in_(ids)).values(is_active=value))
+    if value:
+        stats.activated += len(ids)
+    else:
+        stats.deactivated += len(ids)
+
+
+def ingest_universities(conn, path, chunk_size):
+    now = datetime.utcnow()
+    universities = TableLoader(conn, University.__table__, [
+        'name', 'university_type', 'location', 'established_year', 'created_at'
+    ])
+    programs = TableLoader(conn, Program.__table__, [
+        'id', 'university_id', 'program_name', 'program_category', 'degree_level',
+        'duration_years', 'annual_tuition_usd', 'enrollment_capacity', 'accredited',
+        'languages_of_instruction', 'in_demand_field', 'created_at'
+    ])
+    university_ids = NameLookup(conn, universities, University)
+
+    for chunk in read_chunks(path, chunk_size):
+        university_ids.resolve({
+            r['university_name'].strip(): (
+                r['university_name'].strip(), _text(r['university_type']),
+                _text(r['location']), _int(r['established_year']), now
+            )
+            for r in chunk
+        })
+        programs.load([
+            (
+                r['university_id'].strip(), university_ids.ids[r['university_name'].strip()],
+                _text(r['program_name']), _text(r['program_category']), _text(r['degree_level']),
+                _int(r['duration_years']), _float(r['annual_tuition_usd']),
+                _int(r['enrollment_capacity']), _bool(r['accredited']),
+                _text(r['languages_of_instruction']), _bool(r['in_demand_field']), now
+            )
+            for r in chunk
+        ])
+
+    return [universities, programs]
+
+
+def run(jobs_path, universities_path, chunk_size, delta=False, deactivate_missing=False, progress=None):
+    """Load everything in one transaction; `progress(fraction, message)` is told about each step"""
+    step = progress or (lambda fraction, message: None)
+    start = time.perf_counter()
+    loaders = []
+    days = set()
+    with db.engine.begin() as conn:
+        upgrade(conn)
+        if jobs_path and delta:
+            print(f"Applying job changes from {jobs_path}...")
+            step(0.0, 'Applying job changes')
+            loaders += ingest_jobs_delta(conn, jobs_path, chunk_size, days, deactivate_missing)
+        elif jobs_path:
+            print(f"Loading jobs from {jobs_path}...")
+            step(0.0, 'Loading jobs')
+            loaders += ingest_jobs(conn, jobs_path, chunk_size, days)
+        if universities_path:
+            print(f"Loading universities from {universities_path}...")
+            step(0.6, 'Loading universities')
+            loaders += ingest_universities(conn, universities_path, chunk_size)
+        step(0.7, 'Refreshing lookups and rollups')
+        sync_lookups(conn)
+        refresh_rollups(conn)
+        step(0.85, 'Refreshing trends')
+        refresh_trends(conn, days)
+        bump_data_version(conn)
+        step(0.95, 'Committing')
+
+    total = time.perf_counter() - start
+    for loader in loaders:
+        loader.report()
+    rows = sum(getattr(loader, 'rows', 0) for loader in loaders)
+    print(f"✓ Loaded {rows} rows in {total:.2f}s ({rows / total:,.0f} rows/s)")
+    return loaders
+
+
+def create_app():
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk-load LMI CSV data into the database')
+    parser.add_argument('--jobs', default=os.path.join(DATA_DIR, 'cambodia_jobs_10k.csv'),
+                        help='jobs CSV (empty string to skip)')
+    parser.add_argument('--universities', default=os.path.join(DATA_DIR, 'cambodia_universities.csv'),
+                        help='universities/programs CSV (empty string to skip)')
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--delta', action='store_true',
+                        help='only apply new, changed and (de)activated jobs, detected by content hash')
+    parser.add_argument('--deactivate-missing', action='store_true',
+                        help='with --delta, deactivate active jobs that are not in the feed')
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        run(args.jobs, args.universities, args.chunk_size, args.delta, args.deactivate_missing)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Offline batch matching: skill profiles in, NDJSON matches out.
+
+Reads profiles as NDJSON (one {"id", "skills", "experience_level",
+"location"} object per line) or a JSON list, scores them against the job
+index loaded once from DATABASE_URL, and writes one line per profile in
+input order, the same records as POST /api/match/jobs/batch. With
+--workers, chunks of profiles are scored in forked worker processes that
+share the parent's snapshot.
+
+Usage (from the backend directory):
+    python -m match_batch profiles.ndjson > matches.ndjson
+    python -m match_batch profiles.json --limit 20 --workers 8 --output matches.ndjson
+    cat profiles.ndjson | python -m match_batch -
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from flask import Flask
+
+from config import Config
+from models import db
+from services.batch_match import match_records, ndjson_lines, read_profiles
+from services.skill_index import job_index
+
+
+def load_profiles(path):
+    with (sys.stdin if path == '-' else open(path, encoding='utf-8')) as f:
+        text = f.read()
+    if text.lstrip().startswith('['):
+        profiles = json.loads(text)
+        if not all(isinstance(p, dict) for p in profiles):
+            raise ValueError('Every profile must be a JSON object')
+        return profiles
+    return read_profiles(text.splitlines())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('profiles', help="NDJSON or JSON list of profiles ('-' for stdin)")
+    parser.add_argument('--output', '-o', default='-', help="Output NDJSON file (default: stdout)")
+    parser.add_argument('--limit', type=int, default=10, help="Matches per profile (at most 50)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: CPU count, 1 scores in-process)")
+    args = parser.parse_args()
+
+    profiles = load_profiles(args.profiles)
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    with app.app_context():
+        start = time.perf_counter()
+        job_index.matrix()
+        loaded = time.perf_counter() - start
+        out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+        try:
+            for line in ndjson_lines(match_records(profiles, args.limit, args.workers)):
+                out.write(line)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        total = time.perf_counter() - start
+    print(f"✓ Matched {len(profiles)} profiles in {total:.2f}s (index loaded in {loaded:.2f}s, "
+          f"{len(profiles) / max(total - loaded, 1e-9):,.0f} profiles/s)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
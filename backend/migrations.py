@@ -0,0 +1,176 @@
+"""
+Schema migrations for existing databases.
+
+db.create_all() only creates missing tables, so columns, indexes and lookup
+tables added to models.py after a database was created are applied here.
+Every step is idempotent (safe on a database created from the current
+models) and recorded in schema_migrations so it only runs once.
+
+Usage (from the backend directory):
+    python -m migrations
+"""
+from datetime import datetime
+
+from flask import Flask
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, select, text
+
+from config import Config
+from models import (db, Company, DataVersion, Industry, Job, JobRollup, JobTrend,
+                    Location, RollupState, SalarySketch, Task, University)
+from services.lookups import sync_lookups
+from services.rollups import refresh_rollups
+from services.salary import refresh_salary_sketches
+from services.search import ensure_search_schema
+from services.trends import refresh_trends
+
+schema_migrations = Table(
+    'schema_migrations', MetaData(),
+    Column('version', String(100), primary_key=True),
+    Column('applied_at', DateTime, default=datetime.utcnow),
+)
+
+MIGRATIONS = []
+
+
+class MigrationSkipped(Exception):
+    """Raised by a step that cannot run yet; it is retried on the next upgrade"""
+
+
+def migration(version):
+    def register(fn):
+        MIGRATIONS.append((version, fn))
+        return fn
+    return register
+
+
+def _add_column(conn, model, name):
+    """ALTER TABLE ... ADD COLUMN for a column declared on the model, if missing"""
+    table = model.__table__
+    if name in {c['name'] for c in inspect(conn).get_columns(table.name)}:
+        return
+    col = table.c[name]
+    ddl = f'ALTER TABLE {table.name} ADD COLUMN {name} {col.type.compile(conn.dialect)}'
+    for fk in col.foreign_keys:
+        ddl += f' REFERENCES {fk.column.table.name} ({fk.column.name})'
+    conn.execute(text(ddl))
+
+
+def _create_index(conn, model, name):
+    """CREATE INDEX for an index declared on the model, if missing"""
+    index = next(i for i in model.__table__.indexes if i.name == name)
+    index.create(conn, checkfirst=True)
+
+
+@migration('0001_job_content_hash')
+def _job_content_hash(conn):
+    _add_column(conn, Job, 'content_hash')
+
+
+@migration('0002_jobs_posted_date_id_index')
+def _jobs_keyset_index(conn):
+    _create_index(conn, Job, 'ix_jobs_posted_date_id')
+
+
+@migration('0003_job_full_text_search')
+def _job_search(conn):
+    ensure_search_schema(conn)
+
+
+@migration('0004_location_industry_lookups')
+def _lookups(conn):
+    Location.__table__.create(conn, checkfirst=True)
+    Industry.__table__.create(conn, checkfirst=True)
+    _add_column(conn, Job, 'location_id')
+    _add_column(conn, University, 'location_id')
+    _add_column(conn, Company, 'industry_id')
+    _create_index(conn, Job, 'ix_jobs_location_id')
+    _create_index(conn, University, 'ix_universities_location_id')
+    _create_index(conn, Company, 'ix_companies_industry_id')
+    sync_lookups(conn)
+
+
+@migration('0005_trigram_indexes')
+def _trigram_indexes(conn):
+    """GIN trigram indexes for the remaining ILIKE '%x%' filters (PostgreSQL only)"""
+    if conn.dialect.name != 'postgresql':
+        return
+    try:
+        # pg_trgm may need a superuser to install; keep going without it
+        with conn.begin_nested():
+            conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    except Exception as e:
+        raise MigrationSkipped(f'pg_trgm unavailable ({e.__class__.__name__})')
+    for table, col in [('skills', 'name'), ('universities', 'name'),
+                       ('programs', 'program_name'), ('locations', 'name'),
+                       ('industries', 'name'), ('jobs', 'title')]:
+        conn.execute(text(
+            f'CREATE INDEX IF NOT EXISTS ix_{table}_{col}_trgm '
+            f'ON {table} USING GIN ({col} gin_trgm_ops)'
+        ))
+
+
+@migration('0006_analytics_rollups')
+def _rollups(conn):
+    JobRollup.__table__.create(conn, checkfirst=True)
+    RollupState.__table__.create(conn, checkfirst=True)
+    refresh_rollups(conn)
+
+
+@migration('0007_data_version')
+def _data_version(conn):
+    DataVersion.__table__.create(conn, checkfirst=True)
+
+
+@migration('0008_job_trends')
+def _job_trends(conn):
+    JobTrend.__table__.create(conn, checkfirst=True)
+    refresh_trends(conn)
+
+
+@migration('0009_salary_sketches')
+def _salary_sketches(conn):
+    SalarySketch.__table__.create(conn, checkfirst=True)
+    refresh_salary_sketches(conn)
+
+
+@migration('0010_tasks')
+def _tasks(conn):
+    Task.__table__.create(conn, checkfirst=True)
+
+
+def upgrade(conn):
+    """Apply pending migrations on an open connection; returns their versions"""
+    schema_migrations.create(conn, checkfirst=True)
+    applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+    ran = []
+    for version, fn in MIGRATIONS:
+        if version in applied:
+            continue
+        try:
+            fn(conn)
+        except MigrationSkipped as e:
+            print(f"  skipped {version}: {e}")
+            continue
+        conn.execute(schema_migrations.insert().values(version=version, applied_at=datetime.utcnow()))
+        ran.append(version)
+    return ran
+
+
+def main():
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as conn:
+            ran = upgrade(conn)
+        # Do not leave pooled connections behind for forked processes
+        db.engine.dispose()
+    for version in ran:
+        print(f"✓ Applied {version}")
+    if not ran:
+        print("✓ Database is up to date")
+
+
+if __name__ == '__main__':
+    main()
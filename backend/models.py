@@ -1,3 +1,5 @@
+import json
+
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from enum import Enum
@@ -45,6 +47,20 @@ program_skills = db.Table('program_skills',
     db.Column('skill_id', db.Integer, db.ForeignKey('skills.id'), primary_key=True)
 )
 
+# Lookup tables: canonical location and industry names, so exact-match
+# filters become integer comparisons
+class Location(db.Model):
+    __tablename__ = 'locations'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False, unique=True, index=True)
+
+class Industry(db.Model):
+    __tablename__ = 'industries'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False, unique=True, index=True)
+
 # Models
 class Company(db.Model):
     __tablename__ = 'companies'
@@ -52,17 +68,18 @@ class Company(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False, unique=True, index=True)
     industry = db.Column(db.String(100))
+    industry_id = db.Column(db.Integer, db.ForeignKey('industries.id'), index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
     jobs = db.relationship('Job', backref='company', lazy='dynamic', cascade='all, delete-orphan')
     
-    def to_dict(self):
+    def to_dict(self, job_count=None):
         return {
             'id': self.id,
             'name': self.name,
             'industry': self.industry,
-            'job_count': self.jobs.count()
+            'job_count': self.jobs.count() if job_count is None else job_count
         }
 
 class Skill(db.Model):
@@ -73,17 +90,23 @@ class Skill(db.Model):
     skill_type = db.Column(db.Enum(SkillType), nullable=False, default=SkillType.TECHNICAL)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    def to_dict(self):
+    def to_dict(self, job_count=None, program_count=None):
+        # Pass the counts (see services.serialization.skills_with_counts) to
+        # skip loading every linked job and program
         return {
             'id': self.id,
             'name': self.name,
             'type': self.skill_type.value if self.skill_type else None,
-            'job_count': len(self.jobs),
-            'program_count': len(self.programs)
+            'job_count': len(self.jobs) if job_count is None else job_count,
+            'program_count': len(self.programs) if program_count is None else program_count
         }
 
 class Job(db.Model):
     __tablename__ = 'jobs'
+    __table_args__ = (
+        # Keyset pagination order (posted_date DESC, id DESC)
+        db.Index('ix_jobs_posted_date_id', 'posted_date', 'id'),
+    )
     
     id = db.Column(db.String(20), primary_key=True)
     title = db.Column(db.String(200), nullable=False, index=True)
@@ -91,6 +114,7 @@ class Job(db.Model):
     
     # Location and Type
     location = db.Column(db.String(100), index=True)
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), index=True)
     employment_type = db.Column(db.String(50))
     experience_level = db.Column(db.String(50), index=True)
     
@@ -106,6 +130,7 @@ class Job(db.Model):
     description = db.Column(db.Text)
     posted_date = db.Column(db.Date, index=True)
     is_active = db.Column(db.Boolean, default=True, index=True)
+    content_hash = db.Column(db.String(32))  # Set by ingest.py to detect changed postings
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -113,11 +138,12 @@ class Job(db.Model):
                            backref=db.backref('jobs', lazy=True))
     
     def to_dict(self, include_skills=True):
+        company = self.company
         return {
             'id': self.id,
             'title': self.title,
-            'company': self.company.name if self.company else None,
-            'industry': self.company.industry if self.company else None,
+            'company': company.name if company else None,
+            'industry': company.industry if company else None,
             'location': self.location,
             'employment_type': self.employment_type,
             'experience_level': self.experience_level,
@@ -137,23 +163,28 @@ class University(db.Model):
     name = db.Column(db.String(200), nullable=False, unique=True, index=True)
     university_type = db.Column(db.String(20))
     location = db.Column(db.String(100), index=True)
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), index=True)
     established_year = db.Column(db.Integer)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
     programs = db.relationship('Program', backref='university', lazy='dynamic', cascade='all, delete-orphan')
     
-    def to_dict(self, include_programs=False):
+    def to_dict(self, include_programs=False, program_count=None):
+        # Pass program_count (see services.serialization) to skip the COUNT query
         data = {
             'id': self.id,
             'name': self.name,
             'type': self.university_type,
             'location': self.location,
             'established_year': self.established_year,
-            'program_count': self.programs.count()
         }
         if include_programs:
-            data['programs'] = [p.to_dict(include_skills=False) for p in self.programs]
+            programs = self.programs.all()
+            data['program_count'] = len(programs)
+            data['programs'] = [p.to_dict(include_skills=False) for p in programs]
+        else:
+            data['program_count'] = self.programs.count() if program_count is None else program_count
         return data
 
 class Program(db.Model):
@@ -184,11 +215,12 @@ class Program(db.Model):
                            backref=db.backref('programs', lazy=True))
     
     def to_dict(self, include_skills=True):
+        university = self.university
         return {
             'id': self.id,
-            'university': self.university.name if self.university else None,
-            'university_type': self.university.university_type if self.university else None,
-            'location': self.university.location if self.university else None,
+            'university': university.name if university else None,
+            'university_type': university.university_type if university else None,
+            'location': university.location if university else None,
             'program_name': self.program_name,
             'category': self.program_category,
             'degree_level': self.degree_level,
@@ -201,6 +233,123 @@ class Program(db.Model):
             'skills': [skill.name for skill in self.skills] if include_skills else None
         }
 
+# Analytics rollups (maintained by services.rollups, never written by the API)
+class JobRollup(db.Model):
+    """Job counts and salary sums per segment; one row per distinct combination"""
+    __tablename__ = 'job_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    experience_level = db.Column(db.String(50))
+    industry = db.Column(db.String(100))
+    location = db.Column(db.String(100))
+    employment_type = db.Column(db.String(50))
+    is_active = db.Column(db.Boolean)
+    
+    job_count = db.Column(db.Integer, nullable=False, default=0)
+    # Jobs with salary_min_usd > 0, and the midpoint sum/count over those with both bounds
+    salaried_count = db.Column(db.Integer, nullable=False, default=0)
+    salaried_midpoint_count = db.Column(db.Integer, nullable=False, default=0)
+    salaried_midpoint_sum = db.Column(db.Float, nullable=False, default=0)
+    # Midpoint sum/count over every job with both bounds
+    midpoint_count = db.Column(db.Integer, nullable=False, default=0)
+    midpoint_sum = db.Column(db.Float, nullable=False, default=0)
+
+class RollupState(db.Model):
+    """Single row: when the rollups were built and the entity totals at that time"""
+    __tablename__ = 'rollup_state'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    refreshed_at = db.Column(db.DateTime, nullable=False)
+    stale = db.Column(db.Boolean, nullable=False, default=False)
+    companies = db.Column(db.Integer, nullable=False, default=0)
+    skills = db.Column(db.Integer, nullable=False, default=0)
+    universities = db.Column(db.Integer, nullable=False, default=0)
+    programs = db.Column(db.Integer, nullable=False, default=0)
+
+class DataVersion(db.Model):
+    """Single row counter bumped on every data change; keys the response cache"""
+    __tablename__ = 'data_version'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class JobTrend(db.Model):
+    """Postings per day for one skill, industry or location ('all' for the whole market)"""
+    __tablename__ = 'job_trends'
+    
+    dimension = db.Column(db.String(20), primary_key=True)
+    label = db.Column(db.String(100), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    
+    job_count = db.Column(db.Integer, nullable=False, default=0)
+    # Postings with salary_min_usd > 0 and both bounds, and their midpoint sum
+    salaried_count = db.Column(db.Integer, nullable=False, default=0)
+    salary_sum = db.Column(db.Float, nullable=False, default=0)
+
+class SalarySketch(db.Model):
+    """Salaried job counts per salary bin for one segment (and skill, for the per-skill rows)"""
+    __tablename__ = 'salary_sketches'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    experience_level = db.Column(db.String(50))
+    industry = db.Column(db.String(100))
+    location = db.Column(db.String(100))
+    # NULL on the per-job rows, the skill name on the per-skill rows
+    skill = db.Column(db.String(100))
+    # 'log': relative-error bins for quantiles, 'linear': fixed-width histogram bins
+    scale = db.Column(db.String(10), nullable=False)
+    bin = db.Column(db.Integer, nullable=False)
+    job_count = db.Column(db.Integer, nullable=False, default=0)
+
+class Task(db.Model):
+    """Background task queue entry, run by the worker process (services/tasks.py)"""
+    __tablename__ = 'tasks'
+    __table_args__ = (
+        # The worker's claim order
+        db.Index('ix_tasks_status_run_after', 'status', 'run_after'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False, index=True)
+    params = db.Column(db.Text)  # JSON object of keyword arguments
+    # queued, running, succeeded, failed or cancelled
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    
+    # Progress reported by the running task
+    progress = db.Column(db.Float, nullable=False, default=0)
+    message = db.Column(db.String(255))
+    result = db.Column(db.Text)  # JSON
+    error = db.Column(db.Text)
+    
+    worker = db.Column(db.String(100))  # host:pid of the worker running it
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        def iso(value):
+            return value.isoformat() if value else None
+        return {
+            'id': self.id,
+            'name': self.name,
+            'params': json.loads(self.params) if self.params else {},
+            'status': self.status,
+            'cancel_requested': self.cancel_requested,
+            'progress': round(self.progress or 0, 4),
+            'message': self.message,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'worker': self.worker,
+            'run_after': iso(self.run_after),
+            'created_at': iso(self.created_at),
+            'started_at': iso(self.started_at),
+            'heartbeat_at': iso(self.heartbeat_at),
+            'finished_at': iso(self.finished_at),
+        }
 
 if __name__ == '__main__':
     from flask import Flask
@@ -215,6 +364,7 @@ if __name__ == '__main__':
         db.create_all()
         print("✓ All tables created successfully!")
         print("\nTables created:")
+        print("  - locations, industries (lookup tables)")
         print("  - companies")
         print("  - jobs")
         print("  - skills")
@@ -222,3 +372,8 @@ if __name__ == '__main__':
         print("  - universities")
         print("  - programs")
         print("  - program_skills (association table)")
+        print("  - job_rollups, rollup_state (analytics rollups)")
+        print("  - data_version (response cache invalidation)")
+        print("  - job_trends (daily posting counts)")
+        print("  - salary_sketches (salary distributions)")
+        print("  - tasks (background task queue)")
@@ -0,0 +1,111 @@
+import hmac
+from datetime import datetime, timedelta
+
+from flask import Blueprint, current_app, jsonify, request
+from sqlalchemy import select
+
+from models import db, Task
+from services.tasks import STATUSES, available, cancel, enqueue, parse_schedule
+
+admin_bp = Blueprint('admin', __name__)
+
+# Longest delay_seconds a task can be queued with (30 days)
+MAX_DELAY_SECONDS = 30 * 24 * 3600
+
+@admin_bp.before_request
+def require_token():
+    """
+    Every admin endpoint needs `Authorization: Bearer <ADMIN_TOKEN>`; without
+    ADMIN_TOKEN they are closed, unless the app runs in debug mode
+    """
+    token = current_app.config.get('ADMIN_TOKEN')
+    if not token:
+        if current_app.debug:
+            return None
+        return jsonify({'success': False, 'error': 'Admin endpoints are disabled: set ADMIN_TOKEN'}), 403
+    given = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(given, f'Bearer {token}'):
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    return None
+
+@admin_bp.route('/api/admin/tasks', methods=['GET'])
+def get_tasks():
+    """
+    Recent background tasks, newest first, with the available tasks and the worker schedule
+    Query Params:
+    - status: str (queued, running, succeeded, failed or cancelled)
+    - name: str (task name)
+    - limit: int (default 50, at most 500)
+    """
+    try:
+        status = request.args.get('status')
+        name = request.args.get('name')
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+        if status and status not in STATUSES:
+            raise ValueError(f"Unknown status {status!r}, expected one of: {', '.join(STATUSES)}")
+
+        query = select(Task).order_by(Task.id.desc()).limit(limit)
+        if status:
+            query = query.where(Task.status == status)
+        if name:
+            query = query.where(Task.name == name)
+        tasks = db.session.execute(query).scalars().all()
+
+        return jsonify({
+            'success': True,
+            'count': len(tasks),
+            'data': [task.to_dict() for task in tasks],
+            'available': available(),
+            'schedule': parse_schedule(current_app.config.get('TASK_SCHEDULE')),
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@admin_bp.route('/api/admin/tasks', methods=['POST'])
+def create_task():
+    """
+    Queue a background task for the worker; an identical queued task is returned instead
+    Body: {
+        "name": "ingest",
+        "params": {"delta": true} (optional),
+        "delay_seconds": 0 (optional, at most 30 days)
+    }
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        delay = data.get('delay_seconds', 0)
+        if (not isinstance(delay, (int, float)) or isinstance(delay, bool)
+                or not 0 <= delay <= MAX_DELAY_SECONDS):
+            raise ValueError(f"delay_seconds must be a number from 0 to {MAX_DELAY_SECONDS}")
+        task = enqueue(data.get('name'), data.get('params'), datetime.utcnow() + timedelta(seconds=delay))
+        return jsonify({'success': True, 'data': task.to_dict()}), 202
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@admin_bp.route('/api/admin/tasks/<int:task_id>', methods=['GET'])
+def get_task(task_id):
+    """Status and progress of one background task"""
+    try:
+        task = db.session.get(Task, task_id)
+        if task is None:
+            return jsonify({'success': False, 'error': 'Task not found'}), 404
+        return jsonify({'success': True, 'data': task.to_dict()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@admin_bp.route('/api/admin/tasks/<int:task_id>/cancel', methods=['POST'])
+def cancel_task(task_id):
+    """Cancel a queued task, or stop a running one at its next progress report (its changes are rolled back)"""
+    try:
+        task = cancel(task_id)
+        if task is None:
+            return jsonify({'success': False, 'error': 'Task not found'}), 404
+        return jsonify({'success': True, 'data': task.to_dict()})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
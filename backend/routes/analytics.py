@@ -1,32 +1,36 @@
+from datetime import date
+
 from flask import Blueprint, jsonify, request
-from sqlalchemy import func
-from models import db, Job, Company, Skill, University, Program
+from services.cache import cached
+from services.columnar import DIMENSIONS, job_table
+from services.rollups import (current_state, freshness, job_counts_by, job_totals,
+                              salary_by)
+from services.salary import DIMENSIONS as SALARY_DIMENSIONS, salary_store
+from services.trends import trend_store
 
 analytics_bp = Blueprint('analytics', __name__)
 
 @analytics_bp.route('/api/analytics/overview', methods=['GET'])
+@cached()
 def get_overview():
     """Get platform-wide statistics for the dashboard"""
     try:
-        total_jobs = Job.query.count()
-        active_jobs = Job.query.filter_by(is_active=True).count()
-        total_companies = Company.query.count()
-        total_skills = Skill.query.count()
-        total_universities = University.query.count()
-        total_programs = Program.query.count()
+        state = current_state()
+        total_jobs, active_jobs = job_totals()
         
         return jsonify({
             'success': True,
+            'freshness': freshness(state),
             'data': {
                 'jobs': {
                     'total': total_jobs,
                     'active': active_jobs
                 },
-                'companies': total_companies,
-                'skills': total_skills,
+                'companies': state.companies,
+                'skills': state.skills,
                 'education': {
-                    'universities': total_universities,
-                    'programs': total_programs
+                    'universities': state.universities,
+                    'programs': state.programs
                 }
             }
         })
@@ -34,6 +38,7 @@ def get_overview():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @analytics_bp.route('/api/analytics/salary-trends', methods=['GET'])
+@cached()
 def get_salary_trends():
     """
     Get average salary analytics
@@ -42,41 +47,29 @@ def get_salary_trends():
     """
     try:
         group_by = request.args.get('by', 'experience')
+        state = current_state()
         
         if group_by == 'industry':
-            # Join with Company to get industry
-            results = db.session.query(
-                Company.industry,
-                func.avg((Job.salary_min_usd + Job.salary_max_usd) / 2).label('avg_salary'),
-                func.count(Job.id).label('job_count')
-            ).join(Job).filter(Job.salary_min_usd > 0)\
-            .group_by(Company.industry)\
-            .having(func.count(Job.id) > 5)\
-            .order_by(func.avg((Job.salary_min_usd + Job.salary_max_usd) / 2).desc())\
-            .limit(10).all()
-            
-            data = [{'label': r[0], 'value': round(r[1], 2), 'count': r[2]} for r in results]
-            
+            # Top 10 industries with more than 5 salaried jobs
+            results = salary_by('industry', min_jobs=5, limit=10)
         else: # by experience level
-            results = db.session.query(
-                Job.experience_level,
-                func.avg((Job.salary_min_usd + Job.salary_max_usd) / 2).label('avg_salary'),
-                func.count(Job.id).label('job_count')
-            ).filter(Job.salary_min_usd > 0)\
-            .group_by(Job.experience_level).all()
-            
             # Custom sort order for experience levels could be added here
-            data = [{'label': r[0], 'value': round(r[1], 2), 'count': r[2]} for r in results]
+            results = salary_by('experience')
+        
+        data = [{'label': label, 'value': round(value, 2) if value is not None else None, 'count': count}
+                for label, value, count in results]
             
         return jsonify({
             'success': True,
             'group_by': group_by,
+            'freshness': freshness(state),
             'data': data
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @analytics_bp.route('/api/analytics/job-trends', methods=['GET'])
+@cached()
 def get_job_trends():
     """
     Get job market distribution
@@ -86,31 +79,183 @@ def get_job_trends():
     try:
         trend_type = request.args.get('type', 'location')
         limit = request.args.get('limit', 10, type=int)
+        state = current_state()
         
-        if trend_type == 'industry':
-            query = db.session.query(
-                Company.industry.label('label'),
-                func.count(Job.id).label('count')
-            ).join(Job).group_by(Company.industry)
-            
-        elif trend_type == 'employment_type':
-            query = db.session.query(
-                Job.employment_type.label('label'),
-                func.count(Job.id).label('count')
-            ).group_by(Job.employment_type)
-            
-        else: # location
-            query = db.session.query(
-                Job.location.label('label'),
-                func.count(Job.id).label('count')
-            ).group_by(Job.location)
-            
-        results = query.order_by(func.count(Job.id).desc()).limit(limit).all()
+        dimension = trend_type if trend_type in ('industry', 'employment_type') else 'location'
+        results = job_counts_by(dimension, limit)
         
         return jsonify({
             'success': True,
             'type': trend_type,
-            'data': [{'label': r.label, 'count': r.count} for r in results]
+            'freshness': freshness(state),
+            'data': [{'label': label, 'count': count} for label, count in results]
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def _split(value):
+    return [part.strip() for part in value.split(',') if part.strip()] if value else []
+
+def _date_arg(name):
+    value = request.args.get(name)
+    return date.fromisoformat(value) if value else None
+
+@analytics_bp.route('/api/analytics/query', methods=['GET'])
+@cached()
+def query_jobs():
+    """
+    Ad-hoc job aggregates from the in-memory column store
+    Query Params:
+    - group_by: comma-separated dimensions: experience, industry, location,
+      employment_type, company, degree, active, month, skill
+    - metrics: comma-separated, 'count' or '<agg>[:<field>]' with agg in
+      sum, mean, min, max, p0-p100 and field in salary (default), salary_min,
+      salary_max (default: count,mean)
+    - <dimension>=<value>: filter, repeat the parameter to allow several values
+    - since, until: posted_date range (YYYY-MM-DD)
+    - min_salary, max_salary: salary midpoint range
+    - min_count: hide smaller groups (default: 1)
+    - order: a metric name such as count or p50_salary, '-' for descending
+      (default: -count)
+    - limit: number of groups (default: 100)
+    """
+    try:
+        group_by = _split(request.args.get('group_by'))
+        metrics = _split(request.args.get('metrics')) or ['count', 'mean']
+        filters = {d: request.args.getlist(d) for d in DIMENSIONS if d in request.args}
+        order = request.args.get('order', '-count' if 'count' in metrics else None)
+
+        table = job_table.get()
+        mask = table.mask(
+            filters,
+            since=_date_arg('since'),
+            until=_date_arg('until'),
+            min_salary=request.args.get('min_salary', type=float),
+            max_salary=request.args.get('max_salary', type=float),
+        )
+        data = table.query(
+            group_by, metrics, mask,
+            min_count=request.args.get('min_count', 1, type=int),
+            order=order,
+            limit=request.args.get('limit', 100, type=int),
+        )
+        return jsonify({
+            'success': True,
+            'group_by': group_by,
+            'matched': int(mask.sum()),
+            'freshness': table.built_at.isoformat(),
+            'data': data
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@analytics_bp.route('/api/analytics/trends', methods=['GET'])
+@cached()
+def get_trends():
+    """
+    Postings over time from the daily trend buckets
+    Query Params:
+    - dimension: skill, industry, location or all (default: all)
+    - label: the skill, industry or location (not needed for all)
+    - interval: day, week or month (default: week)
+    - since, until: posting day range (YYYY-MM-DD)
+    - window: periods in the moving average (default: 4)
+    """
+    try:
+        dimension = request.args.get('dimension', 'all')
+        label = request.args.get('label')
+        store = trend_store.get()
+        data = store.timeline(
+            dimension, label,
+            interval=request.args.get('interval', 'week'),
+            since=_date_arg('since'),
+            until=_date_arg('until'),
+            window=request.args.get('window', 4, type=int),
+        )
+        return jsonify({
+            'success': True,
+            'dimension': dimension,
+            'label': label,
+            'freshness': store.loaded_at.isoformat(),
+            'data': data
+        })
+    except KeyError as e:
+        return jsonify({'success': False, 'error': e.args[0]}), 404
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@analytics_bp.route('/api/analytics/trends/rising', methods=['GET'])
+@cached()
+def get_rising():
+    """
+    Fastest-growing skills, industries or locations
+    Query Params:
+    - dimension: skill, industry or location (default: skill)
+    - days: length of the window compared with the one before it (default: 90)
+    - as_of: last day of the window (default: the latest posting day)
+    - min_count: ignore labels with fewer postings in both windows (default: 5)
+    - limit: number of results (default: 10)
+    """
+    try:
+        dimension = request.args.get('dimension', 'skill')
+        days = request.args.get('days', 90, type=int)
+        store = trend_store.get()
+        data = store.rising(
+            dimension, days,
+            as_of=_date_arg('as_of'),
+            min_count=request.args.get('min_count', 5, type=int),
+            limit=request.args.get('limit', 10, type=int),
+        )
+        return jsonify({
+            'success': True,
+            'dimension': dimension,
+            'days': days,
+            'as_of': (_date_arg('as_of') or store.last_day or date.today()).isoformat(),
+            'freshness': store.loaded_at.isoformat(),
+            'data': data
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@analytics_bp.route('/api/analytics/salary-distribution', methods=['GET'])
+@cached()
+def get_salary_distribution():
+    """
+    Salary percentiles and histogram from the salary sketches
+    Query Params:
+    - by: experience, industry, location or skill; one result per value
+      (default: a single result for everything matched)
+    - experience, industry, location, skill: filters, repeat the parameter
+      to allow several values; one skill at a time, combined with
+      experience only
+    - percentiles: comma-separated, 0-100 (default: 10,50,90)
+    - min_count: hide smaller groups (default: 1)
+    - limit: number of groups (default: all)
+    """
+    try:
+        by = request.args.get('by')
+        filters = {d: request.args.getlist(d) for d in SALARY_DIMENSIONS if d in request.args}
+        percentiles = [float(q) for q in _split(request.args.get('percentiles'))] or [10, 50, 90]
+        state = current_state()
+
+        data = salary_store.get(state.refreshed_at).distributions(
+            filters, by, percentiles,
+            min_count=request.args.get('min_count', 1, type=int),
+            limit=request.args.get('limit', type=int),
+        )
+        return jsonify({
+            'success': True,
+            'by': by,
+            'freshness': freshness(state),
+            'data': data if by else data[0]
         })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
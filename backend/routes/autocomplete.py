@@ -0,0 +1,29 @@
+from flask import Blueprint, request, jsonify
+from services.autocomplete import TYPES, autocomplete
+
+autocomplete_bp = Blueprint('autocomplete', __name__)
+
+# Not response-cached: every keystroke is a new cache key, and the in-memory
+# index answers faster than a cache entry would be worth
+@autocomplete_bp.route('/api/autocomplete', methods=['GET'])
+def get_autocomplete():
+    """
+    Typeahead suggestions: labels with a word starting with q, those starting with q first, then by popularity
+    Query Params:
+    - q: str (required, what was typed so far)
+    - types: str (comma-separated: skill, title, company, program; default all)
+    - limit: int (per type, default 5, at most 20)
+    count is the number of jobs for skills, titles and companies, and of programs with that name for programs.
+    """
+    try:
+        types = [t.strip() for t in request.args.get('types', '').split(',') if t.strip()] or list(TYPES)
+        data = autocomplete.get().complete(
+            request.args.get('q', ''),
+            types=types,
+            limit=request.args.get('limit', 5, type=int)
+        )
+        return jsonify({'success': True, 'data': data})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
@@ -1,38 +1,82 @@
-from flask import Blueprint, request, jsonify
-from google import genai
-from openai import OpenAI
-import os
-from dotenv import load_dotenv
+import json
+
+from flask import Blueprint, Response, current_app, request, jsonify
+from services.llm import ChatbotBusy, ChatbotError, chat_service
+from services.retrieval import retriever
 
-load_dotenv()
 chatbot = Blueprint('chatbot', __name__)
 
-# client = OpenAI(api_key=os.getenv('DEEPSEEK_API_KEY'), base_url="https://api.deepseek.com")
+def _message():
+    data = request.get_json(silent=True) or {}
+    return (data.get("message") or request.args.get("message") or "").strip()
+
+def _context(message):
+    """Platform facts relevant to the message; the chatbot still answers without them"""
+    if not current_app.config.get('CHATBOT_RAG', True):
+        return []
+    try:
+        return retriever.context(message, current_app.config.get('CHATBOT_RAG_TOP_K', 8))
+    except Exception:
+        current_app.logger.exception('Retrieval failed')
+        return []
 
 @chatbot.route("/api/chatbot", methods = ['POST'])
 def bot():
-    data = request.json
-    message = data.get("message")
-
-    response = get_chat_bot(message)
+    """
+    Answer a job-market question
+    Body: {"message": str}
+    """
+    message = _message()
+    if not message:
+        return jsonify({'success': False, 'error': 'message is required'}), 400
+    try:
+        response, cached = chat_service.ask(message, _context(message))
+    except ChatbotBusy as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    except ChatbotError as e:
+        return jsonify({'success': False, 'error': str(e)}), 502
 
     return jsonify({
-        "message": response
+        "message": response,
+        "cached": cached
     })
 
+@chatbot.route("/api/chatbot/stream", methods = ['GET', 'POST'])
+def bot_stream():
+    """
+    Same as /api/chatbot, streamed as Server-Sent Events
+    Body: {"message": str} (or ?message= for EventSource clients)
+    Events: `data: {"delta": str}` per piece, then `event: done` (or `event: error`)
+    """
+    # Flask answers HEAD for every GET route, but a HEAD request would take a
+    # provider slot for a body that is never sent
+    if request.method == 'HEAD':
+        return jsonify({'success': False, 'error': 'Method not allowed'}), 405, {'Allow': 'GET, POST'}
+    message = _message()
+    if not message:
+        return jsonify({'success': False, 'error': 'message is required'}), 400
+    try:
+        pieces = chat_service.stream(message, _context(message))
+    except ChatbotBusy as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
 
-def get_chat_bot(msg):
-
-    # client = OpenAI()
-    client = genai.Client(api_key=os.getenv('api_key'))
+    def events():
+        try:
+            for piece in pieces:
+                yield f"data: {json.dumps({'delta': piece})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except ChatbotError as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+        finally:
+            if hasattr(pieces, 'close'):
+                pieces.close()
 
-    response = client.models.generate_content(
-        model="gemini-2.5-flash", contents="You have to bring context anything related to the study of job market specially Cambodia related. Other things you have to tell them back that the scope is too big."
-    )
-
-    # print(os.getenv('DEEPSEEK_API_KEY'))
-    
-        
-    # return response.choices[0].message.content
-
-    return response.text
\ No newline at end of file
+    response = Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # The server closes the response even when the client went away before
+    # the first piece, when events() never started and its finally never runs
+    if hasattr(pieces, 'close'):
+        response.call_on_close(pieces.close)
+    return response
@@ -1,10 +1,47 @@
 from flask import Blueprint, request, jsonify
-from sqlalchemy import or_
-from models import db, Job, Skill, Company, EmploymentType, ExperienceLevel
+from sqlalchemy import func, select
+from models import db, Job, Skill, Company, Industry, Location, EmploymentType, ExperienceLevel, job_skills
+from services.cache import cached
+from services.export import LIST_SEPARATOR, export_response
+from services.lookups import lookup_filter
+from services.pagination import InvalidCursor, keyset_paginate
+from services.rollups import average_salary, current_state, freshness, job_counts_by, job_totals
+from services.search import search_jobs
+from services.serialization import JOB_PROJECTION, job_options
 
 jobs_bp = Blueprint('jobs', __name__)
 
+def _filter_jobs(query, args):
+    """
+    Apply the /api/jobs filters to a Job query.
+    Returns (query, rank); rank orders full-text matches (None without search).
+    """
+    if args.get('is_active'):
+        query = query.filter(Job.is_active == True)
+        
+    if location := args.get('location'):
+        query = query.filter(lookup_filter(Job.location_id, Location, location))
+        
+    if industry := args.get('industry'):
+        query = query.join(Company).filter(lookup_filter(Company.industry_id, Industry, industry))
+        
+    if level := args.get('level'):
+        query = query.filter(Job.experience_level == level)
+        
+    if job_type := args.get('type'):
+        query = query.filter(Job.employment_type == job_type)
+        
+    if skill_name := args.get('skill'):
+        # EXISTS rather than a join, so a job matching several skills is listed once
+        query = query.filter(Job.skills.any(Skill.name.ilike(f'%{skill_name}%')))
+        
+    rank = None
+    if search := args.get('search'):
+        query, rank = search_jobs(query, search, db.session.connection())
+    return query, rank
+
 @jobs_bp.route('/api/jobs', methods=['GET'])
+@cached()
 def get_jobs():
     """
     List all jobs with pagination and filtering
@@ -16,51 +53,46 @@ def get_jobs():
     - level: str (Entry Level, Mid Level, Senior, Executive)
     - type: str (Full-time, Part-time, Contract, Internship)
     - skill: str (filter by skill name)
-    - search: str (search in title/description)
+    - search: str (full-text search in title/description, ranked, last word as prefix; page numbers only)
+    - cursor: str (keyset pagination by posting date: next_cursor of the previous page, empty for the
+      first page; per_page at most 100; not with search)
+    - count: str (with cursor: 'exact' or 'estimate' to include a total)
     """
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         
         # Build query
-        query = Job.query
+        query, rank = _filter_jobs(Job.query, request.args)
+        # Only the output columns, as tuples
+        query = JOB_PROJECTION.apply(query)
         
-        # Filters
-        if request.args.get('is_active'):
-            query = query.filter(Job.is_active == True)
-            
-        if location := request.args.get('location'):
-            query = query.filter(Job.location.ilike(f'%{location}%'))
-            
-        if industry := request.args.get('industry'):
-            query = query.join(Company).filter(Company.industry.ilike(f'%{industry}%'))
-            
-        if level := request.args.get('level'):
-            query = query.filter(Job.experience_level == level)
-            
-        if job_type := request.args.get('type'):
-            query = query.filter(Job.employment_type == job_type)
-            
-        if skill_name := request.args.get('skill'):
-            query = query.join(Job.skills).filter(Skill.name.ilike(f'%{skill_name}%'))
-            
-        if search := request.args.get('search'):
-            search_term = f"%{search}%"
-            query = query.filter(
-                or_(
-                    Job.title.ilike(search_term),
-                    Job.description.ilike(search_term)
-                )
+        # Keyset pagination when a cursor is passed; page numbers keep the
+        # OFFSET behaviour for existing clients
+        if 'cursor' in request.args:
+            if rank is not None:
+                # Cursors follow the posting date order, which would drop the ranking
+                return jsonify({'success': False,
+                                'error': 'search results are ranked: page them with page, not cursor'}), 400
+            jobs, meta = keyset_paginate(
+                query, Job.posted_date, Job.id, per_page,
+                cursor=request.args['cursor'], count=request.args.get('count')
             )
+            return jsonify({
+                'success': True,
+                'data': JOB_PROJECTION.serialize(jobs),
+                'meta': meta
+            })
             
-        # Execute pagination
-        pagination = query.order_by(Job.posted_date.desc()).paginate(
+        # Execute pagination, best search matches first
+        order = [Job.posted_date.desc()] if rank is None else [rank.desc(), Job.posted_date.desc()]
+        pagination = query.order_by(*order).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
         return jsonify({
             'success': True,
-            'data': [job.to_dict() for job in pagination.items],
+            'data': JOB_PROJECTION.serialize(pagination.items),
             'meta': {
                 'page': page,
                 'per_page': per_page,
@@ -69,14 +101,44 @@ def get_jobs():
             }
         })
         
+    except InvalidCursor as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@jobs_bp.route('/api/jobs/export', methods=['GET'])
+def export_jobs():
+    """
+    Stream every job matching the /api/jobs filters
+    Query Params:
+    - format: str ('ndjson' (default) or 'csv')
+    - location, industry, level, type, skill, search, is_active: as for /api/jobs
+    Send Accept-Encoding: gzip for a compressed stream.
+    """
+    try:
+        query, rank = _filter_jobs(Job.query, request.args)
+        skills = select(func.aggregate_strings(Skill.name, LIST_SEPARATOR))\
+            .join(job_skills, job_skills.c.skill_id == Skill.id)\
+            .where(job_skills.c.job_id == Job.id)\
+            .scalar_subquery()
+        order = [Job.posted_date.desc(), Job.id.desc()]
+        if rank is not None:
+            order.insert(0, rank.desc())
+        statement = JOB_PROJECTION.apply(query, skills.label('skills')).order_by(*order).statement
+        columns = JOB_PROJECTION.names + ('skills',)
+        return export_response(statement, columns, 'jobs', request.args.get('format', 'ndjson'),
+                               list_fields=('skills',))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @jobs_bp.route('/api/jobs/<job_id>', methods=['GET'])
+@cached()
 def get_job_detail(job_id):
     """Get single job details"""
     try:
-        job = Job.query.get_or_404(job_id)
+        job = Job.query.options(*job_options()).filter_by(id=job_id).first_or_404()
         return jsonify({
             'success': True,
             'data': job.to_dict()
@@ -85,40 +147,24 @@ def get_job_detail(job_id):
         return jsonify({'success': False, 'error': 'Job not found'}), 404
 
 @jobs_bp.route('/api/jobs/stats', methods=['GET'])
+@cached()
 def get_job_stats():
     """Get job statistics for dashboard"""
     try:
-        total_jobs = Job.query.count()
-        active_jobs = Job.query.filter_by(is_active=True).count()
-        total_companies = Company.query.count()
-        
-        # Calculate average salary
-        avg_salary_result = db.session.query(
-            db.func.avg((Job.salary_min_usd + Job.salary_max_usd) / 2)
-        ).filter(Job.salary_min_usd.isnot(None), Job.salary_max_usd.isnot(None)).scalar()
-        avg_salary = round(avg_salary_result) if avg_salary_result else None
-        
-        # Top industries
-        top_industries = db.session.query(
-            Company.industry, db.func.count(Job.id)
-        ).join(Job).group_by(Company.industry)\
-        .order_by(db.func.count(Job.id).desc()).limit(5).all()
-        
-        # Top locations
-        top_locations = db.session.query(
-            Job.location, db.func.count(Job.id)
-        ).group_by(Job.location)\
-        .order_by(db.func.count(Job.id).desc()).limit(5).all()
+        state = current_state()
+        total_jobs, active_jobs = job_totals()
+        avg_salary = average_salary()
         
         return jsonify({
             'success': True,
+            'freshness': freshness(state),
             'data': {
                 'total_jobs': total_jobs,
                 'active_jobs': active_jobs,
-                'total_companies': total_companies,
-                'avg_salary': avg_salary,
-                'top_industries': dict(top_industries),
-                'top_locations': dict(top_locations)
+                'total_companies': state.companies,
+                'avg_salary': round(avg_salary) if avg_salary else None,
+                'top_industries': dict(job_counts_by('industry', 5)),
+                'top_locations': dict(job_counts_by('location', 5))
             }
         })
     except Exception as e:
@@ -1,5 +1,9 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from models import db, Job, Skill, Program
+from services import scoring
+from services.batch_match import match_records, ndjson_lines, read_profiles
+from services.export import stream_response
+from services.serialization import job_options, program_options
 
 recommendations_bp = Blueprint('recommendations', __name__)
 
@@ -20,49 +24,76 @@ def match_jobs():
         if not user_skills:
             return jsonify({'success': False, 'error': 'No skills provided'}), 400
             
-        # Base query
-        query = Job.query
+        # Score every job in one sparse matrix-vector product over the
+        # in-memory skill index, then hydrate just the returned page
+        total, top = scoring.match_jobs(
+            user_skills,
+            level=data.get('experience_level'),
+            location=data.get('location'),
+            limit=50
+        )
         
-        if level := data.get('experience_level'):
-            query = query.filter(Job.experience_level == level)
-            
-        if location := data.get('location'):
-            query = query.filter(Job.location.ilike(f'%{location}%'))
-            
-        # Get candidate jobs (optimize by filtering jobs that have at least one of the skills?)
-        # For now, fetching active jobs and calculating match in memory
-        # In production, use database text search or specialized search engine
-        jobs = query.filter_by(is_active=True).all()
+        jobs = {job.id: job for job in Job.query.options(*job_options()).filter(Job.id.in_([t[0] for t in top]))}
         
         matches = []
-        for job in jobs:
-            job_skills = set(s.name.lower() for s in job.skills)
-            if not job_skills:
+        for job_id, match_score, common, missing in top:
+            job = jobs.get(job_id)
+            if job is None:
                 continue
-                
-            common = user_skills.intersection(job_skills)
-            match_score = len(common) / len(job_skills)
-            
-            if match_score > 0:
-                matches.append({
-                    'job': job.to_dict(),
-                    'match_score': round(match_score * 100, 1),
-                    'matching_skills': list(common),
-                    'missing_skills': list(job_skills - user_skills)
-                })
-                
-        # Sort by match score desc
-        matches.sort(key=lambda x: x['match_score'], reverse=True)
+            matches.append({
+                'job': job.to_dict(),
+                'match_score': round(match_score * 100, 1),
+                'matching_skills': common,
+                'missing_skills': missing
+            })
         
         return jsonify({
             'success': True,
-            'count': len(matches),
-            'data': matches[:50]  # Return top 50 matches
+            'count': total,
+            'data': matches  # Top 50 matches
         })
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@recommendations_bp.route('/api/match/jobs/batch', methods=['POST'])
+def match_jobs_batch():
+    """
+    Match many skill profiles at once; streams one NDJSON line per profile, in order
+    Body: NDJSON (Content-Type: application/x-ndjson), one profile per line, or
+    {"profiles": [...], "limit": 10}
+    Profile: {"id": "s1", "skills": ["Python", "SQL"], "experience_level": ..., "location": ...}
+    Query Params:
+    - limit: int (matches per profile, default 10, at most 50)
+    Line: {"id", "count", "matches": [{job, match_score, matching_skills, missing_skills}]}
+    or {"id", "error"} for an invalid profile
+    """
+    try:
+        limit = request.args.get('limit', 10, type=int)
+        if request.mimetype == 'application/x-ndjson':
+            profiles = read_profiles(request.get_data(as_text=True).splitlines())
+        else:
+            data = request.get_json(silent=True) or {}
+            profiles = data.get('profiles')
+            limit = data.get('limit', limit)
+            if not isinstance(profiles, list) or not all(isinstance(p, dict) for p in profiles):
+                raise ValueError('profiles must be a list of objects')
+            if not isinstance(limit, int) or isinstance(limit, bool):
+                raise ValueError('limit must be an integer')
+        limit = max(1, limit)
+        
+        if not profiles:
+            return jsonify({'success': False, 'error': 'No profiles provided'}), 400
+        max_profiles = current_app.config['MATCH_BATCH_MAX_PROFILES']
+        if len(profiles) > max_profiles:
+            return jsonify({'success': False, 'error': f'At most {max_profiles} profiles per request'}), 413
+        
+        return stream_response(ndjson_lines(match_records(profiles, limit)), 'application/x-ndjson')
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @recommendations_bp.route('/api/match/skill-gap', methods=['POST'])
 def analyze_skill_gap():
     """
@@ -85,31 +116,26 @@ def analyze_skill_gap():
         
         missing = job_skills - user_skills
         
-        # Find recommended programs for missing skills
+        # Find recommended programs for missing skills: programs that teach
+        # the most missing skills, scored in one pass over the program index
         recommendations = []
         if missing:
-            # Simple recommendation: Find programs that teach the most missing skills
-            # This is expensive, optimization needed for large datasets
-            all_programs = Program.query.all()
+            ranked = scoring.rank_programs(missing, limit=5)
+            programs = {p.id: p for p in Program.query.options(*program_options(include_skills=False)).filter(Program.id.in_([r[0] for r in ranked]))}
             
-            for prog in all_programs:
-                prog_skills = set(s.name.lower() for s in prog.skills)
-                covered = missing.intersection(prog_skills)
-                
-                if covered:
+            for program_id, score, covered in ranked:
+                if prog := programs.get(program_id):
                     recommendations.append({
                         'program': prog.to_dict(include_skills=False),
-                        'covered_skills': list(covered),
-                        'score': len(covered)
+                        'covered_skills': covered,
+                        'score': score
                     })
             
-            recommendations.sort(key=lambda x: x['score'], reverse=True)
-            
         return jsonify({
             'success': True,
             'job_title': job.title,
             'missing_skills': list(missing),
-            'recommended_programs': recommendations[:5]
+            'recommended_programs': recommendations
         })
         
     except Exception as e:
@@ -131,31 +157,27 @@ def recommend_programs():
         if not target_skills:
             return jsonify({'success': False, 'error': 'Target skills required'}), 400
             
-        query = Program.query
+        query = Program.query.options(*program_options())
         
         if degree := data.get('degree_level'):
              # Map string to Enum if needed, or rely on frontend sending correct string
              pass 
 
-        programs = query.all()
-        results = []
+        ranked = scoring.rank_programs(target_skills, limit=20)
+        programs = {p.id: p for p in query.filter(Program.id.in_([r[0] for r in ranked]))}
         
-        for prog in programs:
-            prog_skills = set(s.name.lower() for s in prog.skills)
-            common = target_skills.intersection(prog_skills)
-            
-            if common:
+        results = []
+        for program_id, score, common in ranked:
+            if prog := programs.get(program_id):
                 results.append({
                     'program': prog.to_dict(),
-                    'relevance_score': len(common),
-                    'matched_skills': list(common)
+                    'relevance_score': score,
+                    'matched_skills': common
                 })
                 
-        results.sort(key=lambda x: x['relevance_score'], reverse=True)
-        
         return jsonify({
             'success': True,
-            'data': results[:20]
+            'data': results
         })
         
     except Exception as e:
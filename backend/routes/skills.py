@@ -1,9 +1,14 @@
 from flask import Blueprint, request, jsonify
 from models import db, Skill, Job, Program, SkillType
+from services.cache import cached
+from services.cooccurrence import skill_graph
+from services.pagination import InvalidCursor, keyset_paginate
+from services.serialization import JOB_PROJECTION, PROGRAM_PROJECTION, serialize_skills, skills_with_counts
 
 skills_bp = Blueprint('skills', __name__)
 
 @skills_bp.route('/api/skills', methods=['GET'])
+@cached()
 def get_skills():
     """
     List all skills with filtering
@@ -13,7 +18,9 @@ def get_skills():
     - min_jobs: int (filter by minimum job count)
     """
     try:
-        query = Skill.query
+        # Job and program counts come from the same query
+        min_jobs = request.args.get('min_jobs', 0, type=int)
+        query = skills_with_counts(min_jobs)
         
         # Filters
         if skill_type := request.args.get('type'):
@@ -27,20 +34,8 @@ def get_skills():
         if search := request.args.get('search'):
             query = query.filter(Skill.name.ilike(f'%{search}%'))
             
-        # Get all skills matching criteria
-        skills = query.all()
-        
-        # Manual filtering for job count (since it's a property, not a column)
-        # For large datasets, this should be optimized with a JOIN + GROUP BY
-        min_jobs = request.args.get('min_jobs', 0, type=int)
+        result = serialize_skills(query.all())
         
-        result = []
-        for skill in skills:
-            job_count = len(skill.jobs)
-            if job_count >= min_jobs:
-                data = skill.to_dict()
-                result.append(data)
-                
         # Sort by name
         result.sort(key=lambda x: x['name'])
         
@@ -54,6 +49,7 @@ def get_skills():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @skills_bp.route('/api/skills/top', methods=['GET'])
+@cached()
 def get_top_skills():
     """
     Get most in-demand skills sorted by job count
@@ -65,11 +61,8 @@ def get_top_skills():
         limit = request.args.get('limit', 10, type=int)
         skill_type_str = request.args.get('type')
         
-        # Optimized query using GROUP BY
-        query = db.session.query(
-            Skill, 
-            db.func.count(Job.id).label('job_count')
-        ).join(Skill.jobs).group_by(Skill.id)
+        # Skills with at least one job, program counts in the same query
+        query = skills_with_counts(min_jobs=1)
         
         if skill_type_str:
             try:
@@ -79,14 +72,8 @@ def get_top_skills():
                 pass
                 
         # Order by job count desc
-        top_skills = query.order_by(db.text('job_count DESC')).limit(limit).all()
-        
-        result = []
-        for skill, count in top_skills:
-            data = skill.to_dict()
-            # Ensure count is accurate from the aggregate query
-            data['job_count'] = count
-            result.append(data)
+        top_skills = query.order_by(db.text('job_count DESC'), Skill.name).limit(limit).all()
+        result = serialize_skills(top_skills)
             
         return jsonify({
             'success': True,
@@ -96,26 +83,43 @@ def get_top_skills():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @skills_bp.route('/api/skills/<int:skill_id>/jobs', methods=['GET'])
+@cached()
 def get_jobs_by_skill(skill_id):
-    """Get all jobs requiring a specific skill"""
+    """
+    Get all jobs requiring a specific skill
+    Query Params:
+    - page, per_page: int (offset pagination)
+    - cursor: str (keyset pagination: next_cursor of the previous page, empty for the first page; per_page at most 100)
+    - count: str (with cursor: 'exact' or 'estimate' to include a total)
+    """
     try:
         skill = Skill.query.get_or_404(skill_id)
         
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         
-        # Paginate the jobs relationship
-        # Note: skill.jobs is a list/query based on lazy loading config
-        # Ideally, we should query Job directly filtering by skill
+        # Query Job directly filtering by skill
+        query = JOB_PROJECTION.apply(Job.query.filter(Job.skills.any(id=skill_id)))
         
-        pagination = Job.query.filter(Job.skills.any(id=skill_id))\
-            .order_by(Job.posted_date.desc())\
+        if 'cursor' in request.args:
+            jobs, meta = keyset_paginate(
+                query, Job.posted_date, Job.id, per_page,
+                cursor=request.args['cursor'], count=request.args.get('count')
+            )
+            return jsonify({
+                'success': True,
+                'skill': skill.name,
+                'data': JOB_PROJECTION.serialize(jobs),
+                'meta': meta
+            })
+        
+        pagination = query.order_by(Job.posted_date.desc())\
             .paginate(page=page, per_page=per_page, error_out=False)
             
         return jsonify({
             'success': True,
             'skill': skill.name,
-            'data': [job.to_dict() for job in pagination.items],
+            'data': JOB_PROJECTION.serialize(pagination.items),
             'meta': {
                 'page': page,
                 'per_page': per_page,
@@ -123,23 +127,81 @@ def get_jobs_by_skill(skill_id):
                 'pages': pagination.pages
             }
         })
+    except InvalidCursor as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @skills_bp.route('/api/skills/<int:skill_id>/programs', methods=['GET'])
+@cached()
 def get_programs_by_skill(skill_id):
     """Get university programs teaching a specific skill"""
     try:
         skill = Skill.query.get_or_404(skill_id)
         
         # This relies on the program_skills table being populated
-        programs = Program.query.filter(Program.skills.any(id=skill_id)).all()
+        programs = PROGRAM_PROJECTION.apply(Program.query.filter(Program.skills.any(id=skill_id))).all()
         
         return jsonify({
             'success': True,
             'skill': skill.name,
             'count': len(programs),
-            'data': [p.to_dict() for p in programs]
+            'data': PROGRAM_PROJECTION.serialize(programs)
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@skills_bp.route('/api/skills/<int:skill_id>/related', methods=['GET'])
+@cached()
+def get_related_skills(skill_id):
+    """
+    Skills most often required together with this one
+    Query Params:
+    - order: 'lift' (more often than chance, pairs in at least 5 jobs) or
+      'confidence' (share of this skill's jobs that also require it)
+      (default: lift)
+    - limit: int (default 10, at most 25)
+    """
+    try:
+        skill = db.session.get(Skill, skill_id)
+        if skill is None:
+            return jsonify({'success': False, 'error': 'Skill not found'}), 404
+        graph = skill_graph.get()
+        related = graph.related(
+            skill.name,
+            order=request.args.get('order', 'lift'),
+            limit=request.args.get('limit', 10, type=int),
+        )
+        return jsonify({
+            'success': True,
+            'skill': skill.name,
+            'jobs': int(graph.frequency[graph.term(skill.name)]) if related is not None else 0,
+            'data': related or []
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@skills_bp.route('/api/skills/next', methods=['GET'])
+@cached()
+def get_next_skills():
+    """
+    What to learn next: skills most often required together with the ones given
+    Query Params:
+    - skills: str (comma-separated skill names)
+    - limit: int (default 10)
+    """
+    try:
+        names = [n.strip() for n in request.args.get('skills', '').split(',') if n.strip()]
+        if not names:
+            return jsonify({'success': False, 'error': 'skills is required'}), 400
+        
+        data = skill_graph.get().next_skills(names, limit=request.args.get('limit', 10, type=int))
+        return jsonify({
+            'success': True,
+            'skills': names,
+            'data': data
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
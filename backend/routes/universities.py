@@ -1,9 +1,15 @@
 from flask import Blueprint, request, jsonify
-from models import db, University, Program, UniversityType, DegreeLevel
+from sqlalchemy import func, select
+from models import db, University, Program, Location, Skill, UniversityType, DegreeLevel, program_skills
+from services.cache import cached
+from services.export import LIST_SEPARATOR, export_response
+from services.lookups import lookup_filter
+from services.serialization import PROGRAM_PROJECTION, program_options, serialize_universities
 
 universities_bp = Blueprint('universities', __name__)
 
 @universities_bp.route('/api/universities', methods=['GET'])
+@cached()
 def get_universities():
     """
     List universities with filtering
@@ -24,7 +30,7 @@ def get_universities():
                 pass
                 
         if location := request.args.get('location'):
-            query = query.filter(University.location.ilike(f'%{location}%'))
+            query = query.filter(lookup_filter(University.location_id, Location, location))
             
         if search := request.args.get('search'):
             query = query.filter(University.name.ilike(f'%{search}%'))
@@ -34,12 +40,13 @@ def get_universities():
         return jsonify({
             'success': True,
             'count': len(universities),
-            'data': [u.to_dict(include_programs=False) for u in universities]
+            'data': serialize_universities(universities)
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @universities_bp.route('/api/universities/<int:id>', methods=['GET'])
+@cached()
 def get_university_detail(id):
     """Get university details including programs"""
     try:
@@ -51,7 +58,30 @@ def get_university_detail(id):
     except Exception as e:
         return jsonify({'success': False, 'error': 'University not found'}), 404
 
+def _filter_programs(query, args):
+    """Apply the /api/programs filters to a Program query"""
+    if category := args.get('category'):
+        query = query.filter(Program.program_category == category)
+        
+    if degree := args.get('degree'):
+        try:
+            degree_enum = DegreeLevel[degree.replace(' ', '_').upper()]
+            query = query.filter(Program.degree_level == degree_enum)
+        except KeyError:
+            pass
+            
+    if uni_id := args.get('university_id'):
+        query = query.filter(Program.university_id == uni_id)
+        
+    if max_tuition := args.get('max_tuition', type=float):
+        query = query.filter(Program.annual_tuition_usd <= max_tuition)
+        
+    if search := args.get('search'):
+        query = query.filter(Program.program_name.ilike(f'%{search}%'))
+    return query
+
 @universities_bp.route('/api/programs', methods=['GET'])
+@cached()
 def get_programs():
     """
     List all programs with advanced filtering
@@ -65,34 +95,15 @@ def get_programs():
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
-        query = Program.query
+        query = PROGRAM_PROJECTION.apply(_filter_programs(Program.query, request.args))
         
-        if category := request.args.get('category'):
-            query = query.filter(Program.program_category == category)
-            
-        if degree := request.args.get('degree'):
-            try:
-                degree_enum = DegreeLevel[degree.replace(' ', '_').upper()]
-                query = query.filter(Program.degree_level == degree_enum)
-            except KeyError:
-                pass
-                
-        if uni_id := request.args.get('university_id'):
-            query = query.filter(Program.university_id == uni_id)
-            
-        if max_tuition := request.args.get('max_tuition', type=float):
-            query = query.filter(Program.annual_tuition_usd <= max_tuition)
-            
-        if search := request.args.get('search'):
-            query = query.filter(Program.program_name.ilike(f'%{search}%'))
-            
         pagination = query.order_by(Program.program_name).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
         return jsonify({
             'success': True,
-            'data': [p.to_dict() for p in pagination.items],
+            'data': PROGRAM_PROJECTION.serialize(pagination.items),
             'meta': {
                 'page': page,
                 'per_page': per_page,
@@ -103,11 +114,37 @@ def get_programs():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@universities_bp.route('/api/programs/<int:id>', methods=['GET'])
+@universities_bp.route('/api/programs/export', methods=['GET'])
+def export_programs():
+    """
+    Stream every program matching the /api/programs filters
+    Query Params:
+    - format: str ('ndjson' (default) or 'csv')
+    - category, degree, university_id, max_tuition, search: as for /api/programs
+    Send Accept-Encoding: gzip for a compressed stream.
+    """
+    try:
+        query = _filter_programs(Program.query, request.args)
+        skills = select(func.aggregate_strings(Skill.name, LIST_SEPARATOR))\
+            .join(program_skills, program_skills.c.skill_id == Skill.id)\
+            .where(program_skills.c.program_id == Program.id)\
+            .scalar_subquery()
+        statement = PROGRAM_PROJECTION.apply(query, skills.label('skills'))\
+            .order_by(Program.program_name, Program.id).statement
+        columns = PROGRAM_PROJECTION.names + ('skills',)
+        return export_response(statement, columns, 'programs', request.args.get('format', 'ndjson'),
+                               list_fields=('skills',))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@universities_bp.route('/api/programs/<id>', methods=['GET'])
+@cached()
 def get_program_detail(id):
     """Get program details"""
     try:
-        program = Program.query.get_or_404(id)
+        program = Program.query.options(*program_options()).filter_by(id=id).first_or_404()
         return jsonify({
             'success': True,
             'data': program.to_dict(include_skills=True)
@@ -0,0 +1,197 @@
+"""
+Typeahead over skill names, job titles, company names and program names.
+
+The search boxes used to run an ILIKE '%x%' scan per keystroke. Here each
+type keeps a sorted array of the word-start suffixes of its labels ("Senior
+Data Analyst" is filed under "senior data analyst", "data analyst" and
+"analyst"), so the labels matching a prefix form one slice found with two
+binary searches. Every suffix carries a precomputed rank: labels starting
+with the prefix come before labels with a later word starting with it, each
+group by popularity (jobs for skills, titles and companies; programs
+offering the name for program names). The best results are then a partial
+sort of the slice, and the one-character prefixes, whose slices are the
+largest, are answered ahead of time.
+
+The index is built on first use, dropped after ORM writes to the source
+tables and rebuilt in the background with the other in-memory indexes when
+another process changes the data (services/cache.py).
+"""
+import bisect
+import re
+import threading
+
+import numpy as np
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from models import db, Company, Job, Program, Skill, job_skills
+
+TYPES = ('skill', 'title', 'company', 'program')
+
+MAX_LIMIT = 20
+
+_WORD_START = re.compile(r'(?<!\w)\w')
+
+# Sorts after every character, so [prefix, prefix + _LAST) holds the keys starting with prefix
+_LAST = '\U0010ffff'
+
+
+def normalize(text):
+    return ' '.join(text.lower().split())
+
+
+class PrefixIndex:
+    """The labels of one type by rank, and their word-start suffixes in sorted order"""
+
+    def __init__(self, entries):
+        # (label, id, count), most popular first
+        entries = sorted(entries, key=lambda e: (-e[2], e[0].lower()))
+        self.labels = [label for label, _, _ in entries]
+        self.ids = [entity_id for _, entity_id, _ in entries]
+        self.counts = [count for _, _, count in entries]
+        self.n = len(entries)
+
+        suffixes = []
+        for rank, label in enumerate(self.labels):
+            key = normalize(label)
+            starts = {0} | {m.start() for m in _WORD_START.finditer(key)}
+            for start in starts:
+                # Later words rank after every label that starts with the prefix
+                suffixes.append((key[start:], rank + (self.n if start else 0)))
+        suffixes.sort()
+        self.keys = [key for key, _ in suffixes]
+        self.scores = np.array([score for _, score in suffixes], dtype=np.int64)
+        self._short = {
+            first: self._top(first, MAX_LIMIT)
+            for first in {key[0] for key in self.keys if key}
+        }
+
+    def _top(self, prefix, limit):
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_left(self.keys, prefix + _LAST, lo)
+        scores = self.scores[lo:hi]
+        # A label can match at several words; take enough candidates to fill the limit once deduplicated
+        candidates = limit * 4
+        if len(scores) > candidates:
+            best = np.sort(scores[np.argpartition(scores, candidates)[:candidates]])
+        else:
+            best = np.sort(scores)
+        ranks = []
+        for rank in (best % max(self.n, 1)).tolist():
+            if rank not in ranks:
+                ranks.append(rank)
+                if len(ranks) == limit:
+                    break
+        if len(ranks) < limit and len(scores) > candidates:
+            ranks = list(dict.fromkeys((np.sort(scores) % self.n).tolist()))[:limit]
+        return ranks
+
+    def complete(self, prefix, limit):
+        """Ranks of the best `limit` labels matching the normalized prefix"""
+        if len(prefix) == 1:
+            return self._short.get(prefix, [])[:limit]
+        return self._top(prefix, limit)
+
+
+class Autocomplete:
+    def __init__(self, entries):
+        self.indexes = {kind: PrefixIndex(entries.get(kind, ())) for kind in TYPES}
+
+    @classmethod
+    def load(cls):
+        skills = db.session.execute(
+            select(Skill.name, Skill.id, func.count(job_skills.c.job_id))
+            .outerjoin(job_skills, job_skills.c.skill_id == Skill.id)
+            .group_by(Skill.id, Skill.name)
+        ).all()
+        titles = db.session.execute(
+            select(Job.title, func.count()).where(Job.title.isnot(None)).group_by(Job.title)
+        ).all()
+        companies = db.session.execute(
+            select(Company.name, Company.id, func.count(Job.id))
+            .outerjoin(Job, Job.company_id == Company.id)
+            .group_by(Company.id, Company.name)
+        ).all()
+        programs = db.session.execute(
+            select(Program.program_name, func.count())
+            .where(Program.program_name.isnot(None)).group_by(Program.program_name)
+        ).all()
+        return cls({
+            'skill': skills,
+            'title': [(title, None, count) for title, count in titles],
+            'company': companies,
+            'program': [(name, None, count) for name, count in programs],
+        })
+
+    def complete(self, text, types=TYPES, limit=5):
+        """{type: [{id, label, count}]} for the labels with a word starting with `text`; id for skills and companies"""
+        for kind in types:
+            if kind not in TYPES:
+                raise ValueError(f"Unknown type {kind!r}, expected one of: {', '.join(TYPES)}")
+        prefix = normalize(text)
+        if not prefix:
+            raise ValueError("q is required")
+        limit = max(1, min(limit, MAX_LIMIT))
+        output = {}
+        for kind in types:
+            index = self.indexes[kind]
+            items = []
+            for rank in index.complete(prefix, limit):
+                item = {} if index.ids[rank] is None else {'id': index.ids[rank]}
+                item['label'] = index.labels[rank]
+                item['count'] = index.counts[rank]
+                items.append(item)
+            output[kind] = items
+        return output
+
+
+class AutocompleteCache:
+    """The Autocomplete index of this process, loaded on first use"""
+
+    def __init__(self):
+        self._index = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._index = None
+
+    def reload(self):
+        """Load a new index off to the side and swap it in; nothing to do if none was loaded"""
+        index = self._index
+        if index is None:
+            return
+        fresh = Autocomplete.load()
+        with self._lock:
+            if self._index is index:
+                self._index = fresh
+
+    def get(self):
+        index = self._index
+        if index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = Autocomplete.load()
+                index = self._index
+        return index
+
+
+autocomplete = AutocompleteCache()
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, (Job, Company, Skill, Program)):
+            session.info['autocomplete_stale'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    if session.info.pop('autocomplete_stale', False):
+        autocomplete.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('autocomplete_stale', None)
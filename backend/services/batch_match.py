@@ -0,0 +1,131 @@
+"""
+Job matching for many skill profiles at once.
+
+Profiles ({"id", "skills", "experience_level", "location"}) are scored in
+chunks against one job index snapshot with scoring.match_jobs_batch, and
+come out as one record per profile, in input order, with the job details
+of each chunk's matches read in one query. A profile without a list of
+skills gets an error record instead of failing the batch.
+
+POST /api/match/jobs/batch scores in the request's process. The match_batch
+CLI can fan the chunks out over a process pool instead: the parent loads the
+snapshot before forking, so every worker shares it without reloading or
+pickling it.
+"""
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import select
+
+from models import db, Company, Job
+from services import scoring
+from services.skill_index import job_index
+
+MAX_LIMIT = 50
+
+# Profiles per scoring task and per job details query
+CHUNK_SIZE = 200
+
+# The snapshot pool workers inherit from the parent
+_snapshot = None
+
+
+def read_profiles(lines):
+    """Profiles from NDJSON lines; raises ValueError for a line that is not a JSON object"""
+    profiles = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            profile = json.loads(line)
+        except ValueError:
+            raise ValueError(f"Line {number} is not valid JSON")
+        if not isinstance(profile, dict):
+            raise ValueError(f"Line {number} is not a JSON object")
+        profiles.append(profile)
+    return profiles
+
+
+def _error(profile):
+    skills = profile.get('skills')
+    if not isinstance(skills, list) or not all(isinstance(s, str) for s in skills):
+        return 'skills must be a list of names'
+    if not skills:
+        return 'No skills provided'
+    for field in ('experience_level', 'location'):
+        if profile.get(field) is not None and not isinstance(profile[field], str):
+            return f'{field} must be a string'
+    return None
+
+
+def _score(chunk, limit, matrix=None):
+    """(total, top) per profile of the chunk; profiles with an error get no matches"""
+    valid = [profile for profile in chunk if _error(profile) is None]
+    results = iter(scoring.match_jobs_batch(valid, limit, matrix or _snapshot))
+    return [next(results) if _error(profile) is None else (0, []) for profile in chunk]
+
+
+def _job_details(results):
+    ids = {job_id for _, top in results for job_id, *_ in top}
+    if not ids:
+        return {}
+    rows = db.session.execute(
+        select(Job.id, Job.title, Company.name, Job.location, Job.experience_level)
+        .outerjoin(Company, Job.company_id == Company.id)
+        .where(Job.id.in_(ids))
+    )
+    return {
+        job_id: {'id': job_id, 'title': title, 'company': company,
+                 'location': location, 'experience_level': level}
+        for job_id, title, company, location, level in rows
+    }
+
+
+def _records(first, chunk, results):
+    jobs = _job_details(results)
+    for index, (profile, (total, top)) in enumerate(zip(chunk, results), first):
+        record = {'id': profile.get('id', index)}
+        error = _error(profile)
+        if error:
+            record['error'] = error
+            yield record
+            continue
+        record['count'] = total
+        record['matches'] = [{
+            'job': jobs.get(job_id, {'id': job_id}),
+            'match_score': round(score * 100, 1),
+            'matching_skills': common,
+            'missing_skills': missing
+        } for job_id, score, common, missing in top]
+        yield record
+
+
+def match_records(profiles, limit=10, workers=1):
+    """
+    One output record per profile, in order: {id, count, matches} or
+    {id, error}. `id` defaults to the profile's position. With workers > 1
+    the chunks are scored in a pool of forked processes.
+    """
+    global _snapshot
+    limit = max(1, min(limit, MAX_LIMIT))
+    chunks = [profiles[i:i + CHUNK_SIZE] for i in range(0, len(profiles), CHUNK_SIZE)]
+    matrix = job_index.matrix()
+    if workers > 1 and len(chunks) > 1:
+        _snapshot = matrix
+        context = multiprocessing.get_context('fork')
+        try:
+            with ProcessPoolExecutor(min(workers, len(chunks)), mp_context=context) as pool:
+                for i, results in enumerate(pool.map(_score, chunks, [limit] * len(chunks))):
+                    yield from _records(i * CHUNK_SIZE, chunks[i], results)
+        finally:
+            _snapshot = None
+    else:
+        for i, chunk in enumerate(chunks):
+            yield from _records(i * CHUNK_SIZE, chunk, _score(chunk, limit, matrix))
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
@@ -0,0 +1,306 @@
+"""
+Response cache for the read endpoints.
+
+The data only changes when it is (re)ingested, so GET responses are cached
+by path and normalized query string, tagged with a strong ETag and answered
+with 304 when the client already has them. Every data change bumps the
+`data_version` row (ingest in its transaction, ORM writes on flush); the
+version is part of the cache key, so a bump invalidates everything at once,
+across processes and in the shared backend. Each process re-reads the
+version at most every CACHE_VERSION_INTERVAL seconds. When another process
+changed the data, the in-memory indexes it has loaded (skill, co-occurrence,
+lookup, retrieval, column, trend, autocomplete and salary) are rebuilt on a
+background thread and each swapped in when ready; the process keeps
+answering from the previous ones, under the previous version, until all of
+them are rebuilt and then moves to the new version at once. With
+CACHE_BACKGROUND_RELOAD=0 they are dropped instead and rebuilt by the next
+requests that use them.
+
+Backends: 'memory' (per-process LRU bounded by entries and bytes), 'redis'
+(shared between workers, optional dependency) or 'none'.
+"""
+import functools
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from urllib.parse import urlencode
+
+from flask import current_app, request
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+
+from models import (db, Company, DataVersion, Industry, Job, Location, Program,
+                    Skill, University)
+from services.autocomplete import autocomplete
+from services.columnar import job_table
+from services.cooccurrence import skill_graph
+from services.encoding import negotiated_mimetype
+from services.lookups import invalidate_lookups, reload_lookups
+from services.retrieval import retriever
+from services.rollups import current_state
+from services.salary import salary_store
+from services.skill_index import job_index, program_index
+from services.trends import trend_store
+
+VERSION_ID = 1
+
+CachedResponse = namedtuple('CachedResponse', 'etag mimetype body')
+
+_DATA_MODELS = (Job, Company, Skill, University, Program, Location, Industry)
+
+
+class LRUBackend:
+    """Thread-safe in-process LRU with per-entry expiry"""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, CachedResponse)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key, entry, ttl):
+        size = len(entry.body)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (time.monotonic() + ttl, entry)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _pop(self, key):
+        _, entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+
+
+class RedisBackend:
+    """Shared cache in Redis; eviction is left to the server's maxmemory policy"""
+
+    def __init__(self, url, prefix='lmi:response:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis needs the 'redis' package (pip install redis)")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        header, body = raw.split(b'\n', 1)
+        etag, mimetype = json.loads(header)
+        return CachedResponse(etag, mimetype, body)
+
+    def set(self, key, entry, ttl):
+        header = json.dumps([entry.etag, entry.mimetype]).encode()
+        self.client.setex(self.prefix + key, max(1, int(ttl)), header + b'\n' + entry.body)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+def invalidate_indexes():
+    """Drop every in-memory index; each is rebuilt by the next request that uses it"""
+    job_index.invalidate()
+    program_index.invalidate()
+    invalidate_lookups()
+    retriever.invalidate()
+    job_table.invalidate()
+    trend_store.invalidate()
+    autocomplete.invalidate()
+
+
+def reload_indexes():
+    """Rebuild the in-memory indexes this process has loaded, swapping each in when ready"""
+    job_index.reload()
+    program_index.reload()
+    skill_graph.reload()
+    reload_lookups()
+    retriever.reload()
+    job_table.reload()
+    trend_store.reload()
+    autocomplete.reload()
+    salary_store.reload(current_state().refreshed_at)
+
+
+class ResponseCache:
+    def __init__(self):
+        self.backend = None
+        self.ttl = 300
+        self.version_interval = 2.0
+        self.background_reload = True
+        self._version = None
+        self._reloading = None     # version the background reload is moving to
+        self._checked_at = float('-inf')
+        self._exempt = set()
+
+    def init_app(self, app):
+        kind = app.config.get('CACHE_BACKEND', 'memory')
+        self.ttl = app.config.get('CACHE_TTL', 300)
+        self.version_interval = app.config.get('CACHE_VERSION_INTERVAL', 2.0)
+        self.background_reload = app.config.get('CACHE_BACKGROUND_RELOAD', True)
+        if kind == 'memory':
+            self.backend = LRUBackend(app.config.get('CACHE_MAX_ENTRIES', 2048),
+                                      app.config.get('CACHE_MAX_BYTES', 64 * 1024 * 1024))
+        elif kind == 'redis':
+            self.backend = RedisBackend(app.config['CACHE_REDIS_URL'])
+        elif kind == 'none':
+            self.backend = None
+        else:
+            raise ValueError(f"Unknown CACHE_BACKEND {kind!r}")
+        app.before_request(self._check_version)
+
+    def data_version(self):
+        """Current data version, re-read from the database at most every version_interval"""
+        now = time.monotonic()
+        if now - self._checked_at >= self.version_interval:
+            version = db.session.execute(
+                select(DataVersion.version).where(DataVersion.id == VERSION_ID)
+            ).scalar() or 0
+            self._checked_at = now
+            if self._version is None:
+                self._version = version
+            elif version != self._version and self._reloading is None:
+                # Another process (ingest, a background task) changed the data
+                if self.background_reload:
+                    self._start_reload(version)
+                else:
+                    invalidate_indexes()
+                    self._version = version
+        return self._version
+
+    def _start_reload(self, version):
+        self._reloading = version
+        app = current_app._get_current_object()
+        threading.Thread(target=self._reload, args=(app, version), name='index-reload', daemon=True).start()
+
+    def _reload(self, app, version):
+        try:
+            with app.app_context():
+                reload_indexes()
+        except Exception:
+            app.logger.exception('Background index reload failed, dropping the indexes instead')
+            invalidate_indexes()
+        finally:
+            # A version this process wrote itself meanwhile is newer still
+            self._version = max(self._version, version)
+            self._reloading = None
+
+    def exempt(self, view):
+        """Skip the per-request version check for a view that must not depend on it (health probes)"""
+        self._exempt.add(view)
+        return view
+
+    def _check_version(self):
+        if current_app.view_functions.get(request.endpoint) in self._exempt:
+            return
+        self.data_version()
+
+    def adopt_version(self, version):
+        """Take a version this process wrote itself, without dropping the indexes"""
+        self._version = version
+        self._checked_at = time.monotonic()
+
+    def key(self):
+        args = sorted(request.args.items(multi=True))
+        return f'{self.data_version()}:{negotiated_mimetype()}:{request.path}?{urlencode(args)}'
+
+    def cached(self, ttl=None):
+        """Cache a GET view's 200 responses and answer If-None-Match with 304"""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if self.backend is None or request.method != 'GET':
+                    return view(*args, **kwargs)
+                key = self.key()
+                entry = self.backend.get(key)
+                status = 'HIT'
+                if entry is None:
+                    response = current_app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.direct_passthrough:
+                        return response
+                    body = response.get_data()
+                    entry = CachedResponse(hashlib.blake2b(body, digest_size=16).hexdigest(),
+                                           response.mimetype, body)
+                    self.backend.set(key, entry, self.ttl if ttl is None else ttl)
+                    status = 'MISS'
+                return self._respond(entry, status)
+            return wrapper
+        return decorator
+
+    def _respond(self, entry, status):
+        if request.if_none_match.contains(entry.etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.response_class(entry.body, mimetype=entry.mimetype)
+        response.set_etag(entry.etag)
+        # Let clients keep the body but revalidate, so a new ingest shows up at once
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Cache'] = status
+        response.vary.add('Accept')
+        return response
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+
+response_cache = ResponseCache()
+cached = response_cache.cached
+
+
+def bump_data_version(conn):
+    """Invalidate every cached response; returns the new version"""
+    values = {'version': DataVersion.version + 1, 'updated_at': datetime.utcnow()}
+    result = conn.execute(update(DataVersion).where(DataVersion.id == VERSION_ID).values(**values))
+    if result.rowcount == 0:
+        conn.execute(insert(DataVersion).values(id=VERSION_ID, version=1, updated_at=datetime.utcnow()))
+    return conn.execute(select(DataVersion.version).where(DataVersion.id == VERSION_ID)).scalar()
+
+
+# Bump the version once per transaction that writes data through the ORM
+
+@event.listens_for(Session, 'after_flush')
+def _bump_on_write(session, flush_context):
+    if 'data_version' in session.info:
+        return
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, _DATA_MODELS):
+            session.info['data_version'] = bump_data_version(session.connection())
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _adopt_version(session):
+    version = session.info.pop('data_version', None)
+    if version is not None:
+        response_cache.adopt_version(version)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_version(session):
+    session.info.pop('data_version', None)
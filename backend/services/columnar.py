@@ -0,0 +1,402 @@
+"""
+Columnar in-memory copy of the jobs table for ad-hoc analytics.
+
+Every job becomes one row of a JobTable: categorical fields are dictionary
+encoded (small integer codes plus a list of values), salaries and posted
+dates are NumPy arrays, and skills are (row, skill) pairs. Group-bys
+combine the codes of the requested dimensions into one integer key and
+aggregate with bincount / lexsort, so a query over every job takes a few
+milliseconds and never touches the database.
+
+The table is loaded with two SELECTs on first use and rebuilt after the data
+changes (ORM commits touching jobs, companies or skills, or a data version
+bump from another process, see services.cache). A rebuild creates a new
+table and swaps the reference, so running queries keep the one they
+started with.
+"""
+import threading
+from datetime import date, datetime
+
+import numpy as np
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from models import db, Company, Job, Skill, job_skills
+
+EPOCH = date(1970, 1, 1)
+
+# Query parameter -> JobTable column; 'skill' is multi-valued (a job counts
+# once in every skill group it requires)
+CATEGORICAL = {
+    'experience': 'experience_level',
+    'industry': 'industry',
+    'location': 'location',
+    'employment_type': 'employment_type',
+    'company': 'company',
+    'degree': 'degree_required',
+    'active': 'is_active',
+    'month': 'posted_month',
+}
+DIMENSIONS = (*CATEGORICAL, 'skill')
+
+# Numeric fields the aggregates can run on
+FIELDS = ('salary', 'salary_min', 'salary_max')
+
+AGGREGATES = ('count', 'sum', 'mean', 'min', 'max')
+
+# Group-bys with at most this many possible keys use a lookup table
+DENSE_GROUPS = 1 << 22
+
+
+def _encode(values):
+    """Dictionary-encode a sequence: (codes array, list of distinct values)"""
+    uniques = {}
+    codes = np.fromiter((uniques.setdefault(v, len(uniques)) for v in values),
+                        dtype=np.int32, count=len(values))
+    return codes, list(uniques)
+
+
+def _month(day):
+    return day.strftime('%Y-%m') if day else None
+
+
+class JobTable:
+    """Immutable column snapshot of the jobs table"""
+
+    def __init__(self, rows, links):
+        n = len(rows)
+        self.n_rows = n
+        self.built_at = datetime.utcnow()
+        ids, *cols = zip(*rows) if rows else [()] * 11
+        (experience, employment_type, location, degree, is_active,
+         salary_min, salary_max, posted, company, industry) = cols
+        self.ids = list(ids)
+
+        self.columns = {
+            'experience_level': _encode(experience),
+            'employment_type': _encode(employment_type),
+            'location': _encode(location),
+            'degree_required': _encode(degree),
+            'is_active': _encode(is_active),
+            'company': _encode(company),
+            'industry': _encode(industry),
+            'posted_month': _encode([_month(d) for d in posted]),
+        }
+
+        lo = np.array([np.nan if v is None else v for v in salary_min], dtype=np.float64)
+        hi = np.array([np.nan if v is None else v for v in salary_max], dtype=np.float64)
+        # Same rule as the rollups: jobs without a positive minimum are unsalaried
+        salaried = lo > 0
+        self.numeric = {
+            'salary_min': np.where(salaried, lo, np.nan),
+            'salary_max': np.where(salaried, hi, np.nan),
+            'salary': np.where(salaried, (lo + hi) / 2, np.nan),
+        }
+        # Rows with a value, in ascending value order, for the percentiles
+        self.sorted_rows = {
+            field: np.argsort(values, kind='stable')[:np.count_nonzero(~np.isnan(values))].astype(np.int32)
+            for field, values in self.numeric.items()
+        }
+        self.posted_day = np.array(
+            [(d - EPOCH).days if d else -1 for d in posted], dtype=np.int32
+        )
+
+        # Skills as (row, skill code) pairs sorted by row, and for the
+        # percentiles the pairs that have a value, in ascending value order
+        row_of = {job_id: i for i, job_id in enumerate(self.ids)}
+        skill_codes, self.skill_names = _encode([name for _, name in links])
+        link_rows = np.fromiter((row_of[job_id] for job_id, _ in links), dtype=np.int32, count=len(links))
+        order = np.argsort(link_rows, kind='stable')
+        self.skill_rows = link_rows[order]
+        self.skill_codes = skill_codes[order]
+        self.sorted_pairs = {}
+        for field, values in self.numeric.items():
+            pair_values = values[self.skill_rows]
+            ordered = np.argsort(pair_values, kind='stable')[:np.count_nonzero(~np.isnan(pair_values))]
+            self.sorted_pairs[field] = (self.skill_rows[ordered], self.skill_codes[ordered])
+
+    @classmethod
+    def load(cls):
+        rows = db.session.execute(
+            select(Job.id, Job.experience_level, Job.employment_type, Job.location,
+                   Job.degree_required, Job.is_active, Job.salary_min_usd, Job.salary_max_usd,
+                   Job.posted_date, Company.name, Company.industry)
+            .join(Company, Company.id == Job.company_id)
+            .order_by(Job.id)
+        ).all()
+        links = db.session.execute(
+            select(job_skills.c.job_id, Skill.name).join(Skill, Skill.id == job_skills.c.skill_id)
+        ).all()
+        return cls(rows, links)
+
+    # --- Filters ---
+
+    def _category_mask(self, dimension, values):
+        codes, uniques = self.columns[CATEGORICAL[dimension]]
+        if dimension == 'active':
+            values = [str(v).lower() in ('1', 'true', 'yes') for v in values]
+        wanted = np.zeros(len(uniques) + 1, dtype=bool)
+        lookup = {v: i for i, v in enumerate(uniques)}
+        for value in values:
+            if value in lookup:
+                wanted[lookup[value]] = True
+        return wanted[codes]
+
+    def _skill_mask(self, names):
+        """Rows that require at least one of the skills"""
+        lookup = {v.lower(): i for i, v in enumerate(self.skill_names)}
+        wanted = np.zeros(len(self.skill_names) + 1, dtype=bool)
+        for name in names:
+            if name.lower() in lookup:
+                wanted[lookup[name.lower()]] = True
+        hits = self.skill_rows[wanted[self.skill_codes]]
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[hits] = True
+        return mask
+
+    def mask(self, filters=None, since=None, until=None, min_salary=None, max_salary=None):
+        """Boolean row mask: every filter must match ({dimension: [values]} is an OR per dimension)"""
+        mask = np.ones(self.n_rows, dtype=bool)
+        for dimension, values in (filters or {}).items():
+            if dimension == 'skill':
+                mask &= self._skill_mask(values)
+            elif dimension in CATEGORICAL:
+                mask &= self._category_mask(dimension, values)
+            else:
+                raise ValueError(f"Unknown filter {dimension!r}, expected one of: {', '.join(DIMENSIONS)}")
+        if since is not None:
+            mask &= self.posted_day >= (since - EPOCH).days
+        if until is not None:
+            mask &= (self.posted_day >= 0) & (self.posted_day <= (until - EPOCH).days)
+        salary = self.numeric['salary']
+        if min_salary is not None:
+            mask &= salary >= min_salary
+        if max_salary is not None:
+            mask &= salary <= max_salary
+        return mask
+
+    # --- Group-by ---
+
+    def _entries(self, mask, group_by, field=None):
+        """
+        The (row, group key) entries of the rows in `mask` for `group_by`;
+        with 'skill' a row gives one entry per required skill. With `field`,
+        only entries that have a value, in ascending value order. Returns
+        (entry rows, keys, labels per dimension).
+        """
+        skill_code = None
+        if 'skill' in group_by:
+            rows, skill_code = (self.skill_rows, self.skill_codes) if field is None else self.sorted_pairs[field]
+            selected = mask[rows]
+            rows, skill_code = rows[selected], skill_code[selected]
+        elif field is None:
+            rows = np.flatnonzero(mask)
+        else:
+            ordered = self.sorted_rows[field]
+            rows = ordered[mask[ordered]]
+
+        # Mixed-radix key over the dimension codes
+        key = np.zeros(len(rows), dtype=np.int64)
+        labels = []
+        for dimension in group_by:
+            if dimension == 'skill':
+                codes, values = skill_code, self.skill_names
+            else:
+                column_codes, values = self.columns[CATEGORICAL[dimension]]
+                codes = column_codes[rows]
+            key = key * len(values) + codes
+            labels.append(values)
+        return rows, key, labels
+
+    def query(self, group_by=(), metrics=('count',), mask=None, min_count=1, order=None, limit=None):
+        """
+        Aggregate the rows selected by `mask` per combination of the
+        `group_by` dimensions. metrics are 'count' or '<agg>:<field>' where
+        agg is sum/mean/min/max or pNN (percentile, e.g. p50) and field one
+        of FIELDS ('mean' alone means 'mean:salary'). Returns a list of dicts.
+        """
+        for dimension in group_by:
+            if dimension not in DIMENSIONS:
+                raise ValueError(f"Unknown dimension {dimension!r}, expected one of: {', '.join(DIMENSIONS)}")
+        if len(set(group_by)) != len(group_by):
+            raise ValueError("A dimension can only be grouped by once")
+        parsed = [_parse_metric(m) for m in metrics]
+        if mask is None:
+            mask = np.ones(self.n_rows, dtype=bool)
+
+        rows, key, labels = self._entries(mask, group_by)
+        space = int(np.prod([len(values) for values in labels], dtype=np.float64))
+        if space <= DENSE_GROUPS:
+            # Small key space: group ids through a lookup table, no sort needed
+            present = np.bincount(key, minlength=space) > 0
+            groups = np.flatnonzero(present)
+            lookup = np.zeros(space, dtype=np.int64)
+            lookup[groups] = np.arange(len(groups))
+            group_of = lookup.__getitem__
+        else:
+            groups = np.unique(key)
+            group_of = lambda k: np.searchsorted(groups, k)
+        inverse = group_of(key)
+        n_groups = len(groups)
+        counts = np.bincount(inverse, minlength=n_groups)
+
+        results = {}
+        by_value = {}
+        for name, agg, field in parsed:
+            if agg == 'count':
+                results[name] = counts
+            elif agg.startswith('p'):
+                if field not in by_value:
+                    by_value[field] = self._grouped_values(field, mask, group_by, group_of, n_groups)
+                results[name] = _percentile(float(agg[1:]) / 100, *by_value[field])
+            else:
+                results[name] = _aggregate(agg, self.numeric[field][rows], inverse, n_groups)
+
+        # Decode the keys back into one label per dimension
+        decoded = []
+        remainder = groups
+        for values in reversed(labels):
+            decoded.append(remainder % len(values))
+            remainder = remainder // len(values)
+        decoded.reverse()
+
+        keep = np.flatnonzero(counts >= min_count)
+        if order:
+            column = order.lstrip('-')
+            if column not in results:
+                raise ValueError(f"Cannot order by {column!r}: not one of the requested metrics")
+            sort_values = results[column][keep].astype(np.float64)
+            # Groups without a value go last either way
+            if order.startswith('-'):
+                ranked = np.argsort(-np.nan_to_num(sort_values, nan=-np.inf), kind='stable')
+            else:
+                ranked = np.argsort(np.nan_to_num(sort_values, nan=np.inf), kind='stable')
+            keep = keep[ranked]
+        if limit is not None:
+            keep = keep[:limit]
+
+        output = []
+        for g in keep:
+            record = {dimension: values[codes[g]] for dimension, values, codes in zip(group_by, labels, decoded)}
+            for name in results:
+                record[name] = _value(results[name][g])
+            output.append(record)
+        return output
+
+    def _grouped_values(self, field, mask, group_by, group_of, n_groups):
+        """
+        Values of `field` sorted by (group, value), with the group sizes.
+        Entries come in the field's presorted order, so only a stable sort by
+        group id is left, a radix sort for up to 65536 groups.
+        """
+        rows, key, _ = self._entries(mask, group_by, field)
+        group = group_of(key)
+        if n_groups <= 1 << 16:
+            group = group.astype(np.uint16)
+        order = np.argsort(group, kind='stable')
+        return self.numeric[field][rows[order]], np.bincount(group, minlength=n_groups)
+
+
+def _parse_metric(metric):
+    """'count' | 'mean' | 'p90:salary_max' -> (output name, aggregate, field)"""
+    agg, _, field = metric.partition(':')
+    if agg == 'count':
+        return 'count', 'count', None
+    field = field or 'salary'
+    if field not in FIELDS:
+        raise ValueError(f"Unknown field {field!r}, expected one of: {', '.join(FIELDS)}")
+    if agg.startswith('p') and agg[1:].replace('.', '', 1).isdigit():
+        if not 0 <= float(agg[1:]) <= 100:
+            raise ValueError(f"Percentile out of range in {metric!r}")
+    elif agg not in AGGREGATES:
+        raise ValueError(f"Unknown aggregate {agg!r}, expected count, sum, mean, min, max or pNN")
+    return f'{agg}_{field}', agg, field
+
+
+def _aggregate(agg, values, groups, n_groups):
+    """Per-group sum/mean/min/max of `values` (NaN = missing); NaN where a group has no values"""
+    valid = ~np.isnan(values)
+    values, groups = values[valid], groups[valid]
+    counts = np.bincount(groups, minlength=n_groups)
+    empty = counts == 0
+    if agg in ('sum', 'mean'):
+        sums = np.bincount(groups, weights=values, minlength=n_groups)
+        if agg == 'sum':
+            return sums
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(empty, np.nan, sums / counts)
+    out = np.full(n_groups, np.inf if agg == 'min' else -np.inf)
+    (np.minimum if agg == 'min' else np.maximum).at(out, groups, values)
+    return np.where(empty, np.nan, out)
+
+
+def _percentile(q, ordered, counts):
+    """Per-group percentile (linear interpolation) of values sorted by (group, value)"""
+    if not len(ordered):
+        return np.full(len(counts), np.nan)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    position = starts + q * np.maximum(counts - 1, 0)
+    lower = np.minimum(np.floor(position).astype(np.int64), len(ordered) - 1)
+    upper = np.minimum(np.ceil(position).astype(np.int64), len(ordered) - 1)
+    result = ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+    return np.where(counts == 0, np.nan, result)
+
+
+def _value(value):
+    if isinstance(value, np.floating):
+        return None if np.isnan(value) else round(float(value), 2)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+class JobTableCache:
+    """The current JobTable of this process, loaded on first use"""
+
+    def __init__(self):
+        self._table = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._table = None
+
+    def reload(self):
+        """Load a new table off to the side and swap it in; nothing to do if none was loaded"""
+        table = self._table
+        if table is None:
+            return
+        fresh = JobTable.load()
+        with self._lock:
+            if self._table is table:
+                self._table = fresh
+
+    def get(self):
+        table = self._table
+        if table is None:
+            with self._lock:
+                if self._table is None:
+                    self._table = JobTable.load()
+                table = self._table
+        return table
+
+
+job_table = JobTableCache()
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, (Job, Company, Skill)):
+            session.info['job_table_stale'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    if session.info.pop('job_table_stale', False):
+        job_table.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('job_table_stale', None)
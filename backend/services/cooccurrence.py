@@ -0,0 +1,224 @@
+"""
+Skill co-occurrence graph.
+
+How often two skills are asked for by the same job, from the job skill
+index (services/skill_index.py): the sparse skill x skill count matrix is
+built in one vectorized pass over the index's CSR rows, then every pair is
+scored with
+
+- confidence: share of the jobs asking for skill a that also ask for b
+- lift: how much more often the pair occurs than if the skills were
+  independent (count * jobs / (jobs with a * jobs with b)); PMI is its log2
+
+and each skill's TOP_K neighbours by lift and by confidence are kept as
+ready-made lists, so /api/skills/<id>/related is a slice and "what to learn
+next" merges a few of them.
+
+ORM writes reach the graph through the skill index's journal: only the
+pairs of the jobs that changed are added or subtracted. A data change from
+another process (ingest) rebuilds the index, and the graph with it.
+"""
+import math
+import threading
+
+import numpy as np
+from sqlalchemy import select
+
+from models import db, Skill
+from services.skill_index import job_index
+
+TOP_K = 25
+
+# Pairs seen in fewer jobs are left out of the lift ranking (too noisy)
+MIN_SUPPORT = 5
+
+# Rows per vectorized pass; bounds the memory of the pair arrays
+CHUNK_ROWS = 100_000
+
+ORDERS = ('lift', 'confidence')
+
+
+def _pair_keys(indptr, indices):
+    """(a << 32 | b) for every pair of terms a < b on the same row"""
+    lengths = np.diff(indptr)
+    row_of = np.repeat(np.arange(len(lengths)), lengths)
+    position = np.arange(len(indices)) - indptr[row_of]
+    # Each entry pairs with the entries after it on its row
+    partners = lengths[row_of] - position - 1
+    first = np.repeat(np.arange(len(indices)), partners)
+    offset = np.arange(len(first)) - np.repeat(np.cumsum(partners) - partners, partners)
+    second = first + offset + 1
+    return indices[first].astype(np.int64) << 32 | indices[second]
+
+
+def _merge(keys, counts):
+    """Sum the counts of equal keys, dropping the pairs that reach zero"""
+    keys, inverse = np.unique(keys, return_inverse=True)
+    counts = np.bincount(inverse, weights=counts).astype(np.int64)
+    keep = counts != 0
+    return keys[keep], counts[keep]
+
+
+def count_pairs(indptr, indices):
+    """Sparse co-occurrence counts of a CSR incidence matrix: (pair keys, counts)"""
+    keys, counts = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+    n_rows = len(indptr) - 1
+    for start in range(0, n_rows, CHUNK_ROWS):
+        end = min(start + CHUNK_ROWS, n_rows)
+        chunk = _pair_keys(indptr[start:end + 1] - indptr[start], indices[indptr[start]:indptr[end]])
+        chunk_keys, chunk_counts = np.unique(chunk, return_counts=True)
+        keys.append(chunk_keys)
+        counts.append(chunk_counts)
+    return _merge(np.concatenate(keys), np.concatenate(counts))
+
+
+class SkillGraph:
+    def __init__(self, matrix, n_jobs, keys, counts, frequency, skills):
+        self.matrix = matrix
+        self.journal = matrix.journal
+        self.n_changes = matrix.n_changes
+        self.n_jobs = n_jobs
+        self.keys = keys
+        self.counts = counts
+        self.frequency = frequency      # term -> jobs asking for it
+        self.skills = skills            # lowercase name -> (id, name)
+        self.term_names = matrix.term_names
+        self._rank()
+
+    @classmethod
+    def build(cls, matrix):
+        keys, counts = count_pairs(matrix.indptr, matrix.indices)
+        frequency = np.bincount(matrix.indices, minlength=len(matrix.term_names)).astype(np.int64)
+        n_jobs = sum(1 for entity_id in matrix.ids if entity_id is not None)
+        return cls(matrix, n_jobs, keys, counts, frequency, _load_skills())
+
+    def updated(self, matrix):
+        """The graph of a later snapshot of the same journal, applying only its changes"""
+        changes = matrix.journal[self.n_changes:matrix.n_changes]
+        keys, counts = [self.keys], [self.counts]
+        frequency = np.zeros(len(matrix.term_names), dtype=np.int64)
+        frequency[:len(self.frequency)] = self.frequency
+        n_jobs = self.n_jobs
+        for old_terms, new_terms, row_delta in changes:
+            for terms, sign in ((old_terms, -1), (new_terms, 1)):
+                terms = np.frombuffer(terms, dtype=np.intc) if len(terms) else np.zeros(0, dtype=np.intc)
+                pairs = _pair_keys(np.array([0, len(terms)]), terms)
+                keys.append(pairs)
+                counts.append(np.full(len(pairs), sign, dtype=np.int64))
+                np.add.at(frequency, terms, sign)
+            n_jobs += row_delta
+        keys, counts = _merge(np.concatenate(keys), np.concatenate(counts))
+        return SkillGraph(matrix, n_jobs, keys, counts, frequency, _load_skills())
+
+    def _rank(self):
+        """Score both directions of every pair and keep each term's top neighbours per order"""
+        a = (self.keys >> 32).astype(np.intp)
+        b = (self.keys & 0xFFFFFFFF).astype(np.intp)
+        source = np.concatenate((a, b))
+        target = np.concatenate((b, a))
+        count = np.concatenate((self.counts, self.counts)).astype(np.float64)
+        frequency = self.frequency.astype(np.float64)
+        confidence = count / frequency[source]
+        lift = count * self.n_jobs / (frequency[source] * frequency[target])
+
+        self.neighbours = {}
+        for order, score, eligible in (
+            ('lift', lift, count >= MIN_SUPPORT),
+            ('confidence', confidence, np.ones(len(count), dtype=bool)),
+        ):
+            idx = np.flatnonzero(eligible)
+            idx = idx[np.lexsort((target[idx], -score[idx], source[idx]))]
+            # Rank within each source term; keep the first TOP_K
+            rank = np.arange(len(idx)) - np.searchsorted(source[idx], source[idx])
+            lists = {}
+            for i in idx[rank < TOP_K].tolist():
+                lists.setdefault(int(source[i]), []).append(
+                    (int(target[i]), int(count[i]), float(confidence[i]), float(lift[i]))
+                )
+            self.neighbours[order] = lists
+        self.described = {
+            order: {term: [self.describe(*item) for item in items] for term, items in lists.items()}
+            for order, lists in self.neighbours.items()
+        }
+
+    def term(self, name):
+        return self.matrix.terms.get(name.lower())
+
+    def describe(self, term, count, confidence, lift):
+        skill_id, name = self.skills.get(self.term_names[term], (None, self.term_names[term]))
+        return {
+            'id': skill_id,
+            'name': name,
+            'jobs_together': count,
+            'confidence': round(confidence, 4),
+            'lift': round(lift, 3),
+            'pmi': round(math.log2(lift), 3),
+        }
+
+    def related(self, name, order='lift', limit=10):
+        """The skill's strongest neighbours, or None if no job asks for it"""
+        if order not in ORDERS:
+            raise ValueError(f"Unknown order {order!r}, expected one of: {', '.join(ORDERS)}")
+        term = self.term(name)
+        if term is None:
+            return None
+        return self.described[order].get(term, [])[:limit]
+
+    def next_skills(self, names, limit=10):
+        """
+        Skills to learn next: the ones most often asked for together with
+        the given skills, by mean confidence over them (each skill's top
+        neighbours only), with the best lift among them.
+        """
+        known = {t for t in (self.term(n) for n in names) if t is not None}
+        if not known:
+            return []
+        scores = {}
+        for term in known:
+            for target, count, confidence, lift in self.neighbours['confidence'].get(term, []):
+                if target in known:
+                    continue
+                total, together, best = scores.get(target, (0.0, 0, 0.0))
+                scores[target] = (total + confidence, together + count, max(best, lift))
+        ranked = sorted(scores.items(), key=lambda item: (-item[1][0], self.term_names[item[0]]))
+        output = []
+        for target, (total, together, best) in ranked[:limit]:
+            item = self.describe(target, together, total / len(known), best)
+            item['jobs'] = int(self.frequency[target])
+            output.append(item)
+        return output
+
+
+def _load_skills():
+    return {name.lower(): (skill_id, name) for skill_id, name in db.session.execute(select(Skill.id, Skill.name))}
+
+
+class SkillGraphCache:
+    """The SkillGraph of the current job index snapshot, updated from its journal when possible"""
+
+    def __init__(self):
+        self._graph = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        matrix = job_index.matrix()
+        graph = self._graph
+        if graph is not None and graph.matrix is matrix:
+            return graph
+        with self._lock:
+            graph = self._graph
+            if graph is None or graph.matrix is not matrix:
+                if graph is not None and graph.journal is matrix.journal and graph.n_changes <= matrix.n_changes:
+                    graph = graph.updated(matrix)
+                else:
+                    graph = SkillGraph.build(matrix)
+                self._graph = graph
+        return graph
+
+    def reload(self):
+        """Rebuild for the current job index snapshot before a request needs it; nothing to do if never used"""
+        if self._graph is not None:
+            self.get()
+
+
+skill_graph = SkillGraphCache()
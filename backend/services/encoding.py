@@ -0,0 +1,73 @@
+"""
+Response encoding.
+
+FastJSONProvider replaces Flask's stdlib-json provider, so every jsonify()
+encodes with orjson. Clients that prefer MessagePack (`Accept:
+application/msgpack`, used by internal consumers) get the same payload
+packed with msgpack when the optional package is installed.
+"""
+import decimal
+from datetime import date
+from enum import Enum
+
+import orjson
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import msgpack
+except ImportError:  # optional, only needed for MessagePack responses
+    msgpack = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+_MSGPACK_TYPES = (MSGPACK, 'application/x-msgpack')
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj):
+    """Types orjson/msgpack do not encode natively"""
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def negotiated_mimetype():
+    """MSGPACK when the request prefers it (and msgpack is installed), else JSON"""
+    if msgpack is None or not request:
+        return JSON
+    offered = [JSON, *_MSGPACK_TYPES]
+    best = request.accept_mimetypes.best_match(offered, default=JSON)
+    return MSGPACK if best in _MSGPACK_TYPES else JSON
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        option = _OPTIONS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if negotiated_mimetype() == MSGPACK:
+            body = msgpack.packb(obj, default=_default, datetime=False)
+            response = self._app.response_class(body, mimetype=MSGPACK)
+        else:
+            option = _OPTIONS | orjson.OPT_APPEND_NEWLINE
+            if (self.compact is None and self._app.debug) or self.compact is False:
+                option |= orjson.OPT_INDENT_2
+            body = orjson.dumps(obj, default=_default, option=option)
+            response = self._app.response_class(body, mimetype=self.mimetype)
+        response.vary.add('Accept')
+        return response
@@ -0,0 +1,310 @@
+"""
+Chatbot LLM client.
+
+One long-lived provider client per process (the HTTP connection pool is
+reused across requests) behind ChatService, which adds:
+- a bounded number of concurrent calls, so a slow provider cannot tie up
+  every worker; callers that wait longer than CHATBOT_QUEUE_TIMEOUT get
+  ChatbotBusy instead,
+- per-call timeouts and retries with exponential backoff on transient
+  errors (timeouts, connection errors, 429 and 5xx),
+- an LRU cache of answers keyed on the normalized prompt,
+- streamed output, for the SSE endpoint.
+
+Providers: 'gemini' (google-genai), 'openai' (any OpenAI-compatible API,
+e.g. DeepSeek via CHATBOT_BASE_URL) and 'stub', a local fake with
+configurable latency for offline development and load tests.
+"""
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+
+SYSTEM_PROMPT = (
+    "You are the assistant of a Labour Market Information platform for Cambodia. "
+    "Answer questions about the job market, skills, careers and education, "
+    "especially in Cambodia. If a question is outside that scope, say that it is "
+    "too broad for this assistant."
+)
+
+
+class ChatbotBusy(Exception):
+    """Every provider slot stayed taken for the whole queue timeout"""
+
+
+class ChatbotError(Exception):
+    """The provider failed after all retries"""
+
+
+def normalize_prompt(text):
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+# --- Providers ---
+
+class GeminiProvider:
+    def __init__(self, api_key, model, timeout):
+        from google import genai
+        from google.genai import types
+        self._types = types
+        self.model = model
+        self.client = genai.Client(
+            api_key=api_key,
+            http_options=types.HttpOptions(timeout=int(timeout * 1000)),
+        )
+
+    def _config(self, system):
+        return self._types.GenerateContentConfig(system_instruction=system)
+
+    def generate(self, system, prompt):
+        response = self.client.models.generate_content(
+            model=self.model, contents=prompt, config=self._config(system)
+        )
+        return response.text or ''
+
+    def stream(self, system, prompt):
+        for chunk in self.client.models.generate_content_stream(
+            model=self.model, contents=prompt, config=self._config(system)
+        ):
+            if chunk.text:
+                yield chunk.text
+
+    def retryable(self, exc):
+        from google.genai import errors
+        import httpx
+        if isinstance(exc, errors.APIError):
+            return exc.code == 429 or exc.code >= 500
+        return isinstance(exc, (httpx.TimeoutException, httpx.TransportError))
+
+
+class OpenAIProvider:
+    def __init__(self, api_key, model, timeout, base_url=None):
+        from openai import OpenAI
+        self.model = model
+        # Retries are done by ChatService so every provider behaves the same
+        self.client = OpenAI(api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0)
+
+    def _messages(self, system, prompt):
+        return [{'role': 'system', 'content': system}, {'role': 'user', 'content': prompt}]
+
+    def generate(self, system, prompt):
+        response = self.client.chat.completions.create(
+            model=self.model, messages=self._messages(system, prompt)
+        )
+        return response.choices[0].message.content or ''
+
+    def stream(self, system, prompt):
+        for chunk in self.client.chat.completions.create(
+            model=self.model, messages=self._messages(system, prompt), stream=True
+        ):
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def retryable(self, exc):
+        import openai
+        return isinstance(exc, (openai.APITimeoutError, openai.APIConnectionError,
+                                openai.RateLimitError, openai.InternalServerError))
+
+
+class StubProvider:
+    """Offline stand-in: a canned answer after `latency` seconds, streamed word by word"""
+
+    def __init__(self, latency=0.05, token_delay=0.0):
+        self.latency = latency
+        self.token_delay = token_delay
+
+    def _answer(self, prompt):
+        question = prompt.strip().splitlines()[-1] if prompt.strip() else ''
+        return f"[stub] You asked: {question[:200]}"
+
+    def generate(self, system, prompt):
+        time.sleep(self.latency)
+        return self._answer(prompt)
+
+    def stream(self, system, prompt):
+        time.sleep(self.latency)
+        for i, word in enumerate(self._answer(prompt).split(' ')):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield word if i == 0 else ' ' + word
+
+    def retryable(self, exc):
+        return False
+
+
+def create_provider(config):
+    kind = config.get('CHATBOT_PROVIDER', 'gemini')
+    timeout = config.get('CHATBOT_TIMEOUT', 30)
+    if kind == 'gemini':
+        return GeminiProvider(config.get('CHATBOT_API_KEY'), config.get('CHATBOT_MODEL', 'gemini-2.5-flash'), timeout)
+    if kind == 'openai':
+        return OpenAIProvider(config.get('CHATBOT_API_KEY'), config.get('CHATBOT_MODEL'), timeout,
+                              base_url=config.get('CHATBOT_BASE_URL'))
+    if kind == 'stub':
+        return StubProvider(config.get('CHATBOT_STUB_LATENCY', 0.05), config.get('CHATBOT_STUB_TOKEN_DELAY', 0.0))
+    raise ValueError(f"Unknown CHATBOT_PROVIDER {kind!r}")
+
+
+# --- Service ---
+
+class AnswerCache:
+    """Thread-safe LRU of answers with a time-to-live"""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, answer)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key, answer):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class ChatService:
+    def __init__(self):
+        self.config = {}
+        self._provider = None
+        self._provider_lock = threading.Lock()
+        self._slots = None
+        self.cache = None
+
+    def init_app(self, app):
+        self.config = app.config
+        self._slots = threading.BoundedSemaphore(app.config.get('CHATBOT_MAX_CONCURRENCY', 8))
+        self.cache = AnswerCache(app.config.get('CHATBOT_CACHE_SIZE', 512),
+                                 app.config.get('CHATBOT_CACHE_TTL', 3600))
+
+    @property
+    def provider(self):
+        """Created on first use, then shared by every request of this process"""
+        if self._provider is None:
+            with self._provider_lock:
+                if self._provider is None:
+                    self._provider = create_provider(self.config)
+        return self._provider
+
+    def build_prompt(self, message, context=()):
+        """The user's message, preceded by retrieved facts when there are any"""
+        if not context:
+            return message.strip()
+        facts = '\n'.join(f'- {fact}' for fact in context)
+        return (f"Relevant data from the platform (use it when it helps, cite numbers from it):\n"
+                f"{facts}\n\nQuestion: {message.strip()}")
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.config.get('CHATBOT_QUEUE_TIMEOUT', 5)):
+            raise ChatbotBusy('The assistant is busy, please try again shortly')
+
+    def _with_retries(self, call):
+        retries = self.config.get('CHATBOT_RETRIES', 2)
+        for attempt in range(retries + 1):
+            try:
+                return call()
+            except Exception as e:
+                if attempt == retries or not self.provider.retryable(e):
+                    raise ChatbotError(str(e)) from e
+                # Exponential backoff with jitter: ~0.5s, 1s, 2s...
+                time.sleep(0.5 * 2 ** attempt * (0.5 + random.random()))
+
+    def ask(self, message, context=()):
+        """Returns (answer, cached)"""
+        prompt = self.build_prompt(message, context)
+        key = normalize_prompt(prompt)
+        answer = self.cache.get(key)
+        if answer is not None:
+            return answer, True
+
+        self._acquire()
+        try:
+            answer = self._with_retries(lambda: self.provider.generate(SYSTEM_PROMPT, prompt))
+        finally:
+            self._slots.release()
+        self.cache.set(key, answer)
+        return answer, False
+
+    def stream(self, message, context=()):
+        """
+        Yield the answer in pieces. Raises ChatbotBusy before the first piece
+        if no slot frees up; a provider failure mid-stream raises ChatbotError.
+        """
+        prompt = self.build_prompt(message, context)
+        key = normalize_prompt(prompt)
+        answer = self.cache.get(key)
+        if answer is not None:
+            return iter([answer])
+
+        self._acquire()
+        return _SlotStream(self._stream(prompt, key), self._slots.release)
+
+    def _stream(self, prompt, key):
+        pieces = []
+        try:
+            # Only starting the stream is retried; text already sent cannot be taken back
+            chunks = self._with_retries(lambda: _started(self.provider.stream(SYSTEM_PROMPT, prompt)))
+            for piece in chunks:
+                pieces.append(piece)
+                yield piece
+        except ChatbotError:
+            raise
+        except Exception as e:
+            raise ChatbotError(str(e)) from e
+        self.cache.set(key, ''.join(pieces))
+
+
+class _SlotStream:
+    """Iterator that gives its provider slot back once exhausted, failed or closed"""
+
+    def __init__(self, pieces, release):
+        self._pieces = pieces
+        self._release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._pieces)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        release, self._release = self._release, None
+        if release is not None:
+            self._pieces.close()
+            release()
+
+
+def _started(iterator):
+    """Pull the first piece now, so connection errors surface inside the retry loop"""
+    try:
+        first = next(iterator)
+    except StopIteration:
+        return iter(())
+    return _chain(first, iterator)
+
+
+def _chain(first, rest):
+    yield first
+    yield from rest
+
+
+chat_service = ChatService()
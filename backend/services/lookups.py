@@ -0,0 +1,137 @@
+"""
+Location and industry lookup tables.
+
+Jobs and universities carry a location_id, companies an industry_id, next
+to the original text columns. Location/industry filters are answered with an
+integer IN on those ids: when the input is a canonical name (the common
+case, values come from the frontend dropdowns) the ids are taken from an
+in-process cache, otherwise from a subquery on the small lookup table.
+"""
+from sqlalchemy import event, inspect, insert, select, text
+from sqlalchemy.orm import Session
+
+from models import db, Company, Industry, Job, Location, University
+
+# (model, text column, id column) for every table that references a lookup
+LOOKUP_COLUMNS = [
+    (Location, Job.__table__.c.location, Job.__table__.c.location_id),
+    (Location, University.__table__.c.location, University.__table__.c.location_id),
+    (Industry, Company.__table__.c.industry, Company.__table__.c.industry_id),
+]
+
+
+def sync_lookups(conn):
+    """
+    Add missing canonical names and fill unset ids with set-based SQL.
+    Run after bulk loads that bypass the ORM.
+    """
+    for model, name_col, id_col in LOOKUP_COLUMNS:
+        lookup = model.__tablename__
+        source = name_col.table.name
+        conn.execute(text(
+            f"INSERT INTO {lookup} (name) SELECT DISTINCT {name_col.name} FROM {source} "
+            f"WHERE {name_col.name} IS NOT NULL ON CONFLICT DO NOTHING"
+        ))
+        conn.execute(text(
+            f"UPDATE {source} SET {id_col.name} = "
+            f"(SELECT id FROM {lookup} WHERE {lookup}.name = {source}.{name_col.name}) "
+            f"WHERE {id_col.name} IS NULL AND {name_col.name} IS NOT NULL"
+        ))
+    invalidate_lookups()
+
+
+class LookupCache:
+    """
+    lowercase canonical name -> ids of every canonical name containing it,
+    i.e. exactly the rows `name ILIKE '%value%'` would match
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._ids = None
+
+    def invalidate(self):
+        self._ids = None
+
+    def _load(self):
+        rows = db.session.execute(select(self.model.id, self.model.name)).all()
+        names = [(row_id, name.lower()) for row_id, name in rows]
+        return {name: [i for i, other in names if name in other] for _, name in names}
+
+    def reload(self):
+        """Recompute off to the side and swap in; nothing to do if never used"""
+        ids = self._ids
+        if ids is not None:
+            fresh = self._load()
+            if self._ids is ids:
+                self._ids = fresh
+
+    def match(self, value):
+        ids = self._ids
+        if ids is None:
+            ids = self._ids = self._load()
+        return ids.get(value.strip().lower())
+
+
+_caches = {Location: LookupCache(Location), Industry: LookupCache(Industry)}
+
+
+def invalidate_lookups():
+    for cache in _caches.values():
+        cache.invalidate()
+
+
+def reload_lookups():
+    for cache in _caches.values():
+        cache.reload()
+
+
+def lookup_filter(id_column, model, value):
+    """Integer filter equivalent to `<text column> ILIKE '%value%'`"""
+    ids = _caches[model].match(value)
+    if ids is not None:
+        return id_column.in_(ids)
+    return id_column.in_(select(model.id).where(model.name.ilike(f'%{value}%')))
+
+
+# Keep ids in step with ORM writes
+
+_ORM_COLUMNS = {
+    Job: ('location', 'location_id', Location),
+    University: ('location', 'location_id', Location),
+    Company: ('industry', 'industry_id', Industry),
+}
+
+
+def _lookup_id(session, model, name):
+    row_id = session.execute(select(model.id).where(model.name == name)).scalar()
+    if row_id is None:
+        session.execute(insert(model).values(name=name))
+        row_id = session.execute(select(model.id).where(model.name == name)).scalar()
+        session.info['lookups_changed'] = True
+    return row_id
+
+
+@event.listens_for(Session, 'before_flush')
+def _assign_lookup_ids(session, flush_context, instances):
+    for obj in session.new | session.dirty:
+        columns = _ORM_COLUMNS.get(type(obj))
+        if columns is None:
+            continue
+        attr, id_attr, model = columns
+        if not inspect(obj).attrs[attr].history.has_changes():
+            continue
+        name = getattr(obj, attr)
+        with session.no_autoflush:
+            setattr(obj, id_attr, _lookup_id(session, model, name) if name else None)
+
+
+@event.listens_for(Session, 'after_commit')
+def _refresh_lookups(session):
+    if session.info.pop('lookups_changed', False):
+        invalidate_lookups()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_lookups(session):
+    session.info.pop('lookups_changed', None)
@@ -0,0 +1,139 @@
+"""
+Request instrumentation and Prometheus metrics.
+
+For every request: latency by endpoint and status, response size, the
+number of SQL statements and the time spent in them (from the engine's
+cursor events), and whether the response cache answered it (X-Cache).
+GET /metrics serves them in the Prometheus text format.
+
+Statements slower than SLOW_QUERY_MS are logged with the endpoint and path
+that ran them (0 turns the log off).
+
+Under gunicorn, set PROMETHEUS_MULTIPROC_DIR to an empty directory so the
+metrics of every worker are aggregated (see gunicorn.conf.py); otherwise
+each process reports only its own.
+"""
+import logging
+import os
+import time
+
+from flask import Response, g, has_request_context, request
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram,
+                               REGISTRY, generate_latest, multiprocess)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+slow_query_log = logging.getLogger('lmi.slow_query')
+
+REQUEST_LATENCY = Histogram(
+    'lmi_http_request_duration_seconds', 'Request latency',
+    ['method', 'endpoint', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+RESPONSE_SIZE = Histogram(
+    'lmi_http_response_size_bytes', 'Response body size (streamed responses are not counted)',
+    ['endpoint'],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+REQUEST_QUERIES = Histogram(
+    'lmi_db_queries_per_request', 'SQL statements executed per request',
+    ['endpoint'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+REQUEST_SQL_TIME = Histogram(
+    'lmi_db_query_seconds_per_request', 'Time spent in SQL per request',
+    ['endpoint'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+CACHE_LOOKUPS = Counter(
+    'lmi_response_cache_lookups_total', 'Response cache lookups by result',
+    ['endpoint', 'result'],
+)
+SLOW_QUERIES = Counter(
+    'lmi_db_slow_queries_total', 'Statements slower than SLOW_QUERY_MS',
+    ['endpoint'],
+)
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+
+class Metrics:
+    def __init__(self):
+        self.slow_query_seconds = 0
+
+    def init_app(self, app):
+        self.slow_query_seconds = app.config.get('SLOW_QUERY_MS', 0) / 1000
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.add_url_rule('/metrics', 'metrics', self.export)
+
+    def _start(self):
+        g.request_stats = RequestStats()
+
+    def _finish(self, response):
+        stats = g.pop('request_stats', None)
+        if stats is None:
+            return response
+        endpoint = _endpoint()
+        REQUEST_LATENCY.labels(request.method, endpoint, response.status_code).observe(
+            time.perf_counter() - stats.started
+        )
+        if not response.is_streamed:
+            RESPONSE_SIZE.labels(endpoint).observe(response.calculate_content_length() or 0)
+        REQUEST_QUERIES.labels(endpoint).observe(stats.queries)
+        REQUEST_SQL_TIME.labels(endpoint).observe(stats.sql_seconds)
+        cache = response.headers.get('X-Cache')
+        if cache:
+            CACHE_LOOKUPS.labels(endpoint, cache.lower()).inc()
+        return response
+
+    def export(self):
+        """Prometheus scrape endpoint"""
+        if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+    def record_query(self, statement, seconds):
+        if not has_request_context():
+            return
+        stats = g.get('request_stats')
+        if stats is not None:
+            stats.queries += 1
+            stats.sql_seconds += seconds
+        if self.slow_query_seconds and seconds >= self.slow_query_seconds:
+            SLOW_QUERIES.labels(_endpoint()).inc()
+            slow_query_log.warning('%.0f ms in %s (%s %s):\n%s', seconds * 1000, _endpoint(),
+                                   request.method, request.full_path, statement)
+
+
+metrics = Metrics()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _end_query(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    metrics.record_query(statement, time.perf_counter() - started)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _failed_query(context):
+    conn = context.connection
+    if conn is not None and conn.info.get('query_started'):
+        conn.info['query_started'].pop()
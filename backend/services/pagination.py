@@ -0,0 +1,120 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are read with `WHERE (sort_key, id) < (last_sort_key, last_id)` instead
+of OFFSET, so every page costs the same no matter how deep the client
+scrolls. The position is handed out as an opaque `next_cursor` and the total
+row count is only computed when asked for, either exactly or as the
+planner's estimate.
+"""
+import base64
+import json
+from datetime import date
+
+from sqlalchemy import and_, or_
+
+from models import db
+
+COUNT_MODES = ('exact', 'estimate')
+
+MAX_PER_PAGE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(sort_value, row_id):
+    if isinstance(sort_value, date):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+    # Cursors only ever hold an ISO date (or null) and a string id
+    if not isinstance(row_id, str) or not (sort_value is None or isinstance(sort_value, str)):
+        raise InvalidCursor('Invalid cursor')
+    return sort_value, row_id
+
+
+def _after(sort_col, id_col, sort_value, row_id):
+    """
+    Rows strictly after (sort_value, row_id) in `sort_col DESC NULLS LAST,
+    id_col DESC` order.
+    """
+    if sort_value is None:
+        return and_(sort_col.is_(None), id_col < row_id)
+    return or_(
+        sort_col < sort_value,
+        and_(sort_col == sort_value, id_col < row_id),
+        sort_col.is_(None)
+    )
+
+
+def estimate_count(query):
+    """
+    Row estimate from the PostgreSQL planner; exact COUNT elsewhere.
+    Returns (count, is_estimate).
+    """
+    statement = query.order_by(None).statement
+    conn = db.session.connection()
+    if conn.dialect.name != 'postgresql':
+        return query.order_by(None).count(), False
+
+    compiled = statement.compile(dialect=conn.dialect)
+    cursor = conn.connection.driver_connection.cursor()
+    try:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + compiled.string, compiled.params)
+        plan = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+    return int(plan[0]['Plan']['Plan Rows']), True
+
+
+def keyset_paginate(query, sort_col, id_col, per_page, cursor=None, count=None):
+    """
+    One page of `query` ordered by (sort_col DESC NULLS LAST, id_col DESC).
+
+    per_page: clamped to 1..MAX_PER_PAGE
+    cursor: value of a previous page's next_cursor ('' or None for the first page)
+    count: None, 'exact' or 'estimate'
+    Returns (items, meta).
+    """
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    base = query
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        if sort_value is not None and isinstance(sort_col.type, db.Date):
+            try:
+                sort_value = date.fromisoformat(sort_value)
+            except (TypeError, ValueError):
+                raise InvalidCursor('Invalid cursor')
+        query = query.filter(_after(sort_col, id_col, sort_value, row_id))
+
+    # One extra row tells us whether there is a next page without a COUNT
+    rows = query.order_by(sort_col.desc().nulls_last(), id_col.desc())\
+        .limit(per_page + 1).all()
+    items = rows[:per_page]
+
+    next_cursor = None
+    if len(rows) > per_page:
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, sort_col.key), getattr(last, id_col.key))
+
+    meta = {
+        'per_page': per_page,
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None
+    }
+    if count == 'exact':
+        meta['total'] = base.order_by(None).count()
+        meta['total_is_estimate'] = False
+    elif count == 'estimate':
+        meta['total'], meta['total_is_estimate'] = estimate_count(base)
+    return items, meta
@@ -0,0 +1,381 @@
+"""
+Retrieval layer for the chatbot.
+
+Jobs, programs, skills and analytics rollups are turned into short facts
+("Job Data Analyst at ABA Bank in Phnom Penh: ...") and indexed with hashed
+TF-IDF: words are hashed into a fixed feature space (no vocabulary to fit,
+nothing to download), each document keeps log-scaled, length-normalized term
+weights and IDF is applied at query time, so documents can be added and
+removed one at a time (removed ones are masked out until there are enough
+of them to compact the index). Postings live in per-feature arrays that NumPy reads
+without copying; a query gathers the postings of its words and scores every
+document with one bincount, a few milliseconds at 100k documents.
+
+The index is built on first use, follows ORM commits lazily (changed rows
+are re-read on the next query) and is rebuilt when another process changes
+the data (see services.cache).
+"""
+import math
+import threading
+import zlib
+from array import array
+from collections import Counter
+
+import numpy as np
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from models import db, Company, Job, Program, Skill, University, job_skills, program_skills
+from services.rollups import current_state, job_counts_by, job_totals, salary_by
+from services.search import tokenize
+from services.serialization import skills_with_counts
+
+FEATURES = 1 << 20
+
+# Query words in more than this share of documents carry almost no signal
+# and have the longest postings; they are skipped
+MAX_DF = 0.5
+
+# Removed documents keep their rows until they outnumber this share of the
+# live ones (and COMPACT_MIN_DEAD); the index is then compacted
+COMPACT_RATIO = 0.25
+COMPACT_MIN_DEAD = 1024
+
+STOPWORDS = frozenset(
+    'a an and are as at be by can do for from how i in is it me my of on or should '
+    'that the this to what when where which who why will with you your'.split()
+)
+
+
+def _features(text, boost=1):
+    counts = Counter()
+    for word in tokenize(text or ''):
+        if word not in STOPWORDS:
+            counts[zlib.crc32(word.encode()) & (FEATURES - 1)] += boost
+    return counts
+
+
+def embed(*parts):
+    """
+    Sparse hashed term weights for a document made of (text, boost) parts.
+    Returns (features, weights) arrays.
+    """
+    counts = Counter()
+    for text, boost in parts:
+        counts.update(_features(text, boost))
+    if not counts:
+        return array('i'), array('f')
+    weights = {f: 1 + math.log(c) for f, c in counts.items()}
+    norm = math.sqrt(sum(w * w for w in weights.values()))
+    return array('i', weights), array('f', (w / norm for w in weights.values()))
+
+
+class VectorIndex:
+    """Hashed TF-IDF index of keyed facts with incremental add/remove"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._rows = {}          # key -> row
+        self._keys = []          # row -> key (None once removed)
+        self._facts = []         # row -> fact text
+        self._features = []      # row -> array of features
+        self._alive = bytearray()
+        self._postings = {}      # feature -> (array of rows, array of weights)
+        self._df = Counter()     # feature -> live documents containing it
+        self._live = 0
+
+    def __len__(self):
+        return self._live
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def add(self, key, fact, *parts):
+        """Index `fact` under `key` (replacing any previous version) from (text, boost) parts"""
+        features, weights = embed(*parts)
+        with self._lock:
+            self.remove(key)
+            row = len(self._keys)
+            self._rows[key] = row
+            self._keys.append(key)
+            self._facts.append(fact)
+            self._features.append(features)
+            self._alive.append(1)
+            self._live += 1
+            for f, w in zip(features, weights):
+                posting = self._postings.get(f)
+                if posting is None:
+                    posting = self._postings[f] = (array('i'), array('f'))
+                posting[0].append(row)
+                posting[1].append(w)
+                self._df[f] += 1
+
+    def remove(self, key):
+        with self._lock:
+            row = self._rows.pop(key, None)
+            if row is None:
+                return
+            # Postings keep the dead row; the alive mask hides it
+            self._alive[row] = 0
+            self._keys[row] = None
+            self._facts[row] = None
+            for f in self._features[row]:
+                self._df[f] -= 1
+            self._features[row] = array('i')
+            self._live -= 1
+            dead = len(self._keys) - self._live
+            if dead >= COMPACT_MIN_DEAD and dead > COMPACT_RATIO * self._live:
+                self._compact()
+
+    def _compact(self):
+        """Drop the rows of removed documents from every structure and renumber the rest in order"""
+        alive = np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+        live_rows = np.flatnonzero(alive).tolist()
+        # Old row -> new row, for the live ones
+        renumber = (np.cumsum(alive) - 1).astype(np.int32)
+        postings = {}
+        for f, (rows, weights) in self._postings.items():
+            rows = np.frombuffer(rows, dtype=np.int32)
+            keep = alive[rows]
+            if keep.any():
+                postings[f] = (array('i', renumber[rows[keep]].tobytes()),
+                               array('f', np.frombuffer(weights, dtype=np.float32)[keep].tobytes()))
+        self._postings = postings
+        self._keys = [self._keys[r] for r in live_rows]
+        self._facts = [self._facts[r] for r in live_rows]
+        self._features = [self._features[r] for r in live_rows]
+        self._rows = {key: row for row, key in enumerate(self._keys)}
+        self._alive = bytearray(b'\x01') * len(live_rows)
+        self._df = Counter({f: n for f, n in self._df.items() if n > 0})
+
+    def search(self, text, k=8):
+        """[(key, score, fact)] of the k best matches, best first"""
+        query = _features(text)
+        with self._lock:
+            n = len(self._keys)
+            if not n or not query:
+                return []
+            rows, weights = [], []
+            for f in query:
+                posting = self._postings.get(f)
+                df = self._df.get(f, 0)
+                if posting is None or df == 0 or df > MAX_DF * self._live:
+                    continue
+                idf = math.log((self._live + 1) / (df + 1)) + 1
+                rows.append(np.frombuffer(posting[0], dtype=np.int32))
+                weights.append(np.frombuffer(posting[1], dtype=np.float32) * idf)
+            if not rows:
+                return []
+            scores = np.bincount(np.concatenate(rows), weights=np.concatenate(weights), minlength=n)
+            # Release the views before the arrays can grow again
+            del rows, weights
+            scores *= np.frombuffer(self._alive, dtype=np.uint8)
+
+            k = min(k, n)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind='stable')]
+            return [(self._keys[r], float(scores[r]), self._facts[r]) for r in top if scores[r] > 0]
+
+
+# --- LMI documents ---
+
+def _money(value):
+    return f'${value:,.0f}' if value else 'n/a'
+
+
+def _skills_by(link_table, link_column, ids=None):
+    key = link_table.c[link_column]
+    query = select(key, Skill.name).select_from(link_table).join(Skill, Skill.id == link_table.c.skill_id)
+    if ids is not None:
+        query = query.where(key.in_(ids))
+    skills = {}
+    for owner_id, name in db.session.execute(query):
+        skills.setdefault(owner_id, []).append(name)
+    return skills
+
+
+def _add_jobs(index, ids=None):
+    query = select(
+        Job.id, Job.title, Job.description, Job.location, Job.experience_level,
+        Job.employment_type, Job.salary_min_usd, Job.salary_max_usd, Job.is_active,
+        Company.name, Company.industry
+    ).join(Company, Company.id == Job.company_id)
+    if ids is not None:
+        query = query.where(Job.id.in_(ids))
+    skills = _skills_by(job_skills, 'job_id', ids)
+    result = db.session.execute(query, execution_options={'yield_per': 2000})
+    for (job_id, title, description, location, level, job_type, salary_min, salary_max,
+         is_active, company, industry) in result:
+        names = skills.get(job_id, [])
+        status = '' if is_active else ' (no longer active)'
+        fact = (f"Job {title} at {company} ({industry}) in {location}{status}: {level}, {job_type}, "
+                f"salary {_money(salary_min)}-{_money(salary_max)} per month; "
+                f"skills: {', '.join(names) or 'none listed'}")
+        index.add(('job', job_id), fact,
+                  (title, 3), (' '.join(names), 2), (f'{industry} {location} {level}', 1), (description, 1))
+
+
+def _add_programs(index, ids=None):
+    query = select(
+        Program.id, Program.program_name, Program.program_category, Program.degree_level,
+        Program.duration_years, Program.annual_tuition_usd, University.name, University.location
+    ).join(University, University.id == Program.university_id)
+    if ids is not None:
+        query = query.where(Program.id.in_(ids))
+    skills = _skills_by(program_skills, 'program_id', ids)
+    for (program_id, name, category, degree, years, tuition, university, location) in db.session.execute(query):
+        names = skills.get(program_id, [])
+        fact = (f"Program {name} ({degree}, {category}) at {university} in {location}: "
+                f"{years} years, tuition {_money(tuition)} per year; "
+                f"skills: {', '.join(names) or 'none listed'}")
+        index.add(('program', program_id), fact,
+                  (name, 3), (category, 2), (' '.join(names), 2), (f'{university} {location} {degree}', 1))
+
+
+def _add_skills(index):
+    for skill, jobs, programs in skills_with_counts():
+        kind = skill.skill_type.value if skill.skill_type else 'Other'
+        fact = (f"Skill {skill.name} ({kind}): required by {jobs} job postings, "
+                f"taught in {programs} university programs")
+        index.add(('skill', skill.id), fact, (skill.name, 3), (f'{kind} skill demand', 1))
+
+
+def _add_stats(index):
+    """Market-level facts from the analytics rollups"""
+    state = current_state()
+    total, active = job_totals()
+    index.add(('stat', 'overview'),
+              f"The platform lists {total:,} job postings ({active:,} active) from {state.companies:,} companies, "
+              f"{state.skills:,} skills, {state.universities:,} universities and {state.programs:,} programs",
+              ('job market overview how many jobs total number postings companies universities programs', 2))
+    for label, value, count in salary_by('experience'):
+        if value is not None:
+            index.add(('stat', f'salary:experience:{label}'),
+                      f"Average salary for {label} jobs: {_money(value)} per month ({count:,} postings)",
+                      (f'average salary pay {label} experience level', 1))
+    for label, value, count in salary_by('industry'):
+        if value is not None:
+            index.add(('stat', f'salary:industry:{label}'),
+                      f"Average salary in {label}: {_money(value)} per month ({count:,} postings)",
+                      (f'average salary pay {label} industry sector', 1))
+    for dimension, noun in [('location', 'location city province'), ('industry', 'industry sector'),
+                            ('employment_type', 'employment type')]:
+        for label, count in job_counts_by(dimension, 100):
+            if label:
+                index.add(('stat', f'jobs:{dimension}:{label}'),
+                          f"{label} has {count:,} job postings",
+                          (f'{label} jobs demand trend {noun}', 1))
+
+
+def build(index):
+    with index._lock:
+        index.clear()
+        _add_stats(index)
+        _add_skills(index)
+        _add_programs(index)
+        _add_jobs(index)
+
+
+class Retriever:
+    def __init__(self):
+        self.index = VectorIndex()
+        self.built = False
+        self._pending = {'job': set(), 'program': set()}
+        self._pending_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._synced = 0
+
+    def invalidate(self):
+        """Rebuild on next use"""
+        self.built = False
+
+    def reload(self):
+        """
+        Build a fresh index off to the side and swap it in; changes marked
+        meanwhile are applied to it on next use. Nothing to do if the index
+        was never built.
+        """
+        if not self.built:
+            return
+        synced = self._synced
+        index = VectorIndex()
+        build(index)
+        with self._sync_lock:
+            if self._synced == synced:
+                self.index = index
+            else:
+                # Changes went into the old index during the build
+                self.built = False
+
+    def mark_changed(self, kind, ids):
+        with self._pending_lock:
+            self._pending[kind].update(ids)
+
+    def _take_pending(self):
+        with self._pending_lock:
+            pending, self._pending = self._pending, {'job': set(), 'program': set()}
+        return pending
+
+    def _sync(self):
+        with self._sync_lock:
+            if not self.built:
+                self._take_pending()
+                build(self.index)
+                self.built = True
+                return
+            pending = self._take_pending()
+            if any(pending.values()):
+                self._synced += 1
+            for kind, ids in pending.items():
+                if not ids:
+                    continue
+                for entity_id in ids:
+                    self.index.remove((kind, entity_id))
+                # Re-add the ones that still exist
+                (_add_jobs if kind == 'job' else _add_programs)(self.index, list(ids))
+            if pending['job']:
+                _add_stats(self.index)
+
+    def search(self, text, k=8):
+        self._sync()
+        return self.index.search(text, k)
+
+    def context(self, text, k=8):
+        """The facts to put in front of the model for a question"""
+        return [fact for _, _, fact in self.search(text, k)]
+
+
+retriever = Retriever()
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    pending = session.info.setdefault('retrieval_pending', {'job': set(), 'program': set()})
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Job):
+            pending['job'].add(obj.id)
+        elif isinstance(obj, Program):
+            pending['program'].add(obj.id)
+        elif isinstance(obj, (Skill, Company, University)):
+            session.info['retrieval_stale'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    pending = session.info.pop('retrieval_pending', None)
+    if session.info.pop('retrieval_stale', False):
+        retriever.invalidate()
+        return
+    for kind, ids in (pending or {}).items():
+        if ids:
+            retriever.mark_changed(kind, ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('retrieval_pending', None)
+    session.info.pop('retrieval_stale', None)
@@ -0,0 +1,183 @@
+"""
+Precomputed analytics rollups.
+
+The dashboard endpoints used to aggregate the whole jobs table on every
+load. job_rollups keeps one row per (experience_level, industry, location,
+employment_type, is_active) segment with job counts and salary sums, so the
+dashboard aggregates a few thousand segment rows at most, however many jobs
+there are. rollup_state holds the entity totals and when the rollups were
+built; that time is returned to clients as `freshness`.
+
+The rollups are rebuilt with one INSERT ... SELECT at the end of every
+ingest (in the same transaction, so readers never see them half-built), on a
+schedule with `python -m services.rollups`, and lazily on the next read
+after an ORM write to the underlying tables.
+
+The salary sketches (services/salary.py) are rebuilt with them.
+"""
+from datetime import datetime
+
+from flask import Flask
+from sqlalchemy import and_, case, delete, event, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from models import (db, Company, Job, JobRollup, Program, RollupState, Skill,
+                    University)
+from services.salary import refresh_salary_sketches
+
+STATE_ID = 1
+
+# Query parameter value -> rollup column
+DIMENSIONS = {
+    'experience': JobRollup.experience_level,
+    'industry': JobRollup.industry,
+    'location': JobRollup.location,
+    'employment_type': JobRollup.employment_type,
+}
+
+_SOURCE_MODELS = (Job, Company, Skill, University, Program)
+
+
+def _segment_select():
+    midpoint = (Job.salary_min_usd + Job.salary_max_usd) / 2
+    salaried = Job.salary_min_usd > 0
+    both_bounds = and_(Job.salary_min_usd.isnot(None), Job.salary_max_usd.isnot(None))
+    keys = [Job.experience_level, Company.industry, Job.location, Job.employment_type, Job.is_active]
+    return select(
+        *keys,
+        func.count(Job.id),
+        func.count(case((salaried, Job.id))),
+        func.count(case((and_(salaried, both_bounds), Job.id))),
+        func.coalesce(func.sum(case((salaried, midpoint))), 0),
+        func.count(case((both_bounds, Job.id))),
+        func.coalesce(func.sum(midpoint), 0),
+    ).select_from(Job).join(Company, Job.company_id == Company.id).group_by(*keys)
+
+
+def _count(conn, model):
+    return conn.execute(select(func.count()).select_from(model)).scalar()
+
+
+def refresh_rollups(conn):
+    """Rebuild every rollup from the source tables in the caller's transaction"""
+    # Serialize concurrent refreshes on the state row (no-op on SQLite,
+    # which only allows one writer anyway)
+    state = conn.execute(
+        select(RollupState.id).where(RollupState.id == STATE_ID).with_for_update()
+    ).scalar()
+
+    conn.execute(delete(JobRollup))
+    conn.execute(insert(JobRollup).from_select([
+        'experience_level', 'industry', 'location', 'employment_type', 'is_active',
+        'job_count', 'salaried_count', 'salaried_midpoint_count', 'salaried_midpoint_sum',
+        'midpoint_count', 'midpoint_sum',
+    ], _segment_select()))
+    refresh_salary_sketches(conn)
+
+    values = {
+        'refreshed_at': datetime.utcnow(),
+        'stale': False,
+        'companies': _count(conn, Company),
+        'skills': _count(conn, Skill),
+        'universities': _count(conn, University),
+        'programs': _count(conn, Program),
+    }
+    if state is None:
+        conn.execute(insert(RollupState).values(id=STATE_ID, **values))
+    else:
+        conn.execute(update(RollupState).where(RollupState.id == STATE_ID).values(**values))
+
+
+def current_state():
+    """The rollup state row, rebuilding first if missing or marked stale"""
+    state = db.session.get(RollupState, STATE_ID)
+    if state is None or state.stale:
+        refresh_rollups(db.session.connection())
+        db.session.commit()
+        state = db.session.get(RollupState, STATE_ID, populate_existing=True)
+    return state
+
+
+def freshness(state):
+    return state.refreshed_at.isoformat()
+
+
+def job_totals():
+    """(total jobs, active jobs)"""
+    total, active = db.session.execute(select(
+        func.coalesce(func.sum(JobRollup.job_count), 0),
+        func.coalesce(func.sum(case((JobRollup.is_active.is_(True), JobRollup.job_count))), 0),
+    )).one()
+    return int(total), int(active)
+
+
+def average_salary():
+    """Mean salary midpoint over jobs with both bounds, or None"""
+    total, n = db.session.execute(select(
+        func.sum(JobRollup.midpoint_sum), func.sum(JobRollup.midpoint_count)
+    )).one()
+    return total / n if n else None
+
+
+def job_counts_by(dimension, limit):
+    """[(label, job count)] for the largest segments of one dimension"""
+    column = DIMENSIONS[dimension]
+    count = func.sum(JobRollup.job_count)
+    rows = db.session.execute(
+        select(column, count).group_by(column).order_by(count.desc()).limit(limit)
+    ).all()
+    return [(label, int(n)) for label, n in rows]
+
+
+def salary_by(dimension, min_jobs=0, limit=None):
+    """
+    [(label, mean salary midpoint, salaried job count)] over jobs with
+    salary_min_usd > 0, highest mean first when limited
+    """
+    column = DIMENSIONS[dimension]
+    jobs = func.sum(JobRollup.salaried_count)
+    mean = func.sum(JobRollup.salaried_midpoint_sum) / func.nullif(func.sum(JobRollup.salaried_midpoint_count), 0)
+    query = select(column, mean, jobs).group_by(column).having(jobs > min_jobs)
+    if limit is not None:
+        query = query.order_by(mean.desc()).limit(limit)
+    return [(label, value, int(n)) for label, value, n in db.session.execute(query).all()]
+
+
+# Mark the rollups stale when the ORM writes to a table they summarize;
+# the next read rebuilds them.
+
+@event.listens_for(Session, 'after_flush')
+def _mark_stale(session, flush_context):
+    if session.info.get('rollups_marked'):
+        return
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, _SOURCE_MODELS):
+            session.info['rollups_marked'] = True
+            session.connection().execute(
+                update(RollupState).where(RollupState.id == STATE_ID).values(stale=True)
+            )
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _reset_marker(session):
+    session.info.pop('rollups_marked', None)
+
+
+def main():
+    from config import Config
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    with app.app_context():
+        with db.engine.begin() as conn:
+            refresh_rollups(conn)
+        state = db.session.get(RollupState, STATE_ID)
+        segments = db.session.execute(select(func.count()).select_from(JobRollup)).scalar()
+        print(f"✓ Rebuilt {segments} rollup segments at {freshness(state)}")
+
+
+if __name__ == '__main__':
+    main()
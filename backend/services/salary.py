@@ -0,0 +1,266 @@
+"""
+Salary distributions per segment.
+
+A mean is pulled around by outliers, and exact percentiles would mean
+sorting the jobs table per request. salary_sketches keeps, for every
+(experience level, industry, location) segment and every (experience level,
+skill) pair, the number of salaried jobs per salary bin on two scales:
+
+- 'log': bins growing by a constant ratio, so any percentile read from them
+  is within RELATIVE_ACCURACY of the true value (the DDSketch layout)
+- 'linear': HISTOGRAM_WIDTH-dollar bins for histograms, the last one open
+
+Bin counts of disjoint segments add up, so any filter over the dimensions
+is answered by summing the matching segments' bins: the cost depends on the
+number of segments and bins, not on the number of jobs. Skills are only
+crossed with experience level; crossing them with every segment would
+multiply the sketch size by the number of skills. Only salaried jobs
+count (salary_min_usd > 0 and both bounds, the salary being the midpoint),
+which keeps the zero salaries of the source data out of the percentiles.
+
+The sketches are rebuilt in one pass over the salaried jobs together with
+the analytics rollups (at ingest, on schedule, and after ORM writes), and
+each process reloads them when the rollups' refreshed_at changes.
+"""
+import threading
+from array import array
+
+import numpy as np
+from sqlalchemy import and_, delete, insert, select
+
+from models import db, Company, Job, SalarySketch, Skill, job_skills
+
+DIMENSIONS = ('experience', 'industry', 'location', 'skill')
+
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+
+HISTOGRAM_WIDTH = 250
+HISTOGRAM_BINS = 40
+
+INSERT_BATCH = 5000
+
+
+def log_bins(values):
+    return np.ceil(np.log(values) / np.log(GAMMA)).astype(np.int64)
+
+
+def log_bin_value(index):
+    """Salary represented by a log bin, within RELATIVE_ACCURACY of all its values"""
+    return 2 * GAMMA ** index / (GAMMA + 1)
+
+
+def linear_bins(values):
+    return np.minimum(values // HISTOGRAM_WIDTH, HISTOGRAM_BINS - 1).astype(np.int64)
+
+
+def _sketch_rows(segments, codes, values):
+    """SalarySketch rows for the jobs of each segment code; `segments` maps codes to label tuples"""
+    for scale, bins in (('log', log_bins(values)), ('linear', linear_bins(values))):
+        low = int(bins.min())
+        span = int(bins.max()) - low + 1
+        counts = np.bincount(codes * span + (bins - low))
+        keys = np.flatnonzero(counts)
+        for key, count in zip(keys.tolist(), counts[keys].tolist()):
+            experience, industry, location, skill = segments[key // span]
+            yield {
+                'experience_level': experience, 'industry': industry, 'location': location,
+                'skill': skill, 'scale': scale, 'bin': key % span + low, 'job_count': count,
+            }
+
+
+def refresh_salary_sketches(conn):
+    """Rebuild every sketch from the jobs table in one pass, in the caller's transaction"""
+    conn.execute(delete(SalarySketch))
+    midpoint = (Job.salary_min_usd + Job.salary_max_usd) / 2
+    jobs = conn.execute(
+        select(Job.id, Job.experience_level, Company.industry, Job.location, midpoint)
+        .join(Company, Job.company_id == Company.id)
+        .where(and_(Job.salary_min_usd > 0, Job.salary_max_usd.isnot(None)))
+    )
+    position = {}
+    experience_of = []
+    segments = {}
+    codes, values = array('q'), array('d')
+    for job_id, experience, industry, location, salary in jobs:
+        position[job_id] = len(values)
+        experience_of.append(experience)
+        codes.append(segments.setdefault((experience, industry, location, None), len(segments)))
+        values.append(salary)
+    if not values:
+        return
+    values = np.frombuffer(values, dtype=np.float64)
+    rows = list(_sketch_rows(list(segments), np.frombuffer(codes, dtype=np.int64), values))
+
+    # (experience, skill) segments over the same salaried jobs
+    links = conn.execute(select(job_skills.c.job_id, Skill.name).join(Skill, Skill.id == job_skills.c.skill_id))
+    segments = {}
+    codes, rows_of = array('q'), array('q')
+    for job_id, skill in links:
+        i = position.get(job_id)
+        if i is not None:
+            rows_of.append(i)
+            codes.append(segments.setdefault((experience_of[i], None, None, skill), len(segments)))
+    if rows_of:
+        rows.extend(_sketch_rows(list(segments), np.frombuffer(codes, dtype=np.int64),
+                                 values[np.frombuffer(rows_of, dtype=np.int64)]))
+
+    for i in range(0, len(rows), INSERT_BATCH):
+        conn.execute(insert(SalarySketch), rows[i:i + INSERT_BATCH])
+
+
+# --- Reads ---
+
+class SalaryStore:
+    """The sketch rows as columns, with labels dictionary-encoded per dimension"""
+
+    def __init__(self, rows, refreshed_at):
+        self.refreshed_at = refreshed_at
+        self.labels = {d: [] for d in DIMENSIONS}
+        lookups = {d: {} for d in DIMENSIONS}
+        codes = {d: array('l') for d in DIMENSIONS}
+        is_log = array('b')
+        bins = array('l')
+        counts = array('l')
+        for *segment, scale, index, count in rows:
+            for dimension, label in zip(DIMENSIONS, segment):
+                lookup = lookups[dimension]
+                if label not in lookup:
+                    lookup[label] = len(lookup)
+                    self.labels[dimension].append(label)
+                codes[dimension].append(lookup[label])
+            is_log.append(scale == 'log')
+            bins.append(index)
+            counts.append(count)
+
+        self.codes = {d: np.array(codes[d], dtype=np.int64) for d in DIMENSIONS}
+        self.is_log = np.array(is_log, dtype=bool)
+        self.bins = np.array(bins, dtype=np.int64)
+        self.counts = np.array(counts, dtype=np.int64)
+        # Skill lookups are case-insensitive, like the rest of the API
+        self.skill_codes = {label.lower(): i for i, label in enumerate(self.labels['skill']) if label}
+        self.no_skill = lookups['skill'].get(None, -1)
+
+        log = self.bins[self.is_log]
+        self.log_low = int(log.min()) if len(log) else 0
+        self.log_span = int(log.max()) - self.log_low + 1 if len(log) else 1
+
+    @classmethod
+    def load(cls, refreshed_at):
+        rows = db.session.execute(select(
+            SalarySketch.experience_level, SalarySketch.industry, SalarySketch.location,
+            SalarySketch.skill, SalarySketch.scale, SalarySketch.bin, SalarySketch.job_count
+        )).all()
+        return cls(rows, refreshed_at)
+
+    def _mask(self, filters, by_skill):
+        """Rows to merge: the per-skill rows when grouping or filtering by skill, the per-job ones otherwise"""
+        for dimension in filters:
+            if dimension not in DIMENSIONS:
+                raise ValueError(f"Unknown filter {dimension!r}, expected one of: {', '.join(DIMENSIONS)}")
+        skills = filters.get('skill', [])
+        if len(skills) > 1:
+            # A job with several of the skills would be counted once per skill
+            raise ValueError("Filter on one skill at a time")
+        if (skills or by_skill) and ({'industry', 'location'} & set(filters)):
+            raise ValueError("Skills combine with the experience filter only")
+        if skills:
+            code = self.skill_codes.get(skills[0].lower(), -2)
+            mask = self.codes['skill'] == code
+        elif by_skill:
+            mask = self.codes['skill'] != self.no_skill
+        else:
+            mask = self.codes['skill'] == self.no_skill
+        for dimension, values in filters.items():
+            if dimension == 'skill':
+                continue
+            lookup = {label: i for i, label in enumerate(self.labels[dimension])}
+            wanted = [lookup[v] for v in values if v in lookup]
+            mask &= np.isin(self.codes[dimension], wanted)
+        return mask
+
+    def distributions(self, filters=None, by=None, percentiles=(10, 50, 90), min_count=1, limit=None):
+        """
+        Percentiles and histogram of the salaried jobs matching `filters`
+        ({dimension: [values]}, an OR per dimension), overall or per value
+        of the `by` dimension, largest groups first.
+        """
+        if by is not None and by not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension {by!r}, expected one of: {', '.join(DIMENSIONS)}")
+        for q in percentiles:
+            if not 0 <= q <= 100:
+                raise ValueError("Percentiles must be between 0 and 100")
+        filters = filters or {}
+        if by in ('industry', 'location') and 'skill' in filters:
+            raise ValueError("Skills combine with the experience filter only")
+        mask = self._mask(filters, by == 'skill')
+        groups = self.codes[by] if by else np.zeros(len(self.bins), dtype=np.int64)
+        n_groups = len(self.labels[by]) if by else 1
+
+        log = mask & self.is_log
+        quantile_bins = np.bincount(
+            groups[log] * self.log_span + (self.bins[log] - self.log_low),
+            weights=self.counts[log], minlength=n_groups * self.log_span,
+        ).reshape(n_groups, self.log_span)
+        linear = mask & ~self.is_log
+        histograms = np.bincount(
+            groups[linear] * HISTOGRAM_BINS + self.bins[linear],
+            weights=self.counts[linear], minlength=n_groups * HISTOGRAM_BINS,
+        ).reshape(n_groups, HISTOGRAM_BINS)
+
+        running = np.cumsum(quantile_bins, axis=1)
+        totals = running[:, -1]
+        values = {}
+        for q in percentiles:
+            rank = q / 100 * np.maximum(totals - 1, 0)
+            index = np.argmax(running > rank[:, None], axis=1)
+            values[q] = log_bin_value(index + self.log_low)
+
+        order = [g for g in np.argsort(-totals, kind='stable') if totals[g] >= min_count]
+        output = []
+        for g in order[:limit]:
+            item = {} if by is None else {'label': self.labels[by][g]}
+            item['count'] = int(totals[g])
+            item['percentiles'] = {f'p{q:g}': round(float(values[q][g]), 2) for q in percentiles}
+            item['histogram'] = _histogram(histograms[g])
+            output.append(item)
+        if by is None and not output:
+            output.append({'count': 0, 'percentiles': {f'p{q:g}': None for q in percentiles}, 'histogram': []})
+        return output
+
+
+def _histogram(counts):
+    """Bins from the first to the last non-empty one"""
+    filled = np.flatnonzero(counts)
+    if not len(filled):
+        return []
+    return [{
+        'min': i * HISTOGRAM_WIDTH,
+        'max': (i + 1) * HISTOGRAM_WIDTH if i < HISTOGRAM_BINS - 1 else None,
+        'count': int(counts[i]),
+    } for i in range(filled[0], filled[-1] + 1)]
+
+
+class SalaryCache:
+    """The SalaryStore of this process, reloaded when the rollups were rebuilt"""
+
+    def __init__(self):
+        self._store = None
+        self._lock = threading.Lock()
+
+    def get(self, refreshed_at):
+        store = self._store
+        if store is None or store.refreshed_at != refreshed_at:
+            with self._lock:
+                store = self._store
+                if store is None or store.refreshed_at != refreshed_at:
+                    store = self._store = SalaryStore.load(refreshed_at)
+        return store
+
+    def reload(self, refreshed_at):
+        """Load the sketches of `refreshed_at` before a request needs them; nothing to do if none were loaded"""
+        if self._store is not None:
+            self.get(refreshed_at)
+
+
+salary_store = SalaryCache()
@@ -0,0 +1,143 @@
+"""
+Vectorized scoring for job and program recommendations.
+
+All candidates are scored for a query with one sparse matrix-vector product
+over a SkillMatrix snapshot, and the best N are picked with argpartition
+instead of sorting every match. Many profiles at once are scored with a
+dense matrix product per block of job rows instead (match_jobs_batch).
+"""
+import numpy as np
+
+from services.skill_index import job_index, program_index
+
+# Job rows x profiles scored per matrix product, and job rows x skills
+# densified at a time (float32 elements)
+HITS_ELEMENTS = 1 << 23
+BLOCK_ELEMENTS = 1 << 22
+
+
+def top_n(scores, candidates, n):
+    """
+    Indices of the n best candidates by score desc, ties broken by row order.
+    Only the top slice is fully sorted.
+    """
+    if len(candidates) > n:
+        cand_scores = scores[candidates]
+        kth = np.partition(cand_scores, len(cand_scores) - n)[len(cand_scores) - n]
+        # Keep every candidate tied with the cut-off so ordering stays stable
+        candidates = candidates[cand_scores >= kth]
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order[:n]]
+
+
+def _explain(matrix, rows, q):
+    """(matching, missing) skill names for each row"""
+    names = matrix.term_names
+    result = []
+    for row in rows:
+        terms = matrix.row_terms(row)
+        common = q[terms]
+        result.append((
+            [names[t] for t in terms[common]],
+            [names[t] for t in terms[~common]]
+        ))
+    return result
+
+
+def match_jobs(skills, level=None, location=None, limit=50):
+    """
+    Score active jobs by len(common) / len(job_skills).
+
+    Returns (total_matches, top) where top is a list of
+    (job_id, score, matching_skills, missing_skills) sorted by score desc.
+    """
+    matrix = job_index.matrix()
+    q = matrix.term_vector(skills)
+    hits = matrix.hits(q)
+
+    scores = np.zeros(matrix.n_rows)
+    np.divide(hits, matrix.row_len, out=scores, where=matrix.row_len > 0)
+    return _top_jobs(matrix, scores, q, _job_filter(matrix, level, location), limit)
+
+
+def _job_filter(matrix, level, location):
+    """Row mask of the active jobs with the level and location"""
+    keep = matrix.mask('is_active', bool)
+    if level:
+        keep &= matrix.mask('experience_level', lambda v: v == level)
+    if location:
+        location = location.lower()
+        keep &= matrix.mask('location', lambda v: location in (v or '').lower())
+    return keep
+
+
+def _top_jobs(matrix, scores, q, keep, limit):
+    candidates = np.flatnonzero(keep & (scores > 0))
+    rows = top_n(scores, candidates, limit)
+    top = [
+        (matrix.ids[row], float(scores[row]), common, missing)
+        for row, (common, missing) in zip(rows, _explain(matrix, rows, q))
+    ]
+    return len(candidates), top
+
+
+def _dense_blocks(matrix):
+    """(start, end, rows x skills float32 0/1 block) over all job rows"""
+    n_terms = len(matrix.term_names)
+    step = max(1, BLOCK_ELEMENTS // n_terms)
+    for start in range(0, matrix.n_rows, step):
+        end = min(start + step, matrix.n_rows)
+        block = np.zeros((end - start, n_terms), dtype=np.float32)
+        lo, hi = matrix.indptr[start], matrix.indptr[end]
+        rows = np.repeat(np.arange(end - start), matrix.row_len[start:end])
+        block[rows, matrix.indices[lo:hi]] = 1
+        yield start, end, block
+
+
+def match_jobs_batch(profiles, limit=50, matrix=None):
+    """
+    match_jobs for many profiles ({'skills', 'experience_level', 'location'}
+    dicts) against one snapshot. The skill vectors of as many profiles as
+    fit in HITS_ELEMENTS are stacked and multiplied with the job rows in one
+    matrix product. Returns a (total_matches, top) per profile, in order.
+    """
+    matrix = matrix or job_index.matrix()
+    if not matrix.term_names:
+        return [(0, []) for _ in profiles]
+    masks = {}
+    results = []
+    has_skills = matrix.row_len > 0
+    step = max(1, HITS_ELEMENTS // max(matrix.n_rows, 1))
+    for first in range(0, len(profiles), step):
+        batch = profiles[first:first + step]
+        queries = np.stack([matrix.term_vector(p.get('skills') or ()) for p in batch], axis=1)
+        hits = np.zeros((len(batch), matrix.n_rows), dtype=np.float32)
+        weights = queries.astype(np.float32)
+        for start, end, block in _dense_blocks(matrix):
+            hits[:, start:end] = (block @ weights).T
+
+        for j, profile in enumerate(batch):
+            scores = np.zeros(matrix.n_rows)
+            np.divide(hits[j], matrix.row_len, out=scores, where=has_skills)
+            key = (profile.get('experience_level'), profile.get('location'))
+            if key not in masks:
+                masks[key] = _job_filter(matrix, *key)
+            results.append(_top_jobs(matrix, scores, queries[:, j], masks[key], limit))
+    return results
+
+
+def rank_programs(skills, limit=20):
+    """
+    Score programs by how many of `skills` they teach.
+
+    Returns a list of (program_id, score, covered_skills) sorted by score desc.
+    """
+    matrix = program_index.matrix()
+    q = matrix.term_vector(skills)
+    scores = matrix.hits(q)
+
+    rows = top_n(scores, np.flatnonzero(scores), limit)
+    return [
+        (matrix.ids[row], int(scores[row]), common)
+        for row, (common, _) in zip(rows, _explain(matrix, rows, q))
+    ]
@@ -0,0 +1,128 @@
+"""
+Full-text search over job titles and descriptions.
+
+PostgreSQL keeps a generated `jobs.search_vector` tsvector (title weighted
+above description) behind a GIN index; SQLite keeps an external-content FTS5
+table `jobs_fts` synced by triggers. Both support ranked, prefix-matched
+queries; other databases, or databases that have not been migrated yet, fall
+back to the old ILIKE scan.
+"""
+import re
+
+from sqlalchemy import column, event, func, inspect, literal_column, or_, table, text
+
+from models import Job
+
+FTS_CONFIG = 'english'
+
+_PG_DDL = [
+    f"""
+    ALTER TABLE jobs ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('{FTS_CONFIG}', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('{FTS_CONFIG}', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX IF NOT EXISTS ix_jobs_search_vector ON jobs USING GIN (search_vector)',
+]
+
+_SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS jobs_fts USING fts5(
+        title, description, content='jobs', content_rowid='rowid',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS jobs_fts_insert AFTER INSERT ON jobs BEGIN
+        INSERT INTO jobs_fts(rowid, title, description)
+        VALUES (new.rowid, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS jobs_fts_delete AFTER DELETE ON jobs BEGIN
+        INSERT INTO jobs_fts(jobs_fts, rowid, title, description)
+        VALUES ('delete', old.rowid, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS jobs_fts_update AFTER UPDATE OF title, description ON jobs BEGIN
+        INSERT INTO jobs_fts(jobs_fts, rowid, title, description)
+        VALUES ('delete', old.rowid, old.title, old.description);
+        INSERT INTO jobs_fts(rowid, title, description)
+        VALUES (new.rowid, new.title, new.description);
+    END
+    """,
+]
+
+jobs_fts = table('jobs_fts', column('rowid'))
+
+# dialect name -> whether the search structures exist, checked once per process
+_available = {}
+
+
+def ensure_search_schema(conn):
+    """Create the full-text structures for the connection's dialect (idempotent)"""
+    dialect = conn.dialect.name
+    if dialect == 'postgresql':
+        for ddl in _PG_DDL:
+            conn.execute(text(ddl))
+    elif dialect == 'sqlite':
+        exists = inspect(conn).has_table('jobs_fts')
+        for ddl in _SQLITE_DDL:
+            conn.execute(text(ddl))
+        if not exists:
+            # Index the rows that were there before the table existed
+            conn.execute(text("INSERT INTO jobs_fts(jobs_fts) VALUES ('rebuild')"))
+    _available.pop(dialect, None)
+
+
+@event.listens_for(Job.__table__, 'after_create')
+def _create_search_schema(target, connection, **kw):
+    ensure_search_schema(connection)
+
+
+def _has_search_schema(conn):
+    dialect = conn.dialect.name
+    if dialect not in _available:
+        insp = inspect(conn)
+        if dialect == 'postgresql':
+            _available[dialect] = any(c['name'] == 'search_vector' for c in insp.get_columns('jobs'))
+        elif dialect == 'sqlite':
+            _available[dialect] = insp.has_table('jobs_fts')
+        else:
+            _available[dialect] = False
+    return _available[dialect]
+
+
+def tokenize(term):
+    return re.findall(r'\w+', term.lower())
+
+
+def search_jobs(query, term, conn):
+    """
+    Restrict a Job query to rows matching every word of `term`, the last
+    word matching as a prefix (typing 'data eng' finds 'Data Engineer')
+    unless it is a single character.
+
+    Returns (query, rank) where rank is a higher-is-better expression to
+    order by, or None when falling back to ILIKE.
+    """
+    words = tokenize(term)
+    if not words or not _has_search_schema(conn):
+        like = f'%{term}%'
+        return query.filter(or_(Job.title.ilike(like), Job.description.ilike(like))), None
+
+    prefix = len(words[-1]) > 1
+    if conn.dialect.name == 'postgresql':
+        tsquery = func.to_tsquery(
+            FTS_CONFIG, ' & '.join(words[:-1] + [words[-1] + (':*' if prefix else '')])
+        )
+        vector = literal_column('jobs.search_vector')
+        return query.filter(vector.op('@@')(tsquery)), func.ts_rank(vector, tsquery)
+
+    match = ' '.join([f'"{w}"' for w in words[:-1]] + [f'"{words[-1]}"' + ('*' if prefix else '')])
+    query = query.join(jobs_fts, jobs_fts.c.rowid == literal_column('jobs.rowid'))\
+        .filter(literal_column('jobs_fts').op('MATCH')(match))
+    # bm25 is lower-is-better; weight title matches 10x description
+    return query, -func.bm25(literal_column('jobs_fts'), 10.0, 1.0)
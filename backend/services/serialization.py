@@ -0,0 +1,241 @@
+"""
+Loading strategies for serializing list endpoints without N+1 queries.
+
+Every list endpoint fetches its rows with explicit eager-load options and
+takes aggregate counts from one grouped query, so the number of queries per
+request is fixed no matter how many rows are returned. count_queries() and
+assert_max_queries() let tests pin those numbers down.
+
+The hottest lists (jobs and programs) skip the ORM entirely: a Projection
+selects just the output columns as row tuples and maps them to the same
+dicts as to_dict().
+"""
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import aliased, joinedload, selectinload
+
+from models import db, Company, Job, Program, Skill, University, job_skills, program_skills
+
+
+def job_options(include_skills=True):
+    """Company in the same SELECT, skills in one extra IN query"""
+    options = [joinedload(Job.company)]
+    if include_skills:
+        options.append(selectinload(Job.skills))
+    return options
+
+
+def program_options(include_skills=True):
+    options = [joinedload(Program.university)]
+    if include_skills:
+        options.append(selectinload(Program.skills))
+    return options
+
+
+class Projection:
+    """
+    Output fields of a list endpoint as columns of one SELECT.
+
+    fields: {output name: column}, in output order; a column may belong to
+        one of the `joins` targets (outer-joined on their onclause)
+    converters: {output name: function} applied to non-None values
+    skills: (link table, link column) to fill a 'skills' list of names with
+        one extra IN query, like selectinload
+    """
+
+    def __init__(self, fields, joins=(), converters=None, skills=None):
+        self.names = tuple(fields)
+        self.columns = [column.label(name) for name, column in fields.items()]
+        self.joins = joins
+        self.converters = [(self.names.index(name), fn) for name, fn in (converters or {}).items()]
+        self.skills = skills
+
+    def apply(self, query, *extra_columns):
+        """Replace the entities of an ORM query with the projected columns"""
+        query = query.with_entities(*self.columns, *extra_columns)
+        for target, onclause in self.joins:
+            query = query.outerjoin(target, onclause)
+        return query
+
+    def serialize(self, rows):
+        names = self.names
+        converters = self.converters
+        result = []
+        for row in rows:
+            values = list(row[:len(names)])
+            for i, fn in converters:
+                if values[i] is not None:
+                    values[i] = fn(values[i])
+            result.append(dict(zip(names, values)))
+        if self.skills and result:
+            self._fill_skills(result)
+        return result
+
+    def _fill_skills(self, result):
+        link_table, link_column = self.skills
+        key = link_table.c[link_column]
+        by_id = {}
+        for record in result:
+            record['skills'] = by_id.setdefault(record['id'], [])
+        rows = db.session.execute(
+            select(key, Skill.name).select_from(link_table)
+            .join(Skill, Skill.id == link_table.c.skill_id)
+            .where(key.in_(list(by_id)))
+        ).all()
+        for owner_id, value in rows:
+            by_id[owner_id].append(value)
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+_job_company = aliased(Company)
+
+# Same output as Job.to_dict()
+JOB_PROJECTION = Projection(
+    {
+        'id': Job.id,
+        'title': Job.title,
+        'company': _job_company.name,
+        'industry': _job_company.industry,
+        'location': Job.location,
+        'employment_type': Job.employment_type,
+        'experience_level': Job.experience_level,
+        'salary_min': Job.salary_min_usd,
+        'salary_max': Job.salary_max_usd,
+        'degree_required': Job.degree_required,
+        'languages_required': Job.languages_required,
+        'is_active': Job.is_active,
+        'posted_date': Job.posted_date,
+    },
+    joins=[(_job_company, _job_company.id == Job.company_id)],
+    converters={'posted_date': _isoformat},
+    skills=(job_skills, 'job_id'),
+)
+
+_program_university = aliased(University)
+
+# Same output as Program.to_dict()
+PROGRAM_PROJECTION = Projection(
+    {
+        'id': Program.id,
+        'university': _program_university.name,
+        'university_type': _program_university.university_type,
+        'location': _program_university.location,
+        'program_name': Program.program_name,
+        'category': Program.program_category,
+        'degree_level': Program.degree_level,
+        'duration_years': Program.duration_years,
+        'tuition_usd': Program.annual_tuition_usd,
+        'enrollment_capacity': Program.enrollment_capacity,
+        'accredited': Program.accredited,
+        'languages': Program.languages_of_instruction,
+        'in_demand': Program.in_demand_field,
+    },
+    joins=[(_program_university, _program_university.id == Program.university_id)],
+    skills=(program_skills, 'program_id'),
+)
+
+
+def _grouped_counts(key, ids):
+    if not ids:
+        return {}
+    rows = db.session.execute(
+        select(key, func.count()).where(key.in_(ids)).group_by(key)
+    ).all()
+    return dict(rows)
+
+
+def program_counts(university_ids):
+    """{university_id: program count} in one grouped query"""
+    return _grouped_counts(Program.university_id, list(university_ids))
+
+
+def job_counts(company_ids):
+    """{company_id: job count} in one grouped query"""
+    return _grouped_counts(Job.company_id, list(company_ids))
+
+
+def _link_counts(link_table):
+    return select(link_table.c.skill_id, func.count().label('n'))\
+        .group_by(link_table.c.skill_id).subquery()
+
+
+def skills_with_counts(min_jobs=0):
+    """
+    Query of (Skill, job_count, program_count) rows in one statement, the
+    counts taken from pre-aggregated link tables so no Job or Program row is
+    loaded. Skills with fewer than min_jobs jobs are left out.
+    """
+    jobs = _link_counts(job_skills)
+    programs = _link_counts(program_skills)
+    job_count = func.coalesce(jobs.c.n, 0)
+    query = db.session.query(
+        Skill,
+        job_count.label('job_count'),
+        func.coalesce(programs.c.n, 0).label('program_count')
+    ).outerjoin(jobs, jobs.c.skill_id == Skill.id)\
+     .outerjoin(programs, programs.c.skill_id == Skill.id)
+    if min_jobs > 0:
+        query = query.filter(job_count >= min_jobs)
+    return query
+
+
+def serialize_skills(rows):
+    return [skill.to_dict(job_count=jobs, program_count=programs) for skill, jobs, programs in rows]
+
+
+def serialize_universities(universities):
+    counts = program_counts(u.id for u in universities)
+    return [u.to_dict(program_count=counts.get(u.id, 0)) for u in universities]
+
+
+def serialize_companies(companies):
+    counts = job_counts(c.id for c in companies)
+    return [c.to_dict(job_count=counts.get(c.id, 0)) for c in companies]
+
+
+# --- Query counting ---
+
+_local = threading.local()
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    for counter in getattr(_local, 'counters', ()):
+        counter.count += 1
+        counter.statements.append(statement)
+
+
+@contextmanager
+def count_queries():
+    """Count SQL statements executed by this thread inside the block"""
+    counter = QueryCounter()
+    counters = _local.__dict__.setdefault('counters', [])
+    counters.append(counter)
+    try:
+        yield counter
+    finally:
+        counters.remove(counter)
+
+
+@contextmanager
+def assert_max_queries(limit):
+    """Fail if the block runs more than `limit` SQL statements"""
+    with count_queries() as counter:
+        yield counter
+    if counter.count > limit:
+        raise AssertionError(
+            f'{counter.count} queries executed, expected at most {limit}:\n'
+            + '\n'.join(counter.statements)
+        )
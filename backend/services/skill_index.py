@@ -0,0 +1,343 @@
+"""
+In-process inverted indexes from skills to jobs and programs.
+
+Each index is built once from its association table (job_skills or
+program_skills) and then kept in sync with ORM commits. Readers never touch
+the mutable structures directly: they get an immutable SkillMatrix snapshot
+(sparse row x skill incidence matrix in NumPy arrays) that is recompiled
+lazily after a change.
+
+Incremental changes are also appended to a journal of (old terms, new
+terms, row count delta) per row, so consumers that derive data from a
+matrix (the skill co-occurrence graph) can apply the same changes instead
+of recomputing. A rebuild starts a new journal.
+"""
+import threading
+from array import array
+from bisect import bisect_left, insort
+
+import numpy as np
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from models import db, Job, Program, Skill, job_skills, program_skills
+
+# Journal entries kept before consumers are made to start over from a snapshot
+MAX_JOURNAL = 10000
+
+
+def _normalize(name):
+    return name.lower() if name else ''
+
+
+class SkillMatrix:
+    """
+    Read-only snapshot of a SkillIndex.
+
+    Holds the 0/1 row x skill incidence matrix in both CSR (row -> terms) and
+    CSC (term -> rows) form, the number of distinct skills per row and every
+    per-row field dictionary-encoded as (codes, values). `journal` and
+    `n_changes` locate the snapshot in its index's change journal.
+    """
+
+    def __init__(self, ids, terms, term_names, csr, csc, columns, journal=None, n_changes=0):
+        self.ids = ids
+        self.terms = terms
+        self.term_names = term_names
+        self.indptr, self.indices = csr
+        self.csc_indptr, self.csc_indices = csc
+        self.row_len = np.diff(self.indptr)
+        self.columns = columns
+        self.journal = journal
+        self.n_changes = n_changes
+
+    @property
+    def n_rows(self):
+        return len(self.ids)
+
+    def term_vector(self, names):
+        """0/1 query vector over the skill vocabulary"""
+        q = np.zeros(len(self.term_names), dtype=bool)
+        for name in names:
+            term = self.terms.get(_normalize(name))
+            if term is not None:
+                q[term] = True
+        return q
+
+    def hits(self, q):
+        """
+        Sparse matrix-vector product A @ q: number of query skills per row.
+        Walks the CSC columns of the query terms only, so rows sharing no
+        skill with the query are never visited.
+        """
+        terms = np.flatnonzero(q)
+        if not len(terms):
+            return np.zeros(self.n_rows, dtype=np.intp)
+        rows = np.concatenate([
+            self.csc_indices[self.csc_indptr[t]:self.csc_indptr[t + 1]] for t in terms
+        ])
+        return np.bincount(rows, minlength=self.n_rows)
+
+    def row_terms(self, row):
+        return self.indices[self.indptr[row]:self.indptr[row + 1]]
+
+    def mask(self, field, predicate):
+        """Row mask of rows whose `field` value satisfies predicate"""
+        codes, values = self.columns[field]
+        ok = np.fromiter((bool(predicate(v)) for v in values), dtype=bool, count=len(values))
+        return ok[codes]
+
+
+class SkillIndex:
+    """
+    Skill -> row inverted index for one model.
+
+    Rows are dense integers. Each skill (lowercased name) keeps a sorted array
+    of the rows that require it, and each row keeps a sorted array of its
+    skill term ids, so both directions stay compact and can be updated one
+    row at a time.
+    """
+
+    def __init__(self, model, link_table, link_column, fields=()):
+        self.model = model
+        self.link_table = link_table
+        self.link_column = link_column
+        self.fields = tuple(fields)
+        self._lock = threading.RLock()
+        self._changes = 0       # bumped by every write, so reload() can tell it raced one
+        self._reset()
+
+    def _reset(self):
+        self.built = False
+        self._matrix = None
+        self._terms = {}        # lowercase skill name -> term id
+        self._term_names = []   # term id -> lowercase skill name
+        self._postings = []     # term id -> array of sorted rows
+        self._rows = {}         # entity id -> row
+        self._ids = []          # row -> entity id (None once deleted)
+        self._row_terms = []    # row -> array of sorted term ids
+        self._values = {f: [] for f in self.fields}
+        self._free = []         # rows of deleted entities, reused on insert
+        self._journal = []      # (old terms, new terms, row delta) per incremental change
+
+    def invalidate(self):
+        """Drop the index; it is rebuilt on next use"""
+        with self._lock:
+            self._changes += 1
+            self._reset()
+
+    def reload(self):
+        """
+        Build a fresh copy off to the side and swap it in, so readers keep
+        using the current one meanwhile. An index that was never built stays
+        lazy; one that changed during the build is dropped instead, as the
+        fresh copy may have missed the change.
+        """
+        if not self.built:
+            return
+        changes = self._changes
+        fresh = SkillIndex(self.model, self.link_table, self.link_column, self.fields)
+        fresh.build()
+        fresh.matrix()
+        with self._lock:
+            if self._changes != changes:
+                self._reset()
+                return
+            state = dict(vars(fresh))
+            del state['_lock'], state['_changes']
+            vars(self).update(state)
+
+    def build(self):
+        """Load the whole index from the database"""
+        model = self.model
+        rows = db.session.execute(
+            select(model.id, *[getattr(model, f) for f in self.fields])
+            .order_by(model.id)
+        ).all()
+        link_id = self.link_table.c[self.link_column]
+        links = db.session.execute(
+            select(link_id, Skill.name)
+            .join(Skill, Skill.id == self.link_table.c.skill_id)
+        ).all()
+
+        skills_by_row = {}
+        for entity_id, name in links:
+            skills_by_row.setdefault(entity_id, []).append(name)
+
+        with self._lock:
+            self._reset()
+            for entity_id, *values in rows:
+                self._insert(entity_id, skills_by_row.get(entity_id, ()), values)
+            self.built = True
+
+    def ensure_built(self):
+        if not self.built:
+            self.build()
+
+    def matrix(self):
+        """Current SkillMatrix snapshot, compiled on first use after a change"""
+        self.ensure_built()
+        matrix = self._matrix
+        if matrix is None:
+            with self._lock:
+                if self._matrix is None:
+                    self._matrix = self._compile()
+                matrix = self._matrix
+        return matrix
+
+    def _compile(self):
+        def pack(arrays):
+            indptr = np.zeros(len(arrays) + 1, dtype=np.intp)
+            np.cumsum([len(a) for a in arrays], out=indptr[1:])
+            indices = np.frombuffer(b''.join(a.tobytes() for a in arrays), dtype=np.intc)
+            return indptr, indices
+
+        columns = {}
+        for field, values in self._values.items():
+            uniques = {}
+            codes = np.fromiter((uniques.setdefault(v, len(uniques)) for v in values),
+                                dtype=np.intp, count=len(values))
+            columns[field] = (codes, list(uniques))
+
+        return SkillMatrix(
+            list(self._ids), dict(self._terms), list(self._term_names),
+            pack(self._row_terms), pack(self._postings), columns,
+            self._journal, len(self._journal)
+        )
+
+    def _term_id(self, name):
+        term = self._terms.get(name)
+        if term is None:
+            term = len(self._term_names)
+            self._terms[name] = term
+            self._term_names.append(name)
+            self._postings.append(array('i'))
+        return term
+
+    def _link(self, row, skill_names):
+        terms = array('i', sorted({self._term_id(n) for n in map(_normalize, skill_names) if n}))
+        self._row_terms[row] = terms
+        for term in terms:
+            insort(self._postings[term], row)
+
+    def _unlink(self, row):
+        postings = self._postings
+        for term in self._row_terms[row]:
+            rows = postings[term]
+            del rows[bisect_left(rows, row)]
+        self._row_terms[row] = array('i')
+
+    def _insert(self, entity_id, skill_names, values):
+        if self._free:
+            row = self._free.pop()
+            self._ids[row] = entity_id
+        else:
+            row = len(self._ids)
+            self._ids.append(entity_id)
+            self._row_terms.append(array('i'))
+            for field in self.fields:
+                self._values[field].append(None)
+        self._rows[entity_id] = row
+        self._set_values(row, values)
+        self._link(row, skill_names)
+
+    def _set_values(self, row, values):
+        for field, value in zip(self.fields, values):
+            self._values[field][row] = value
+
+    def _record(self, old_terms, new_terms, row_delta):
+        if len(self._journal) >= MAX_JOURNAL:
+            self._journal = []
+        self._journal.append((old_terms, new_terms, row_delta))
+
+    def upsert(self, entity_id, skill_names, values):
+        """
+        Insert or replace a single row.
+        skill_names=None keeps the row's current skills.
+        """
+        with self._lock:
+            if not self.built:
+                return
+            self._changes += 1
+            self._matrix = None
+            row = self._rows.get(entity_id)
+            if row is None:
+                self._insert(entity_id, skill_names or (), values)
+                self._record(array('i'), self._row_terms[self._rows[entity_id]], 1)
+                return
+
+            self._set_values(row, values)
+            if skill_names is not None:
+                old_terms = self._row_terms[row]
+                self._unlink(row)
+                self._link(row, skill_names)
+                self._record(old_terms, self._row_terms[row], 0)
+
+    def remove(self, entity_id):
+        with self._lock:
+            if not self.built:
+                return
+            row = self._rows.pop(entity_id, None)
+            if row is None:
+                return
+            self._changes += 1
+            self._matrix = None
+            self._record(self._row_terms[row], array('i'), -1)
+            self._unlink(row)
+            self._ids[row] = None
+            self._set_values(row, [None] * len(self.fields))
+            self._free.append(row)
+
+
+job_index = SkillIndex(Job, job_skills, 'job_id',
+                       fields=('is_active', 'experience_level', 'location'))
+program_index = SkillIndex(Program, program_skills, 'program_id')
+
+_indexes = (job_index, program_index)
+
+
+# Incremental refresh: collect changes at flush time and apply them to the
+# indexes only once the transaction has committed.
+
+def _snapshot(index, obj):
+    state = inspect(obj)
+    # Skills that were never loaded cannot have changed in this session
+    skills = None if 'skills' in state.unloaded else [s.name for s in obj.skills]
+    return skills, [getattr(obj, f) for f in index.fields]
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    pending = session.info.setdefault('skill_index_pending', {})
+    for obj in session.new | session.dirty:
+        if isinstance(obj, Skill) and inspect(obj).attrs.name.history.has_changes():
+            session.info['skill_index_stale'] = True
+        for index in _indexes:
+            if isinstance(obj, index.model):
+                pending[index, obj.id] = _snapshot(index, obj)
+    for obj in session.deleted:
+        if isinstance(obj, Skill):
+            session.info['skill_index_stale'] = True
+        for index in _indexes:
+            if isinstance(obj, index.model):
+                pending[index, obj.id] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    pending = session.info.pop('skill_index_pending', None)
+    if session.info.pop('skill_index_stale', False):
+        for index in _indexes:
+            index.invalidate()
+        return
+    for (index, entity_id), snapshot in (pending or {}).items():
+        if snapshot is None:
+            index.remove(entity_id)
+        else:
+            index.upsert(entity_id, *snapshot)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('skill_index_pending', None)
+    session.info.pop('skill_index_stale', None)
@@ -0,0 +1,318 @@
+"""
+Background tasks.
+
+Long rebuilds (reseeding from the CSVs, refreshing the rollups and trend
+buckets, rebuilding the in-memory indexes) run in a separate worker process
+(`python -m worker`) instead of inside a request. The queue is the `tasks`
+table: the admin API or the worker's schedule inserts a row, a worker claims
+it with a conditional UPDATE (so two workers never run the same task), and
+the task reports its progress, which a heartbeat thread writes to the row
+every HEARTBEAT_INTERVAL seconds together with the time, so a task whose
+worker died is noticed and failed after TASK_STALE_SECONDS.
+
+Every task writes its data in one transaction that also bumps the data
+version. Readers see the old data until it commits; each web process then
+rebuilds the indexes it has loaded on a background thread and swaps them in
+(services/cache.py), so requests never wait for a rebuild. A task cancelled
+while running stops at its next progress report and rolls back.
+"""
+import inspect
+import json
+import os
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, select, update
+
+import ingest
+from models import db, JobRollup, JobTrend, Task
+from services.cache import bump_data_version
+from services.rollups import refresh_rollups
+from services.trends import refresh_trends
+
+STATUSES = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+
+# Seconds between progress writes of a running task
+HEARTBEAT_INTERVAL = 5
+
+# name -> (function, description, params check)
+TASKS = {}
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+def task(name, description, check=None):
+    """
+    Register fn(progress, **params) as a task; it returns a JSON result.
+    `check(params)` may raise ValueError to reject params when enqueued.
+    """
+    def decorator(fn):
+        TASKS[name] = (fn, description, check)
+        return fn
+    return decorator
+
+
+def available():
+    return {name: description for name, (_, description, _) in sorted(TASKS.items())}
+
+
+def parse_schedule(text):
+    """'name=seconds,...' -> {name: seconds}"""
+    schedule = {}
+    for item in filter(None, (part.strip() for part in (text or '').split(','))):
+        name, _, seconds = item.partition('=')
+        name = name.strip()
+        if name not in TASKS:
+            raise ValueError(f"Unknown task {name!r} in schedule")
+        try:
+            schedule[name] = int(seconds)
+        except ValueError:
+            raise ValueError(f"Schedule of {name!r} must be a number of seconds")
+    return schedule
+
+
+# --- Queue ---
+
+def enqueue(name, params=None, run_after=None):
+    """
+    Queue a task, or return the queued one with the same name and params;
+    raises ValueError for an unknown task or bad params.
+    """
+    if name not in TASKS:
+        raise ValueError(f"Unknown task {name!r}, expected one of: {', '.join(sorted(TASKS))}")
+    params = params or {}
+    if not isinstance(params, dict):
+        raise ValueError("params must be an object")
+    fn, _, check = TASKS[name]
+    try:
+        inspect.signature(fn).bind(None, **params)
+    except TypeError as e:
+        raise ValueError(f"Bad params for {name}: {e}")
+    if check is not None:
+        check(params)
+
+    encoded = json.dumps(params, sort_keys=True) if params else None
+    existing = db.session.execute(
+        select(Task).where(Task.name == name, Task.status == 'queued',
+                           Task.params.is_(None) if encoded is None else Task.params == encoded)
+        .order_by(Task.id).limit(1)
+    ).scalar()
+    if existing is not None:
+        return existing
+    queued = Task(name=name, params=encoded, status='queued', run_after=run_after or datetime.utcnow())
+    db.session.add(queued)
+    db.session.commit()
+    return queued
+
+
+def cancel(task_id):
+    """Cancel a queued task, or ask a running one to stop; None if there is no such task"""
+    queued = db.session.get(Task, task_id)
+    if queued is None:
+        return None
+    if queued.status == 'queued':
+        db.session.execute(
+            update(Task).where(Task.id == task_id, Task.status == 'queued')
+            .values(status='cancelled', finished_at=datetime.utcnow())
+        )
+    elif queued.status == 'running':
+        db.session.execute(update(Task).where(Task.id == task_id).values(cancel_requested=True))
+    else:
+        raise ValueError(f"Task {task_id} already {queued.status}")
+    db.session.commit()
+    return db.session.get(Task, task_id, populate_existing=True)
+
+
+def claim(worker):
+    """Id of the oldest due task, now marked running for `worker`, or None"""
+    now = datetime.utcnow()
+    while True:
+        task_id = db.session.execute(
+            select(Task.id).where(Task.status == 'queued', Task.run_after <= now)
+            .order_by(Task.run_after, Task.id).limit(1)
+        ).scalar()
+        if task_id is None:
+            db.session.commit()
+            return None
+        claimed = db.session.execute(
+            update(Task).where(Task.id == task_id, Task.status == 'queued')
+            .values(status='running', worker=worker, started_at=now, heartbeat_at=now)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return task_id
+        # Another worker got there first
+
+
+def fail_lost(stale_seconds):
+    """Fail the running tasks whose worker stopped sending heartbeats"""
+    now = datetime.utcnow()
+    lost = db.session.execute(
+        update(Task).where(Task.status == 'running', Task.heartbeat_at < now - timedelta(seconds=stale_seconds))
+        .values(status='failed', error='Worker stopped responding', finished_at=now)
+    ).rowcount
+    db.session.commit()
+    return lost
+
+
+def schedule_due(schedule):
+    """Queue every scheduled task whose last run (of any origin) is older than its interval"""
+    now = datetime.utcnow()
+    queued = []
+    for name, seconds in schedule.items():
+        pending = db.session.execute(
+            select(func.count()).select_from(Task)
+            .where(Task.name == name, Task.status.in_(('queued', 'running')))
+        ).scalar()
+        if pending:
+            continue
+        last = db.session.execute(select(func.max(Task.created_at)).where(Task.name == name)).scalar()
+        if last is None or last <= now - timedelta(seconds=seconds):
+            queued.append(enqueue(name))
+    db.session.commit()
+    return queued
+
+
+# --- Running ---
+
+class Progress:
+    """Callable handed to a task: progress(fraction, message=None)"""
+
+    def __init__(self):
+        self.fraction = 0.0
+        self.message = None
+        self.cancelled = False
+
+    def __call__(self, fraction, message=None):
+        if self.cancelled:
+            raise TaskCancelled()
+        self.fraction = min(max(float(fraction), 0.0), 1.0)
+        if message is not None:
+            self.message = message[:255]
+
+
+def _heartbeat(app, task_id, progress, stop):
+    """Write the task's progress every HEARTBEAT_INTERVAL seconds and pick up cancellation"""
+    with app.app_context():
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(update(Task).where(Task.id == task_id).values(
+                        progress=progress.fraction, message=progress.message, heartbeat_at=datetime.utcnow()
+                    ))
+                    if conn.execute(select(Task.cancel_requested).where(Task.id == task_id)).scalar():
+                        progress.cancelled = True
+            except Exception:
+                # SQLite is locked while the task writes; try again next beat
+                pass
+
+
+def run(task_id):
+    """Run a claimed task to completion and record the outcome; returns its final status"""
+    queued = db.session.get(Task, task_id)
+    fn = TASKS[queued.name][0] if queued.name in TASKS else None
+    params = json.loads(queued.params) if queued.params else {}
+    db.session.commit()
+
+    progress = Progress()
+    stop = threading.Event()
+    beat = threading.Thread(target=_heartbeat, args=(current_app._get_current_object(), task_id, progress, stop),
+                            name=f'task-{task_id}-heartbeat', daemon=True)
+    beat.start()
+    values = {'status': 'failed', 'error': 'Worker interrupted'}
+    try:
+        if fn is None:
+            raise ValueError(f"Unknown task {queued.name!r}")
+        result = fn(progress, **params)
+        values = {'status': 'succeeded', 'progress': 1.0, 'message': 'Done',
+                  'result': json.dumps(result) if result is not None else None}
+    except TaskCancelled:
+        db.session.rollback()
+        values = {'status': 'cancelled', 'progress': progress.fraction, 'message': progress.message}
+    except Exception as e:
+        db.session.rollback()
+        traceback.print_exc()
+        values = {'status': 'failed', 'progress': progress.fraction, 'message': progress.message,
+                  'error': f'{type(e).__name__}: {e}'}
+    finally:
+        stop.set()
+        beat.join()
+        db.session.execute(update(Task).where(Task.id == task_id).values(
+            finished_at=datetime.utcnow(), heartbeat_at=datetime.utcnow(), **values
+        ))
+        db.session.commit()
+    return values['status']
+
+
+# --- Tasks ---
+
+def _data_file(name):
+    """A file under backend/data; rejects paths that leave it"""
+    root = os.path.realpath(ingest.DATA_DIR)
+    path = os.path.realpath(os.path.join(root, name))
+    if not path.startswith(root + os.sep):
+        raise ValueError(f"{name!r} is not a file in the data directory")
+    return path
+
+
+def _check_ingest(params):
+    for key in ('jobs', 'universities'):
+        if key in params and not isinstance(params[key], str):
+            raise ValueError(f"{key} must be a file name (empty to skip)")
+        if params.get(key):
+            _data_file(params[key])
+    for key in ('delta', 'deactivate_missing'):
+        if key in params and not isinstance(params[key], bool):
+            raise ValueError(f"{key} must be true or false")
+    chunk_size = params.get('chunk_size', 5000)
+    if not isinstance(chunk_size, int) or isinstance(chunk_size, bool) or chunk_size < 1:
+        raise ValueError("chunk_size must be a positive integer")
+
+
+@task('ingest', "Reseed from the CSVs in backend/data (delta=true applies only the changed jobs)", _check_ingest)
+def _ingest(progress, jobs='cambodia_jobs_10k.csv', universities='cambodia_universities.csv',
+            chunk_size=5000, delta=False, deactivate_missing=False):
+    loaders = ingest.run(_data_file(jobs) if jobs else None,
+                         _data_file(universities) if universities else None,
+                         chunk_size, delta, deactivate_missing, progress)
+    result = {}
+    for loader in loaders:
+        if isinstance(loader, ingest.DeltaStats):
+            result['delta'] = {key: getattr(loader, key)
+                               for key in ('inserted', 'updated', 'activated', 'deactivated', 'unchanged')}
+        else:
+            result[loader.table.name] = loader.rows
+    return result
+
+
+@task('refresh_rollups', "Rebuild the analytics rollups and salary sketches")
+def _refresh_rollups(progress):
+    progress(0.0, 'Rebuilding rollups')
+    with db.engine.begin() as conn:
+        refresh_rollups(conn)
+        progress(0.9, 'Committing')
+        version = bump_data_version(conn)
+    segments = db.session.execute(select(func.count()).select_from(JobRollup)).scalar()
+    return {'segments': segments, 'data_version': version}
+
+
+@task('refresh_trends', "Rebuild the daily posting trend buckets")
+def _refresh_trends(progress):
+    progress(0.0, 'Rebuilding trend buckets')
+    with db.engine.begin() as conn:
+        refresh_trends(conn)
+        progress(0.9, 'Committing')
+        version = bump_data_version(conn)
+    buckets = db.session.execute(select(func.count()).select_from(JobTrend)).scalar()
+    return {'buckets': buckets, 'data_version': version}
+
+
+@task('rebuild_indexes', "Have every web process rebuild its in-memory indexes in the background")
+def _rebuild_indexes(progress):
+    with db.engine.begin() as conn:
+        version = bump_data_version(conn)
+    return {'data_version': version}
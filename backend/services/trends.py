@@ -0,0 +1,312 @@
+"""
+Posting trends over time.
+
+job_trends holds one row per (dimension, label, day): how many jobs were
+posted that day for a skill, an industry, a location or the whole market
+('all'), with the salary sums of the salaried ones. Ingest refreshes only
+the days it loaded postings for, and ORM writes refresh the days of the
+jobs they touch when they are flushed, so the buckets stay current without
+rescanning the jobs table.
+
+Reads go through TrendStore: the buckets (labels x days, small however many
+jobs there are) are loaded into NumPy arrays with running totals over days,
+so any window total is two lookups per label. Weekly and monthly series are
+summed from the daily buckets, and "top rising skills in the last 90 days"
+costs the same at 10k or 1M jobs.
+"""
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+from flask import Flask
+from sqlalchemy import String, and_, case, delete, event, func, insert, inspect, literal, select
+from sqlalchemy.orm import Session
+
+from models import db, Company, Job, JobTrend, Skill, job_skills
+
+DIMENSIONS = ('skill', 'industry', 'location', 'all')
+
+INTERVALS = ('day', 'week', 'month')
+
+# Days refreshed per statement, to keep the IN lists short
+DAY_BATCH = 500
+
+
+def _bucket_selects(days=None):
+    """One INSERT ... SELECT source per dimension, optionally limited to some posting days"""
+    midpoint = (Job.salary_min_usd + Job.salary_max_usd) / 2
+    salaried = and_(Job.salary_min_usd > 0, Job.salary_max_usd.isnot(None))
+    sources = [
+        ('all', literal('all', String), ()),
+        ('industry', Company.industry, ((Company, Company.id == Job.company_id),)),
+        ('location', Job.location, ()),
+        ('skill', Skill.name, ((job_skills, job_skills.c.job_id == Job.id),
+                               (Skill, Skill.id == job_skills.c.skill_id))),
+    ]
+    for dimension, label, joins in sources:
+        query = select(
+            literal(dimension, String), label, Job.posted_date,
+            func.count(),
+            func.count(case((salaried, 1))),
+            func.coalesce(func.sum(case((salaried, midpoint))), 0),
+        ).select_from(Job)
+        for target, onclause in joins:
+            query = query.join(target, onclause)
+        query = query.where(Job.posted_date.isnot(None))
+        if dimension != 'all':
+            query = query.where(label.isnot(None))
+        if days is not None:
+            query = query.where(Job.posted_date.in_(days))
+        keys = [Job.posted_date] if dimension == 'all' else [label, Job.posted_date]
+        yield query.group_by(*keys)
+
+
+def refresh_trends(conn, days=None):
+    """Rebuild the buckets of the given posting days (all of them when None) in the caller's transaction"""
+    columns = ['dimension', 'label', 'day', 'job_count', 'salaried_count', 'salary_sum']
+    if days is None:
+        conn.execute(delete(JobTrend))
+        for source in _bucket_selects():
+            conn.execute(insert(JobTrend).from_select(columns, source))
+        return
+    days = sorted(d for d in days if d is not None)
+    for i in range(0, len(days), DAY_BATCH):
+        batch = days[i:i + DAY_BATCH]
+        conn.execute(delete(JobTrend).where(JobTrend.day.in_(batch)))
+        for source in _bucket_selects(batch):
+            conn.execute(insert(JobTrend).from_select(columns, source))
+
+
+# --- Reads ---
+
+class TrendSeries:
+    """Daily buckets of one dimension as (labels x days) arrays with running totals"""
+
+    def __init__(self, labels, first_day, counts, salaried, salary_sum):
+        self.labels = labels
+        self.index = {label.lower(): i for i, label in enumerate(labels)}
+        self.first_day = first_day
+        self.n_days = counts.shape[1]
+        self.counts = counts
+        self.salaried = salaried
+        self.salary_sum = salary_sum
+        # running[:, d] = total of days [0, d)
+        self.running = np.zeros((len(labels), self.n_days + 1), dtype=np.int64)
+        np.cumsum(counts, axis=1, out=self.running[:, 1:])
+
+    def day_index(self, day):
+        return (day - self.first_day).days
+
+    def window(self, start, end):
+        """Postings per label over the days [start, end), clipped to the data"""
+        start = min(max(start, 0), self.n_days)
+        end = min(max(end, 0), self.n_days)
+        return self.running[:, end] - self.running[:, start]
+
+
+class TrendStore:
+    def __init__(self, rows):
+        self.loaded_at = datetime.utcnow()
+        by_dimension = {}
+        for dimension, label, day, count, salaried, salary_sum in rows:
+            by_dimension.setdefault(dimension, []).append((label, day, count, salaried, salary_sum))
+
+        days = [row[2] for row in rows]
+        self.first_day = min(days) if days else None
+        self.last_day = max(days) if days else None
+        n_days = (self.last_day - self.first_day).days + 1 if days else 0
+
+        self.series = {}
+        for dimension in DIMENSIONS:
+            items = by_dimension.get(dimension, [])
+            labels = sorted({label for label, *_ in items})
+            row_of = {label: i for i, label in enumerate(labels)}
+            counts = np.zeros((len(labels), n_days), dtype=np.int64)
+            salaried = np.zeros((len(labels), n_days), dtype=np.int64)
+            salary_sum = np.zeros((len(labels), n_days), dtype=np.float64)
+            for label, day, count, n_salaried, total in items:
+                r, d = row_of[label], (day - self.first_day).days
+                counts[r, d] = count
+                salaried[r, d] = n_salaried
+                salary_sum[r, d] = total
+            self.series[dimension] = TrendSeries(labels, self.first_day, counts, salaried, salary_sum)
+
+    @classmethod
+    def load(cls):
+        rows = db.session.execute(select(
+            JobTrend.dimension, JobTrend.label, JobTrend.day,
+            JobTrend.job_count, JobTrend.salaried_count, JobTrend.salary_sum
+        )).all()
+        return cls(rows)
+
+    def _series(self, dimension):
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension {dimension!r}, expected one of: {', '.join(DIMENSIONS)}")
+        return self.series[dimension]
+
+    def timeline(self, dimension, label=None, interval='week', since=None, until=None, window=4):
+        """
+        Postings per period for one label: count, salaried count, mean salary,
+        the moving average of the count over `window` periods and the growth
+        in percent against the previous period.
+        """
+        if interval not in INTERVALS:
+            raise ValueError(f"Unknown interval {interval!r}, expected one of: {', '.join(INTERVALS)}")
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        series = self._series(dimension)
+        row = series.index.get((label or 'all').lower())
+        if row is None:
+            raise KeyError(f"No postings for {dimension} {label!r}")
+
+        start = series.day_index(since) if since else 0
+        end = series.day_index(until) + 1 if until else series.n_days
+        start, end = max(start, 0), min(end, series.n_days)
+        if start >= end:
+            return []
+
+        days = [self.first_day + timedelta(days=d) for d in range(start, end)]
+        periods = [_period_start(day, interval) for day in days]
+        # First day of every period inside [start, end)
+        bounds = [0] + [i for i in range(1, len(periods)) if periods[i] != periods[i - 1]]
+        counts = np.add.reduceat(series.counts[row, start:end], bounds)
+        salaried = np.add.reduceat(series.salaried[row, start:end], bounds)
+        salary_sum = np.add.reduceat(series.salary_sum[row, start:end], bounds)
+
+        running = np.concatenate(([0], np.cumsum(counts)))
+        n = np.arange(1, len(counts) + 1)
+        span = np.minimum(n, window)
+        moving = (running[n] - running[n - span]) / span
+
+        output = []
+        for i, first in enumerate(bounds):
+            previous = int(counts[i - 1]) if i else 0
+            output.append({
+                'period': periods[first].isoformat(),
+                'count': int(counts[i]),
+                'salaried': int(salaried[i]),
+                'mean_salary': round(float(salary_sum[i] / salaried[i]), 2) if salaried[i] else None,
+                'moving_average': round(float(moving[i]), 2),
+                'growth': round((int(counts[i]) - previous) / previous * 100, 1) if previous else None,
+            })
+        return output
+
+    def rising(self, dimension='skill', days=90, as_of=None, min_count=5, limit=10):
+        """
+        Labels ranked by growth of postings in the last `days` days up to
+        as_of (default: the latest posting day) over the `days` before them.
+        """
+        if days < 1:
+            raise ValueError("days must be at least 1")
+        series = self._series(dimension)
+        if not series.n_days:
+            return []
+        end = series.day_index(as_of or self.last_day) + 1
+        recent = series.window(end - days, end)
+        prior = series.window(end - 2 * days, end - days)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth = np.where(prior > 0, (recent - prior) / prior * 100, np.nan)
+        eligible = np.flatnonzero(np.maximum(recent, prior) >= min_count)
+        # Highest growth first; labels that are new in the window (no prior) lead
+        rank = np.where(np.isnan(growth[eligible]), np.inf, growth[eligible])
+        order = eligible[np.lexsort((-recent[eligible], -rank))]
+        return [{
+            'label': series.labels[i],
+            'recent': int(recent[i]),
+            'previous': int(prior[i]),
+            'growth': None if np.isnan(growth[i]) else round(float(growth[i]), 1),
+        } for i in order[:limit]]
+
+
+def _period_start(day, interval):
+    if interval == 'week':
+        return day - timedelta(days=day.weekday())
+    if interval == 'month':
+        return day.replace(day=1)
+    return day
+
+
+class TrendCache:
+    """The TrendStore of this process, loaded on first use"""
+
+    def __init__(self):
+        self._store = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._store = None
+
+    def reload(self):
+        """Load a new store off to the side and swap it in; nothing to do if none was loaded"""
+        store = self._store
+        if store is None:
+            return
+        fresh = TrendStore.load()
+        with self._lock:
+            if self._store is store:
+                self._store = fresh
+
+    def get(self):
+        store = self._store
+        if store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = TrendStore.load()
+                store = self._store
+        return store
+
+
+trend_store = TrendCache()
+
+
+# Keep the buckets in step with ORM writes: the posting days of every job
+# written in a flush are recomputed inside the same transaction
+
+def _changed(obj, attribute):
+    return inspect(obj).attrs[attribute].history.has_changes()
+
+
+@event.listens_for(Session, 'after_flush')
+def _refresh_touched_days(session, flush_context):
+    days = set()
+    full = False
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Job):
+            history = inspect(obj).attrs.posted_date.history
+            days.update(d for d in (obj.posted_date, *history.deleted) if d is not None)
+        elif isinstance(obj, Company) and (obj in session.deleted or _changed(obj, 'industry')):
+            full = True
+        elif isinstance(obj, Skill) and (obj in session.deleted or _changed(obj, 'name')):
+            full = True
+    if full or days:
+        refresh_trends(session.connection(), None if full else days)
+        session.info['trends_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _reload(session):
+    if session.info.pop('trends_changed', False):
+        trend_store.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard(session):
+    session.info.pop('trends_changed', None)
+
+
+def main():
+    from config import Config
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    with app.app_context():
+        with db.engine.begin() as conn:
+            refresh_trends(conn)
+        buckets = db.session.execute(select(func.count()).select_from(JobTrend)).scalar()
+        print(f"✓ Rebuilt {buckets} trend buckets")
+
+
+if __name__ == '__main__':
+    main()
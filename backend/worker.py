@@ -0,0 +1,87 @@
+"""
+Background task worker.
+
+Polls the tasks queue (services/tasks.py), runs one task at a time outside
+the web processes, and queues the recurring tasks of TASK_SCHEDULE when they
+are due. Run one or more next to gunicorn; SIGTERM or Ctrl-C lets the
+current task finish before exiting.
+
+Usage (from the backend directory):
+    python -m worker
+    python -m worker --once --no-schedule
+    python -m worker --enqueue ingest --param delta=true --param deactivate_missing=true
+    python -m worker --enqueue refresh_trends
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import threading
+
+from flask import Flask
+
+from config import Config
+from models import db
+from services.tasks import available, claim, enqueue, fail_lost, parse_schedule, run, schedule_due
+
+
+def _params(items):
+    """['key=value', ...] -> {key: value}, values read as JSON when they parse"""
+    params = {}
+    for item in items:
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise SystemExit(f"--param expects key=value, got {item!r}")
+        try:
+            params[key] = json.loads(value)
+        except ValueError:
+            params[key] = value
+    return params
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--once', action='store_true', help='exit when no task is due instead of polling')
+    parser.add_argument('--no-schedule', action='store_true', help='do not queue the TASK_SCHEDULE tasks')
+    parser.add_argument('--enqueue', metavar='TASK', choices=sorted(available()),
+                        help='queue a task and exit')
+    parser.add_argument('--param', action='append', default=[], metavar='KEY=VALUE',
+                        help='task parameter for --enqueue (repeatable)')
+    args = parser.parse_args(argv)
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    with app.app_context():
+        if args.enqueue:
+            queued = enqueue(args.enqueue, _params(args.param))
+            print(f"✓ Queued task {queued.id} ({queued.name})")
+            return
+
+        schedule = {} if args.no_schedule else parse_schedule(Config.TASK_SCHEDULE)
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        stopping = threading.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: stopping.set())
+        print(f"Worker {worker} started (schedule: {schedule or 'none'})")
+
+        while not stopping.is_set():
+            lost = fail_lost(Config.TASK_STALE_SECONDS)
+            if lost:
+                print(f"  marked {lost} lost task(s) failed")
+            schedule_due(schedule)
+            task_id = claim(worker)
+            if task_id is None:
+                if args.once:
+                    break
+                stopping.wait(Config.TASK_POLL_INTERVAL)
+                continue
+            print(f"Running task {task_id}...")
+            status = run(task_id)
+            print(f"  task {task_id} {status}")
+        db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+"""
+Production entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Worker, thread and bind settings come from the environment (see
+gunicorn.conf.py); `python app.py` remains the development server.
+"""
+from app import app
+
+__all__ = ['app']